@@ -0,0 +1,170 @@
+# Copyright 2019 The Vearch Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# ==============================================================================
+
+"""Feature cache keyed by the content of images / texts and the model.
+
+The in-process tier is a LRU of the features themselves. The optional on-disk
+tier is a memory-mapped file of fixed size records (key, float32 feature),
+written as a ring: when the file is full the oldest record is evicted.
+"""
+
+import os
+import hashlib
+import collections
+from typing import Optional
+import numpy as np
+
+import config
+
+_KEY_SIZE = 16
+_HEADER_SIZE = 64
+_MAGIC = 0x66656174636163  # 'featcac'
+
+
+class DiskCache(object):
+    """Memory-mapped ring of (key, feature) records, at most `size_mb` megabytes."""
+
+    def __init__(self, path: str, size_mb: int) -> None:
+        self.path = path
+        self.size_mb = size_mb
+        self.dimension = None
+        self.header = None      # [magic, dimension, number of slots, next slot]
+        self.records = None
+        self.index = {}         # key -> slot
+        if os.path.exists(path):
+            self.open()
+
+    def open(self, dimension: int = None) -> None:
+        """Open the file, (re)creating it if it does not hold features of `dimension`.
+        Without `dimension` an existing file is opened as is, and nothing is created.
+        """
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= _HEADER_SIZE:
+            header = np.memmap(self.path, dtype=np.int64, mode='r+', shape=(4,))
+            if header[0] == _MAGIC and dimension in (None, header[1]):
+                self.map(header)
+                return
+            del header
+        if dimension is None:
+            return
+        record_size = _KEY_SIZE + 4 * dimension
+        num_slots = max(1, self.size_mb * 2 ** 20 // record_size)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path, 'wb') as f:
+            f.truncate(_HEADER_SIZE + num_slots * record_size)
+        header = np.memmap(self.path, dtype=np.int64, mode='r+', shape=(4,))
+        header[:] = [_MAGIC, dimension, num_slots, 0]
+        self.map(header)
+
+    def map(self, header: np.memmap) -> None:
+        self.header = header
+        self.dimension = int(header[1])
+        record_size = _KEY_SIZE + 4 * self.dimension
+        self.records = np.memmap(self.path, dtype=np.uint8, mode='r+', offset=_HEADER_SIZE,
+                                 shape=(int(header[2]), record_size))
+        keys = self.records[:, :_KEY_SIZE]
+        used = np.flatnonzero(keys.any(axis=1))
+        self.index = {keys[slot].tobytes(): int(slot) for slot in used}
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        slot = self.index.get(key)
+        if slot is None:
+            return None
+        return self.records[slot, _KEY_SIZE:].view(np.float32).copy()
+
+    def put(self, key: bytes, feature) -> bool:
+        """Store feature, return whether an older record was evicted."""
+        feature = np.asarray(feature, dtype=np.float32).ravel()
+        if self.dimension != feature.size:
+            self.header = self.records = None
+            self.index = {}
+            self.open(feature.size)
+        slot = int(self.header[3])
+        old = self.records[slot, :_KEY_SIZE].tobytes()
+        evicted = self.index.pop(old, None) is not None
+        self.records[slot, :_KEY_SIZE] = np.frombuffer(key, dtype=np.uint8)
+        self.records[slot, _KEY_SIZE:] = feature.view(np.uint8)
+        self.index[key] = slot
+        self.header[3] = (slot + 1) % self.records.shape[0]
+        return evicted
+
+    def __len__(self):
+        return len(self.index)
+
+
+class FeatureCache(object):
+    """Two tier feature cache: in-process LRU, then optional memory-mapped file."""
+
+    def __init__(self, name: str, capacity: int = 100000,
+                 disk_path: str = None, disk_size_mb: int = 1024) -> None:
+        self.name = name                      # model name and version, part of every key
+        self.capacity = capacity              # features kept in memory
+        self.memory = collections.OrderedDict()
+        self.disk = DiskCache(disk_path, disk_size_mb) if disk_path else None
+        self.counters = collections.Counter(memory_hits=0, disk_hits=0, misses=0,
+                                            memory_evictions=0, disk_evictions=0)
+
+    @classmethod
+    def from_config(cls, model_name: str, suffix: str = '') -> Optional['FeatureCache']:
+        """Build the cache in ``config.feature_cache``, None if it is disabled.
+        :param model_name: The name of model, keys of different models never collide.
+        :param suffix: Appended to the disk file name, one file per process.
+        """
+        conf = config.feature_cache
+        if not conf['capacity'] and not conf['disk_path']:
+            return None
+        disk_path = f"{conf['disk_path']}{suffix}" if conf['disk_path'] else None
+        return cls(f"{model_name}:{conf['version']}", conf['capacity'], disk_path, conf['disk_size_mb'])
+
+    def key(self, content: bytes) -> bytes:
+        """The content hash of decoded image bytes / text bytes for this model."""
+        h = hashlib.blake2b(digest_size=_KEY_SIZE)
+        h.update(self.name.encode('utf8') + b'\0')
+        h.update(content)
+        return h.digest()
+
+    def get(self, key: bytes):
+        feature = self.memory.get(key)
+        if feature is not None:
+            self.memory.move_to_end(key)
+            self.counters['memory_hits'] += 1
+            return feature
+        if self.disk is not None:
+            feature = self.disk.get(key)
+            if feature is not None:
+                self.counters['disk_hits'] += 1
+                self.put_memory(key, feature)
+                return feature
+        self.counters['misses'] += 1
+        return None
+
+    def put(self, key: bytes, feature) -> None:
+        self.put_memory(key, feature)
+        if self.disk is not None and self.disk.put(key, feature):
+            self.counters['disk_evictions'] += 1
+
+    def put_memory(self, key: bytes, feature) -> None:
+        if self.capacity <= 0:
+            return
+        self.memory[key] = feature
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+            self.counters['memory_evictions'] += 1
+
+    def stats(self) -> dict:
+        hits = self.counters['memory_hits'] + self.counters['disk_hits']
+        total = hits + self.counters['misses']
+        return dict(self.counters, hits=hits, hit_rate=hits / total if total else 0.0,
+                    memory_size=len(self.memory), disk_size=len(self.disk) if self.disk is not None else 0)
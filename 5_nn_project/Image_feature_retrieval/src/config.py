@@ -20,6 +20,18 @@ gpus = '-1'
 master_address = 'http://127.0.0.1:8817'
 router_address = 'http://127.0.0.1:9001'
 
+# micro-batching of requests in each model process
+max_batch_size = 32     # requests encoded as one model batch
+max_wait_ms = 5         # how long to wait for more requests after the first one
+max_clients = 64        # pooled connections to master / router
+read_image_workers = 8  # threads downloading images of a batch
+
+# features cached by content of image / text, per model process
+feature_cache = dict(capacity=100000,   # features kept in memory, 0 to disable
+                     disk_path=None,    # memory-mapped file of the on-disk tier, None to disable
+                     disk_size_mb=1024,
+                     version='1')       # change it when the model weights change
+
 face_config = dict(modelname='face_retrieval.face',
                    model_path=os.path.join(root_path, 'model', '20180402-114759'))
 
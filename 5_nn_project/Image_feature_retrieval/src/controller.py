@@ -11,13 +11,78 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # ==============================================================================
 
+import collections
+
 import config
 import util
+import cache
 import exceptions
 
 
 class Base(object):
-    pass
+    name = None     # the model name, part of cache keys
+    cache = None    # cache.FeatureCache of encoded features, None to disable
+
+    def load(self, items):
+        """Read the content of items.
+        :param items: The list of urls / base64 images or texts.
+        :return: The list of contents, holding the exception raised instead for items failed.
+        """
+        return list(items)
+
+    def compute(self, contents):
+        """Run the model once for a batch of contents.
+        :return: The list of features, holding the exception raised instead for contents failed.
+        """
+        raise NotImplementedError()
+
+    def encode(self, item):
+        feature = self.encode_batch([item])[0]
+        if isinstance(feature, Exception):
+            raise feature
+        return feature
+
+    def encode_batch(self, items):
+        """Encode a batch of items, looking up the cache by content first.
+        :param items: The list of urls / base64 images or texts.
+        :return: The list of features, holding the exception raised instead for items failed.
+        """
+        contents = self.load(items)
+        results = list(contents)
+        misses = collections.OrderedDict()  # key -> indices of items with the same content
+        for i, content in enumerate(contents):
+            if isinstance(content, Exception):
+                continue
+            if self.cache is None:
+                misses[i] = [i]
+                continue
+            key = self.cache.key(content if isinstance(content, bytes) else content.encode('utf8'))
+            feature = self.cache.get(key)
+            if feature is not None:
+                results[i] = feature
+            else:
+                misses.setdefault(key, []).append(i)
+        if misses:
+            features = self.compute([contents[indices[0]] for indices in misses.values()])
+            for (key, indices), feature in zip(misses.items(), features):
+                for i in indices:
+                    results[i] = feature
+                if self.cache is not None and not isinstance(feature, Exception):
+                    self.cache.put(key, feature)
+        return results
+
+    @staticmethod
+    def read_images(urls):
+        contents = util.read_images(urls, max_workers=config.read_image_workers, decode=False)
+        for i, (url, content) in enumerate(zip(urls, contents)):
+            if isinstance(content, Exception):
+                contents[i] = exceptions.ImageError(f'read {url} failed!')
+        return contents
+
+    @staticmethod
+    def decode_images(contents):
+        images = [util.decode_image(content) for content in contents]
+        return [exceptions.ImageError('decode image failed!') if image is None else image for image in images]
 
 
 class Face(Base):
@@ -25,6 +90,7 @@ class Face(Base):
     def __init__(self):
         super(Face, self).__init__()
         model_name = config.face_config['modelname']
+        self.name = model_name
         self.face = util.get_model(model_name)
         self.model = self.face.load_model(config.face_config)
 
@@ -34,14 +100,18 @@ class Face(Base):
             image = util.crop(image, bbox)
         return image
 
-    def encode(self, url):
-        try:
-            image = util.read_image(url)
-        except Exception as err:
-            raise exceptions.ImageError(url)
-        # image = self.pre_process(image)
-        res = self.model.encode(image)
-        return res
+    def load(self, urls):
+        return self.read_images(urls)
+
+    def compute(self, contents):
+        results = self.decode_images(contents)
+        index = [i for i, image in enumerate(results) if not isinstance(image, Exception)]
+        if index:
+            # image = self.pre_process(image)
+            feats = self.model.encode_batch([results[i] for i in index])
+            for i, feat in zip(index, feats):
+                results[i] = feat
+        return results
 
 
 class ImageSearch(Base):
@@ -50,6 +120,7 @@ class ImageSearch(Base):
         super(ImageSearch, self).__init__()
         model_name = config.image_config['modelname']
         detect_name = config.image_config['detectname']
+        self.name = model_name
         self.extract_model = util.get_model(model_name).load_model()
         self.detect_model = util.get_model(detect_name).load_model() if detect_name else None
 
@@ -59,15 +130,18 @@ class ImageSearch(Base):
             image = util.crop(image, bbox)
         return image
 
-    def encode(self, url):
-        try:
-            image = util.read_image(url)
-        except Exception as err:
-            raise exceptions.ImageError(f'read {url} failed!')
-        image = self.pre_process(image)
-        feat = self.extract_model.forward(image)
-        assert len(feat) > 0, 'No detect object.'
-        return feat[0]
+    def load(self, urls):
+        return self.read_images(urls)
+
+    def compute(self, contents):
+        results = self.decode_images(contents)
+        index = [i for i, image in enumerate(results) if not isinstance(image, Exception)]
+        if index:
+            images = [self.pre_process(results[i]) for i in index]
+            feats = self.extract_model.forward_batch(images)
+            for i, feat in zip(index, feats):
+                results[i] = feat
+        return results
 
 
 class Text(Base):
@@ -75,14 +149,15 @@ class Text(Base):
     def __init__(self):
         super(Text, self).__init__()
         model_name = config.text['modelname']
+        self.name = model_name
         text = util.get_model(model_name)
         self.model = text.load_model(config.text)
 
-    def encode(self, text):
-        return self.model.encode([text])[0]
+    def compute(self, texts):
+        return self.model.encode(list(texts))
 
 
-def load_model(model_name):
+def load_model(model_name, cache_suffix=''):
     if model_name == 'face_retrieval':
         model = Face()
     elif model_name == 'image_retrieval':
@@ -94,6 +169,5 @@ def load_model(model_name):
     else:
         raise exceptions.LoadModelError(f'{model_name} is not existed')
 
+    model.cache = cache.FeatureCache.from_config(model.name, cache_suffix)
     return model
-
-
@@ -55,6 +55,15 @@ class FaceRecognition(object):
         feat = embedding.tolist()
         return feat
 
+    def encode_batch(self, images):
+        faces = []
+        for image in images:
+            if self.mtcnn_detect:
+                image = self.detect(image)
+            faces.append(cv2.resize(image, (self.image_size, self.image_size)))
+        embeddings = self.encoder.generate_embeddings(faces)
+        return embeddings.tolist()
+
 
 class FaceEncoder(object):
     def __init__(self, model_path):
@@ -133,6 +142,11 @@ class FaceEncoder(object):
         feed_dict = {self.images_placeholder: [prewhiten_face], self.phase_train_placeholder: False}
         return self.sess.run(self.embeddings, feed_dict=feed_dict)[0]
 
+    def generate_embeddings(self, faces):
+        prewhiten_faces = [self.prewhiten(face) for face in faces]
+        feed_dict = {self.images_placeholder: prewhiten_faces, self.phase_train_placeholder: False}
+        return self.sess.run(self.embeddings, feed_dict=feed_dict)
+
 
 def load_model(config=None):
     model = FaceRecognition() if config is None else FaceRecognition(**config)
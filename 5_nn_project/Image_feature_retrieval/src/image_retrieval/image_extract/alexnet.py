@@ -47,16 +47,22 @@ class BaseModel(object):
         return image_tensor
 
     def forward(self, x):
-        # x = torch.stack(x)
-        # x = x.to(self.device)
         x = self.preprocess_input(x).unsqueeze(0)
+        return self.torch2list(self.extract(x))
+
+    def forward_batch(self, images):
+        """extract features of a list of images with one forward pass"""
+        x = torch.stack([self.preprocess_input(image) for image in images])
+        return self.torch2list(self.extract(x))
+
+    def extract(self, x):
         x = self.model.features(x)
         x = F.max_pool2d(x, kernel_size=(6, 6))
         x = x.view(x.size(0),-1)
         # print(x.shape)
         # x = torch.squeeze(x,-1)
         # x = torch.squeeze(x,-1)
-        return self.torch2list(x)
+        return x
 
     def torch2list(self, torch_data):
         return torch_data.cpu().detach().numpy().tolist()
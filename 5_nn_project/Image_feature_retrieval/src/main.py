@@ -16,12 +16,19 @@ Options:
     --port        Define the port your server run on
     --gpu         Define the GPU your server run on
     --model_name  Define the model you need
+
+Each model process gathers the requests arriving within ``config.max_wait_ms``
+(at most ``config.max_batch_size``), encodes their features as one model batch
+and forwards them to the VectorDB with a pooled asynchronous HTTP client.
+Latency and throughput are served on ``/_plugin/metrics``.
 """
 
 import os
 import json
 import queue
 import time
+import asyncio
+import datetime
 import signal
 import requests
 import threading
@@ -34,17 +41,22 @@ from asyncio.futures import wrap_future
 import tornado
 import tornado.web
 import tornado.httpserver
+from tornado.httpclient import AsyncHTTPClient, HTTPResponse
 from tornado.httputil import HTTPServerRequest
-from typing import Dict, List, Union
+from typing import Dict, List, Tuple, Union
 from tornado.options import define, options
 
 import config
 import util
+import metrics
 import controller
 
 _INSERT = '_insert'
 _SEARCH = '_search'
 _HEADERS = {'content-type': 'application/json'}
+_METRICS = '/_plugin/metrics'
+# headers describing the connection to the plugin, not the request forwarded
+_HOP_HEADERS = ('Host', 'Content-Length', 'Transfer-Encoding', 'Connection')
 # InvalidURL = requests.InvalidURL
 
 
@@ -56,7 +68,10 @@ class PackageProcess(Process):
                  model_name: str,
                  input_queue: Queue,
                  output_queue: Queue,
-                 debug: bool = False
+                 debug: bool = False,
+                 max_batch_size: int = config.max_batch_size,
+                 max_wait_ms: float = config.max_wait_ms,
+                 max_clients: int = config.max_clients
                  ) -> None:
         Process.__init__(self)
         self.gpu_id = gpu_id               # The GPU id of model run on
@@ -66,6 +81,10 @@ class PackageProcess(Process):
         self.input_queue = input_queue
         self.output_queue = output_queue
         self.watch_queue = queue.Queue()   # thread queue for performance
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_clients = max_clients
+        self.http_client = None
 
     def build(self):
         """Initialization process environment.
@@ -74,7 +93,7 @@ class PackageProcess(Process):
         """
         os.environ['CUDA_VISIBLE_DEVICES'] = self.gpu_id
         self.daemon_thread()
-        self.model = controller.load_model(self.model_name)
+        self.model = controller.load_model(self.model_name, cache_suffix=f'.{self.gpu_id}')
 
     @staticmethod
     def daemon_thread():
@@ -98,12 +117,26 @@ class PackageProcess(Process):
         if uri_list[1] == 'db' and uri_list[2] == '_create':
             if not request.body:
                 raise requests.RequestException('The request data can not be empty!')
-            data = json.loads(request.body, encoding='utf8')
+            data = json.loads(request.body)
             if 'name' not in data:
                 raise requests.RequestException('The name of db is required in request data!')
             if data['name'] in ['_cluster', 'list', 'db', 'space']:
                 raise requests.RequestException('The name of db can not in [_cluster, list, db, space]!')
 
+    def route(self, request: 'Request') -> Tuple[str, List[str]]:
+        """Check the request and find where to send it.
+        :param request: The request object.
+        :return The url to forward the request to and the list of uri.
+        :raise Exception
+        """
+        uri_list = request.uri.split('?')[0].split('/')
+        if len(uri_list) < 3:
+            raise requests.RequestException('Bad Request, Page not Found.')
+        elif uri_list[1] in ['_cluster', 'list', 'db', 'space']:
+            self.judge(uri_list, request)
+            return f'{config.master_address}{request.uri}', uri_list
+        return f'{config.router_address}{request.uri}', uri_list
+
     def deal(self, uuid: str, request: 'Request') -> None:
         """Deal the request.
         Repackage the request body and send it to VectorDB and put the response into `response_queue`
@@ -112,17 +145,9 @@ class PackageProcess(Process):
         :return None
         """
         try:
-            uri_list = request.uri.split('?')[0].split('/')
-            if len(uri_list) < 3:
-                raise requests.RequestException('Bad Request, Page not Found.')
-            elif uri_list[1] in ['_cluster', 'list', 'db', 'space']:
-                self.judge(uri_list, request)
-                ip = f'{config.master_address}{request.uri}'
-            elif request.method == 'POST':
+            ip, uri_list = self.route(request)
+            if uri_list[1] not in ['_cluster', 'list', 'db', 'space'] and request.method == 'POST':
                 self.post(uri_list, request)
-                ip = f'{config.router_address}{request.uri}'
-            else:
-                ip = f'{config.router_address}{request.uri}'
             res = requests.request(request.method, ip, data=request.body, headers=request.headers)
             result = Response(res)
             self.output_queue.put((uuid, True, result))
@@ -131,38 +156,136 @@ class PackageProcess(Process):
                 traceback.print_exc()
             self.output_queue.put((uuid, False, str(err)))
 
-    def post(self, uri_list: List[str], request: 'Request') -> None:
-        """Extract feature in request if necessary.
+    def parse(self, uri_list: List[str], request: 'Request') -> Tuple[dict, List[dict]]:
+        """Find the features need to be extracted in request.
         :param uri_list: The list of uri.
         :param request: The dict of request body.
-        :return None
+        :return The request data and the list of dicts whose `feature` is not a vector yet.
         :raise NotImplementedError
         """
-        flag = False
+        targets = []
         operate = uri_list[3] if len(uri_list) >= 4 else None
-        data = json.loads(request.body, encoding='utf8')
+        data = json.loads(request.body)
         if operate == _SEARCH:
             for d in data['query']['sum']:
                 if not isinstance(d['feature'], list):
-                    flag = True
-                    d['feature'] = util.normlize(self.model.encode(d['feature']))
+                    targets.append(d)
         elif operate == '_msearch':
             raise NotImplementedError('This API do not support msearch operate')
         else:
             for key in data:
                 if isinstance(data[key], dict) and 'feature' in data[key]:
-                    field = data[key]['feature']
-                    if not isinstance(field, list):
-                        flag = True
-                        data[key]['feature'] = util.normlize(self.model.encode(field))
-        if flag:
+                    if not isinstance(data[key]['feature'], list):
+                        targets.append(data[key])
+        return data, targets
+
+    @staticmethod
+    def fill(request: 'Request', data: dict, targets: List[dict], features: list) -> None:
+        """Replace the `feature` of targets with the normalized features and rewrite request body."""
+        for target, feature in zip(targets, features):
+            target['feature'] = util.normlize(feature)
+        if targets:
             # if not extract feature, send the request to server directly.
             request.body = json.dumps(data, ensure_ascii=False).encode('utf8')
 
+    def post(self, uri_list: List[str], request: 'Request') -> None:
+        """Extract feature in request if necessary.
+        :param uri_list: The list of uri.
+        :param request: The dict of request body.
+        :return None
+        :raise NotImplementedError
+        """
+        data, targets = self.parse(uri_list, request)
+        features = [self.model.encode(target['feature']) for target in targets]
+        self.fill(request, data, targets, features)
+
+    def next_batch(self) -> List[Tuple[str, 'Request']]:
+        """Wait for a request, then gather the requests arriving in `max_wait_ms`, at most `max_batch_size`."""
+        batch = [self.input_queue.get()]
+        deadline = time.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.input_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def prepare(self, batch: List[Tuple[str, 'Request']]) -> List[Tuple[str, 'Request', str]]:
+        """Extract the features of all requests in batch with one model call.
+        Failed requests are answered on `output_queue` directly.
+        :param batch: The list of (uuid, request).
+        :return The list of (uuid, request, url) to forward.
+        """
+        routed, parsed, items = [], [], []
+        for uuid, request in batch:
+            try:
+                ip, uri_list = self.route(request)
+                if uri_list[1] not in ['_cluster', 'list', 'db', 'space'] and request.method == 'POST':
+                    data, targets = self.parse(uri_list, request)
+                    parsed.append((uuid, request, ip, data, targets, len(items)))
+                    items.extend(target['feature'] for target in targets)
+                else:
+                    routed.append((uuid, request, ip))
+            except Exception as err:
+                self.fail(uuid, err)
+        try:
+            features = self.model.encode_batch(items) if items else []
+        except Exception as err:
+            features = [err] * len(items)
+        for uuid, request, ip, data, targets, offset in parsed:
+            feats = features[offset: offset + len(targets)]
+            errors = [feat for feat in feats if isinstance(feat, Exception)]
+            if errors:
+                self.fail(uuid, errors[0])
+                continue
+            self.fill(request, data, targets, feats)
+            routed.append((uuid, request, ip))
+        if self.debug:
+            print(f'batch of {len(batch)} requests, {len(items)} features')
+            if self.model.cache is not None:
+                print(f'feature cache: {self.model.cache.stats()}')
+        return routed
+
+    def fail(self, uuid: str, err: Exception) -> None:
+        if self.debug:
+            traceback.print_exception(type(err), err, err.__traceback__)
+        self.output_queue.put((uuid, False, str(err)))
+
+    async def forward(self, uuid: str, request: 'Request', ip: str) -> None:
+        """Send the request to VectorDB and put the response into `output_queue`."""
+        try:
+            headers = {k: v for k, v in request.headers.items() if k not in _HOP_HEADERS}
+            res = await self.http_client.fetch(ip, method=request.method, headers=headers, body=request.body,
+                                               allow_nonstandard_methods=True, raise_error=False)
+            if res.code == 599 and res.error is not None:
+                raise res.error
+            self.output_queue.put((uuid, True, Response(res)))
+        except Exception as err:
+            self.fail(uuid, err)
+
+    async def serve(self):
+        """Encode requests batch by batch while forwarding finished ones concurrently."""
+        loop = asyncio.get_event_loop()
+        # reading the queue and running the model block, so keep them off the event loop
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.http_client = AsyncHTTPClient(force_instance=True, max_clients=self.max_clients)
+        while True:
+            batch = await loop.run_in_executor(executor, self.next_batch)
+            routed = await loop.run_in_executor(executor, self.prepare, batch)
+            for uuid, request, ip in routed:
+                asyncio.ensure_future(self.forward(uuid, request, ip))
+
     def run(self):
         """The entry to program start."""
         self.build()
         print('load model success')
+        if self.max_batch_size > 1:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.serve())
         while True:
             uuid, request = self.input_queue.get()
             self.deal(uuid, request)
@@ -172,14 +295,17 @@ class TableHandler(tornado.web.RequestHandler):
     """The server of receive and deal request."""
 
     def initialize(self, input_queue: Queue,
-                   futures_dict: Dict[str, concurrent.futures.Future]
+                   futures_dict: Dict[str, concurrent.futures.Future],
+                   stats: metrics.LatencyStats
                    ) -> None:
         """Initialize the request, called for each request.
         :param input_queue: The request queue.
         :param futures_dict: The future dict store the uuid of request and future.
+        :param stats: The latency statistics of requests.
         """
         self.input_queue = input_queue
         self.futures_dict = futures_dict
+        self.stats = stats
 
     def write(self, result: Union[str, 'Response']):
         if isinstance(result, Response):
@@ -210,20 +336,32 @@ class TableHandler(tornado.web.RequestHandler):
         self.write(response)
 
     async def deal(self):
+        start = time.time()
         uuid = shortuuid.uuid()
         future = concurrent.futures.Future()
         self.futures_dict[uuid] = future
         self.input_queue.put((uuid, Request(self.request)))
         result = await wrap_future(future)
+        self.stats.record(time.time() - start, isinstance(result, Response))
         return result
 
 
+class MetricsHandler(tornado.web.RequestHandler):
+    """Latency percentiles and throughput of the plugin."""
+
+    def initialize(self, stats: metrics.LatencyStats) -> None:
+        self.stats = stats
+
+    def get(self):
+        self.write(self.stats.snapshot())
+
+
 class Request(dict):
     def __init__(self, a: HTTPServerRequest):
         super(Request, self).__init__()
         self.method = a.method
         self.uri = a.uri
-        self.headers = a.headers
+        self.headers = dict(a.headers)  # plain dict is cheaper to pickle to model processes
         self.body = a.body
 
     def __str__(self):
@@ -234,12 +372,18 @@ class Request(dict):
 
 
 class Response(dict):
-    def __init__(self, a: requests.Response):
+    def __init__(self, a: Union[requests.Response, HTTPResponse]):
         super(Response, self).__init__()
-        self.url = a.url
-        self.text = a.text
-        self.elapsed = a.elapsed
-        self.status_code = a.status_code
+        if isinstance(a, HTTPResponse):
+            self.url = a.effective_url
+            self.text = a.body.decode('utf8') if a.body else ''
+            self.elapsed = datetime.timedelta(seconds=a.request_time or 0)
+            self.status_code = a.code
+        else:
+            self.url = a.url
+            self.text = a.text
+            self.elapsed = a.elapsed
+            self.status_code = a.status_code
 
     def __str__(self):
         return f'{self.__class__.__name__}({self.__dict__})'
@@ -269,10 +413,12 @@ def set_result_thread(result_queue: Queue,
 def run(port, url_queue, result_queue):
     tornado.options.parse_command_line()
     futures_dict = dict()
+    stats = metrics.LatencyStats()
     t1 = threading.Thread(target=set_result_thread, args=(result_queue, futures_dict))
     t1.start()
     app = tornado.web.Application(
-        [(f'/.*', TableHandler, dict(input_queue=url_queue, futures_dict=futures_dict))]
+        [(_METRICS, MetricsHandler, dict(stats=stats)),
+         (f'/.*', TableHandler, dict(input_queue=url_queue, futures_dict=futures_dict, stats=stats))]
     )
     sockets = tornado.netutil.bind_sockets(port)
     server = tornado.httpserver.HTTPServer(app)
@@ -0,0 +1,52 @@
+# Copyright 2019 The Vearch Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# ==============================================================================
+
+import time
+import collections
+import numpy as np
+
+
+class LatencyStats(object):
+    """Latency percentiles and throughput of the requests finished in a sliding window."""
+
+    def __init__(self, window: float = 60.0, max_samples: int = 100000) -> None:
+        self.window = window                                       # seconds
+        self.samples = collections.deque(maxlen=max_samples)       # (finish time, latency, success)
+        self.start_time = time.time()
+        self.total = 0
+        self.failed = 0
+
+    def record(self, latency: float, success: bool = True) -> None:
+        """Record one finished request.
+        :param latency: The seconds from receiving the request to its result.
+        :param success: Whether the request succeeded.
+        """
+        self.samples.append((time.time(), latency, success))
+        self.total += 1
+        self.failed += 0 if success else 1
+
+    def snapshot(self) -> dict:
+        """Return the metrics of the last `window` seconds, latencies in milliseconds."""
+        now = time.time()
+        while self.samples and self.samples[0][0] < now - self.window:
+            self.samples.popleft()
+        span = min(self.window, now - self.start_time)
+        result = dict(total=self.total, failed=self.failed, window=self.window,
+                      count=len(self.samples), qps=len(self.samples) / span if span > 0 else 0.0,
+                      p50_ms=0.0, p99_ms=0.0, max_ms=0.0)
+        if self.samples:
+            latency = np.array([sample[1] for sample in self.samples]) * 1000
+            result.update(p50_ms=float(np.percentile(latency, 50)),
+                          p99_ms=float(np.percentile(latency, 99)),
+                          max_ms=float(latency.max()))
+        return result
@@ -0,0 +1,180 @@
+# Copyright 2019 The Vearch Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# ==============================================================================
+
+"""Load test of the plugin against a local stub router.
+
+Starts a stub VectorDB router, the plugin (front server and model processes) and
+sends concurrent `_search` requests, then prints client side p50/p99 latency,
+throughput and the plugin's `/_plugin/metrics`.
+
+    cd src && python test/load_benchmark.py --dry_model --max_batch_size 32
+    cd src && python test/load_benchmark.py --dry_model --max_batch_size 1
+
+`--dry_model` replaces the model by one sleeping `--batch_ms + --item_ms * n`
+per batch of n items, so batching can be measured without GPU or weights.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+import tornado.web
+import tornado.ioloop
+import tornado.httpserver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import cache
+import controller
+import main
+
+headers = {"content-type": "application/json"}
+
+
+class DryModel(controller.Base):
+    def __init__(self, batch_ms, item_ms, dimension=512):
+        super(DryModel, self).__init__()
+        self.batch_ms = batch_ms
+        self.item_ms = item_ms
+        self.dimension = dimension
+
+    def compute(self, items):
+        time.sleep((self.batch_ms + self.item_ms * len(items)) / 1000)
+        return [np.random.rand(self.dimension) for _ in items]
+
+
+def load_dry_model(args, cache_suffix=''):
+    model = DryModel(args.batch_ms, args.item_ms)
+    model.cache = cache.FeatureCache.from_config('dry', cache_suffix)
+    return model
+
+
+class StubRouterHandler(tornado.web.RequestHandler):
+    def initialize(self, delay_ms):
+        self.delay_ms = delay_ms
+
+    async def answer(self, *args):
+        await asyncio.sleep(self.delay_ms / 1000)
+        self.write(json.dumps({"code": 200, "status": 200, "hits": {"total": 0, "hits": []}}))
+
+    get = post = put = delete = answer
+
+
+def run_stub_router(port, delay_ms):
+    def serve():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        app = tornado.web.Application([(r'/.*', StubRouterHandler, dict(delay_ms=delay_ms))])
+        server = tornado.httpserver.HTTPServer(app)
+        server.listen(port)
+        tornado.ioloop.IOLoop.current().start()
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+
+def run_front(port, url_queue, result_queue):
+    sys.argv = sys.argv[:1]  # tornado parses the command line of the plugin
+    main.run(port, url_queue, result_queue)
+
+
+def start_plugin(args):
+    stub = f'http://127.0.0.1:{args.router_port}'
+    config.master_address = config.router_address = stub
+    config.feature_cache = dict(config.feature_cache, capacity=args.cache_capacity)
+    if args.dry_model:
+        controller.load_model = lambda model_name, cache_suffix='': load_dry_model(args, cache_suffix)
+    url_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for i in range(args.num_process):
+        process = main.PackageProcess(str(i), args.model_name, url_queue, result_queue,
+                                      max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+        process.daemon = True
+        process.start()
+    front = multiprocessing.Process(target=run_front, args=(args.port, url_queue, result_queue), daemon=True)
+    front.start()
+
+
+def send(session, url, feature):
+    data = {"query": {"sum": [{"field": "feature1", "feature": feature}]}}
+    start = time.time()
+    response = session.post(url, headers=headers, data=json.dumps(data))
+    return time.time() - start, response.status_code == 200
+
+
+def load(args, features):
+    url = f'http://127.0.0.1:{args.port}/test/test/_search'
+    sessions = threading.local()
+
+    def one(feature):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        return send(sessions.session, url, feature)
+
+    start = time.time()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(one, features))
+    elapsed = time.time() - start
+    latency = np.array([r[0] for r in results]) * 1000
+    return dict(requests=len(results), failed=sum(not r[1] for r in results), seconds=elapsed,
+                qps=len(results) / elapsed, p50_ms=float(np.percentile(latency, 50)),
+                p99_ms=float(np.percentile(latency, 99)))
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_name', default='text')
+    parser.add_argument('--dry_model', action='store_true', help='replace the model by a sleeping one')
+    parser.add_argument('--batch_ms', type=float, default=20, help='dry model cost per batch')
+    parser.add_argument('--item_ms', type=float, default=1, help='dry model cost per item')
+    parser.add_argument('--cache_capacity', type=int, default=config.feature_cache['capacity'],
+                        help='features cached in memory, 0 to disable')
+    parser.add_argument('--port', type=int, default=config.port)
+    parser.add_argument('--router_port', type=int, default=9101)
+    parser.add_argument('--router_delay_ms', type=float, default=5)
+    parser.add_argument('--num_process', type=int, default=1)
+    parser.add_argument('--max_batch_size', type=int, default=config.max_batch_size)
+    parser.add_argument('--max_wait_ms', type=float, default=config.max_wait_ms)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--num_requests', type=int, default=2000)
+    parser.add_argument('--images', default='', help='directory of images to search, default send texts')
+    args = parser.parse_args()
+
+    run_stub_router(args.router_port, args.router_delay_ms)
+    start_plugin(args)
+    if args.images:
+        files = [os.path.join(args.images, f) for f in sorted(os.listdir(args.images))]
+    else:
+        files = [f'creative text {i}' for i in range(100)]
+    features = [files[i % len(files)] for i in range(args.num_requests)]
+
+    metrics_url = f'http://127.0.0.1:{args.port}{main._METRICS}'
+    while True:
+        try:
+            requests.get(metrics_url)
+            break
+        except requests.ConnectionError:
+            time.sleep(0.5)
+    load(args, features[:args.concurrency])  # warm up
+    print('client:', json.dumps(load(args, features)))
+    print('plugin:', requests.get(metrics_url).text)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -18,6 +18,7 @@ import importlib
 import urllib.request
 import numpy as np
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 
 def get_model(model_path):
@@ -36,7 +37,7 @@ def get_model(model_path):
     return model
 
 
-def read_image(imageurl):
+def read_bytes(imageurl):
     if '.' in imageurl:
         if imageurl.startswith('http'):
             with urllib.request.urlopen(imageurl) as f:
@@ -48,11 +49,43 @@ def read_image(imageurl):
             raise Exception()
     else:
         resp = base64.b64decode(imageurl)
+    return resp
+
+
+def decode_image(resp):
     image = np.asarray(bytearray(resp), dtype='uint8')
     image = cv2.imdecode(image, cv2.IMREAD_COLOR)
     return image
 
 
+def read_image(imageurl):
+    return decode_image(read_bytes(imageurl))
+
+
+def read_images(imageurls, max_workers=8, decode=True):
+    """read images concurrently
+    Args:
+        imageurls: list of image urls, local paths or base64 strings
+        max_workers: the number of threads reading images
+        decode: whether to decode images, or return the bytes read
+    Returns:
+        list with the image of each url, or the exception raised while reading it
+    """
+    def read(imageurl):
+        try:
+            image = read_image(imageurl) if decode else read_bytes(imageurl)
+        except Exception as err:
+            return err
+        if image is None:
+            return Exception(f'decode {imageurl[:100]} failed')
+        return image
+
+    if len(imageurls) <= 1:
+        return [read(imageurl) for imageurl in imageurls]
+    with ThreadPoolExecutor(min(max_workers, len(imageurls))) as pool:
+        return list(pool.map(read, imageurls))
+
+
 def crop(image, bbox):
     if not bbox:
         return image
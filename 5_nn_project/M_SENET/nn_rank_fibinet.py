@@ -36,6 +36,10 @@ class BilinearInteraction(nn.Module):
         super(BilinearInteraction, self).__init__()
         self.bilinear_type = bilinear_type
         self.seed = seed
+        self.row, self.col = [], []
+        for i, j in itertools.combinations(range(filed_size), 2):
+            self.row.append(i)
+            self.col.append(j)
         self.bilinear = nn.ModuleList()
         if self.bilinear_type == "all":
             self.bilinear = nn.Linear(embedding_size,
@@ -46,7 +50,7 @@ class BilinearInteraction(nn.Module):
                 self.bilinear.append(
                     nn.Linear(embedding_size, embedding_size, bias=False))
         elif self.bilinear_type == "interaction":
-            for i, j in itertools.combinations(range(filed_size), 2):
+            for _ in range(len(self.row)):
                 self.bilinear.append(
                     nn.Linear(embedding_size, embedding_size, bias=False))
         else:
@@ -57,25 +61,23 @@ class BilinearInteraction(nn.Module):
             raise ValueError(
                 "Unexpected inputs dimensions %d, expect to be 3 dimensions" %
                 (len(inputs.shape)))
-        inputs = torch.split(inputs, 1, dim=1)
+        row = torch.as_tensor(self.row, dtype=torch.long, device=inputs.device)
+        col = torch.as_tensor(self.col, dtype=torch.long, device=inputs.device)
+        # pairs are laid out as (pair, batch, embedding) so that the per-pair
+        # weights are applied as one batched matmul, the weights stay one
+        # nn.Linear per field or pair (parameter names bilinear.<k>.weight)
+        inputs = inputs.transpose(0, 1)
         if self.bilinear_type == "all":
-            p = [
-                torch.mul(self.bilinear(v_i), v_j)
-                for v_i, v_j in itertools.combinations(inputs, 2)
-            ]
+            vid = self.bilinear(inputs).index_select(0, row)
         elif self.bilinear_type == "each":
-            p = [
-                torch.mul(self.bilinear[i](inputs[i]), inputs[j])
-                for i, j in itertools.combinations(range(len(inputs)), 2)
-            ]
+            weight = torch.stack([bilinear.weight for bilinear in self.bilinear])
+            vid = torch.bmm(inputs, weight.transpose(1, 2)).index_select(0, row)
         elif self.bilinear_type == "interaction":
-            p = [
-                torch.mul(bilinear(v[0]), v[1]) for v, bilinear in zip(
-                    itertools.combinations(inputs, 2), self.bilinear)
-            ]
+            weight = torch.stack([bilinear.weight for bilinear in self.bilinear])
+            vid = torch.bmm(inputs.index_select(0, row), weight.transpose(1, 2))
         else:
             raise NotImplementedError
-        return torch.cat(p, dim=1)
+        return torch.mul(vid, inputs.index_select(0, col)).transpose(0, 1)
         
 
 class Normalization(nn.modules.batchnorm._BatchNorm):
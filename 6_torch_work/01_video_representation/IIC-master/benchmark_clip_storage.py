@@ -0,0 +1,132 @@
+"""
+Clips/sec of the frame folders and of datasets.clip_storage.ClipReader (without and with its cache), sampling
+a random clip of a random video as UCF101Dataset does for training:
+
+    python benchmark_clip_storage.py --num_videos 200 --epochs 3
+    python benchmark_clip_storage.py --frames_dir /path/to/ucf101/jpegs_256
+
+Without --frames_dir, --num_videos synthetic videos of 320x240 frames are written in a temporary directory.
+The frame folders are read with load_one_clip of datasets/ucf101.py (accimage) as the datasets do. ClipReader
+decodes with PIL, accimage only reads files; both use libjpeg, the pixel differences of the two decoders are
+printed at the end. Without accimage (or torchvision), the frame folders are decoded with PIL too and only the
+file access differs.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from datasets.clip_storage import ClipReader, decode_frame, pack_frame_dirs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames_dir', type=str, default='', help='default: synthetic frames')
+    parser.add_argument('--num_videos', type=int, default=200)
+    parser.add_argument('--num_frames', type=int, default=120, help='frames per synthetic video')
+    parser.add_argument('--clip_len', type=int, default=16)
+    parser.add_argument('--epochs', type=int, default=3, help='one clip per video and epoch')
+    parser.add_argument('--cache_mb', type=int, default=1024)
+    parser.add_argument('--decode_threads', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4, help='processes packing the frames')
+    return parser.parse_args()
+
+
+def synthetic_frames(frames_dir, num_videos, num_frames, seed=0):
+    """ Moving color gradients with noise, one folder of frame%06d.jpg per video as jpegs_256 """
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:240, 0:320].astype(np.float32)
+    for v in range(num_videos):
+        folder = os.path.join(frames_dir, 'v_{:05d}'.format(v))
+        os.makedirs(folder)
+        a, b, c = rng.rand(3, 3, 1, 1)
+        for t in range(num_frames):
+            frame = 255 * (0.5 + 0.25 * np.sin(a * x / 30 + b * y / 20 + 6 * c + t / 10))
+            frame = np.clip(frame.transpose(1, 2, 0) + rng.normal(0, 8, (240, 320, 3)), 0, 255)
+            Image.fromarray(frame.astype(np.uint8)).save(os.path.join(folder, 'frame{:06d}.jpg'.format(t + 1)),
+                                                         quality=90)
+
+
+def load_pil_clip(folder, framenames, start_index, clip_len):
+    frames = []
+    for name in framenames[start_index:start_index + clip_len]:
+        with open(os.path.join(folder, name), 'rb') as f:
+            frames.append(decode_frame(f.read()))
+    return np.array(frames)
+
+
+try:
+    from datasets.ucf101 import load_one_clip
+    FOLDER_DECODER = 'accimage'
+except ImportError:
+    load_one_clip = load_pil_clip
+    FOLDER_DECODER = 'PIL, accimage is not installed'
+
+
+def load_folder_clip(folder, start_index, clip_len):
+    framenames = sorted(f for f in os.listdir(folder) if f != 'n_frames')
+    return load_one_clip(folder, framenames, start_index, clip_len)
+
+
+def pixel_differences(clips, frames_dir, reader, clip_len):
+    """Max absolute difference and fraction of differing values between the folder and the packed clips."""
+    max_diff, num_diff, num_values = 0, 0, 0
+    for vid, start in clips:
+        diff = np.abs(load_folder_clip(os.path.join(frames_dir, vid), start, clip_len).astype(np.int16)
+                      - reader.load_clip(vid, start, clip_len))
+        max_diff, num_diff, num_values = max(max_diff, int(diff.max())), num_diff + np.count_nonzero(diff), \
+            num_values + diff.size
+    return max_diff, num_diff / num_values
+
+
+def sample_clips(reader, args, seed=0):
+    rng = random.Random(seed)
+    clips = []
+    for epoch in range(args.epochs):
+        for vid in rng.sample(reader.videos, len(reader.videos)):
+            clips.append((vid, rng.randint(0, reader.num_frames(vid) - 1 - args.clip_len)))
+    return clips
+
+
+def clips_per_sec(load, clips):
+    start_time = time.time()
+    for vid, start in clips:
+        load(vid, start)
+    return len(clips) / (time.time() - start_time)
+
+
+def main(args):
+    tmp = tempfile.mkdtemp()
+    if not args.frames_dir:
+        args.frames_dir = os.path.join(tmp, 'frames')
+        synthetic_frames(args.frames_dir, args.num_videos, args.num_frames)
+    prefix = os.path.join(tmp, 'rgb')
+    start_time = time.time()
+    pack_frame_dirs(args.frames_dir, prefix, workers=args.workers)
+    print('packed in {:.1f}s'.format(time.time() - start_time))
+
+    clips = sample_clips(ClipReader(prefix), args)
+    print('{} clips of {} frames, frame folders decoded with {}'.format(len(clips), args.clip_len, FOLDER_DECODER))
+    speed = clips_per_sec(lambda vid, start: load_folder_clip(os.path.join(args.frames_dir, vid), start,
+                                                               args.clip_len), clips)
+    print('{:36s} {:8.1f} clips/sec'.format('frame folders', speed))
+    for name, cache_mb, decode_threads in [('packed', 0, 0),
+                                           ('packed, {} decode threads'.format(args.decode_threads), 0,
+                                            args.decode_threads),
+                                           ('packed, {}MB cache'.format(args.cache_mb), args.cache_mb, 0)]:
+        reader = ClipReader(prefix, cache_bytes=cache_mb << 20, decode_threads=decode_threads)
+        speed = clips_per_sec(lambda vid, start: reader.load_clip(vid, start, args.clip_len), clips)
+        print('{:36s} {:8.1f} clips/sec'.format(name, speed))
+
+    reader = ClipReader(prefix, cache_bytes=args.cache_mb << 20)
+    max_diff, diff_fraction = pixel_differences(clips[::25], args.frames_dir, reader, args.clip_len)
+    print('packed vs frame folders: max pixel difference {}, {:.4%} of the values differ'.format(max_diff,
+                                                                                                 diff_fraction))
+
+
+if __name__ == '__main__':
+    main(parse_args())
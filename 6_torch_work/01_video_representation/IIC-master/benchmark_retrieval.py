@@ -0,0 +1,80 @@
+"""
+Time and memory of the top-k retrieval of retrieve_clips.py, the full cosine distance matrix sorted by
+np.argsort with a loop over the test samples, and of lib.retrieval.topk_retrieval_accuracy, on synthetic
+features of --num_classes classes (10 clips per video as extracted by retrieve_clips.py):
+
+    python benchmark_retrieval.py --num_train 20000 --num_test 5000 --dim 512
+    python benchmark_retrieval.py --num_train 200000 --num_test 20000 --skip_full
+
+The train features are read from memory-mapped .npy shards of --shard_size videos.
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_distances
+
+from lib.retrieval import load_feature_shards, topk_retrieval_accuracy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_train', type=int, default=20000)
+    parser.add_argument('--num_test', type=int, default=5000)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--num_classes', type=int, default=101)
+    parser.add_argument('--shard_size', type=int, default=10000)
+    parser.add_argument('--skip_full', action='store_true', help='skip the full distance matrix')
+    return parser.parse_args()
+
+
+def synthetic_features(feature_dir, split, num_videos, args, rng):
+    """ Gaussian features around a center per class, saved in shards as <split>_feature_<i>.npy """
+    centers = np.random.RandomState(0).randn(args.num_classes, args.dim).astype(np.float32)
+    for i, start in enumerate(range(0, num_videos, args.shard_size)):
+        n = min(args.shard_size, num_videos - start)
+        classes = rng.randint(0, args.num_classes, n)
+        features = centers[classes][:, None] + 30 * rng.randn(n, 10, args.dim).astype(np.float32)
+        np.save(os.path.join(feature_dir, '{}_feature_{:03d}.npy'.format(split, i)), features)
+        np.save(os.path.join(feature_dir, '{}_class_{:03d}.npy'.format(split, i)), np.repeat(classes[:, None], 10, 1))
+
+
+def full_topk_retrieval(X_train, y_train, X_test, y_test, ks):
+    """ topk_retrieval of retrieve_clips.py before the blocks """
+    X_train, y_train = np.mean(np.concatenate(X_train), 1), np.concatenate(y_train)[:, 0]
+    X_test, y_test = np.mean(np.concatenate(X_test), 1), np.concatenate(y_test)[:, 0]
+    topk_correct = {k: 0 for k in ks}
+    distances = cosine_distances(X_test, X_train)
+    indices = np.argsort(distances)
+    for k in ks:
+        top_k_indices = indices[:, :k]
+        for ind, test_label in zip(top_k_indices, y_test):
+            labels = y_train[ind]
+            if test_label in labels:
+                topk_correct[k] += 1
+    return topk_correct
+
+
+def main(args):
+    feature_dir = tempfile.mkdtemp()
+    rng = np.random.RandomState(1)
+    synthetic_features(feature_dir, 'train', args.num_train, args, rng)
+    synthetic_features(feature_dir, 'test', args.num_test, args, rng)
+    X_train, y_train = load_feature_shards(feature_dir, 'train')
+    X_test, y_test = load_feature_shards(feature_dir, 'test')
+    ks = [1, 5, 10, 20, 50]
+
+    start_time = time.time()
+    topk_correct, class_accuracy = topk_retrieval_accuracy(X_test, y_test, X_train, y_train, ks)
+    print('blocks: {:.1f}s  {}'.format(time.time() - start_time, topk_correct))
+    if not args.skip_full:
+        print('full distance matrix: {:.1f} GB of distances and indices'.format(16 * args.num_test * args.num_train / 2 ** 30))
+        start_time = time.time()
+        full_correct = full_topk_retrieval(X_train, y_train, X_test, y_test, ks)
+        print('full:   {:.1f}s  {}'.format(time.time() - start_time, full_correct))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,139 @@
+"""Frames of many videos packed in one file.
+
+pack_frame_dirs writes the frame JPEGs of the video folders of a directory (path/to/dataset/video_id/frames.jpg,
+as jpegs_256 or tvl1_flow/u) one after the other in <prefix>.bin, the frames of a video contiguous and sorted
+by name as in the datasets, and their offsets in <prefix>.npz. ClipReader reads and decodes only the frames of
+a clip, optionally keeping the decoded frames in a bounded LRU cache.
+"""
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+
+def read_frame_dir(folder):
+    """Bytes of the frame files of a video folder, sorted by name ('n_frames' skipped)."""
+    framenames = sorted(f for f in os.listdir(folder) if f != 'n_frames')
+    frames = []
+    for name in framenames:
+        with open(os.path.join(folder, name), 'rb') as f:
+            frames.append(f.read())
+    return frames
+
+
+def pack_frame_dirs(frames_dir, prefix, videos=None, workers=8):
+    """Packs the video folders `videos` (default: all the folders) of frames_dir in prefix.bin / prefix.npz.
+    `workers` processes read the folders, the frames are written in the order of videos."""
+    if videos is None:
+        videos = sorted(d for d in os.listdir(frames_dir) if os.path.isdir(os.path.join(frames_dir, d)))
+    folders = [os.path.join(frames_dir, vid) for vid in videos]
+    pool = Pool(workers) if workers > 1 else None
+    all_frames = pool.imap(read_frame_dir, folders) if pool else map(read_frame_dir, folders)
+
+    frame_start, offset, length = [0], [], []
+    position = 0
+    with open(prefix + '.bin', 'wb') as out:
+        for frames in all_frames:
+            for frame in frames:
+                out.write(frame)
+                offset.append(position)
+                length.append(len(frame))
+                position += len(frame)
+            frame_start.append(len(offset))
+    if pool:
+        pool.close()
+        pool.join()
+    np.savez(prefix + '.npz', videos=np.array(videos, dtype=str), frame_start=np.array(frame_start, dtype=np.int64),
+             offset=np.array(offset, dtype=np.int64), length=np.array(length, dtype=np.int64))
+
+
+def decode_frame(data):
+    # H x W x 3 uint8 RGB, as readim. readim decodes with accimage, which only reads files: both decoders use
+    # libjpeg, the pixels are the same with the same libjpeg build and may differ by a few levels otherwise
+    # (benchmark_clip_storage.py prints the differences)
+    return np.asarray(Image.open(io.BytesIO(data)).convert('RGB'))
+
+
+class ClipReader(object):
+    """Clips of the videos packed by pack_frame_dirs.
+    Args:
+        prefix (string): prefix of the .bin and .npz files.
+        cache_bytes (int): size of the LRU cache of decoded frames, 0 for no cache. Each DataLoader worker
+            has its own cache, clips overlapping cached frames (other tuples, epochs or modalities of the
+            same sample) only decode the missing ones.
+        decode_threads (int): threads decoding the frames of a clip, 0 to decode them in the calling thread.
+    """
+    def __init__(self, prefix, cache_bytes=0, decode_threads=0):
+        self.prefix = prefix
+        with np.load(prefix + '.npz') as index:
+            self.videos = list(index['videos'])
+            self.frame_start = index['frame_start']
+            self.offset, self.length = index['offset'], index['length']
+        self.video_index = {vid: i for i, vid in enumerate(self.videos)}
+        self.cache_bytes = cache_bytes
+        self.decode_threads = decode_threads
+        self._init_process_state()
+
+    def _init_process_state(self):
+        # opened lazily in each DataLoader worker
+        self._data = None
+        self._pool = None
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ['_data', '_pool', '_cache', '_cached_bytes']:
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_process_state()
+
+    def num_frames(self, vid):
+        i = self.video_index[vid]
+        return int(self.frame_start[i + 1] - self.frame_start[i])
+
+    def _cache_get(self, key):
+        frame = self._cache.get(key)
+        if frame is not None:
+            self._cache.move_to_end(key)
+        return frame
+
+    def _cache_put(self, key, frame):
+        if frame.nbytes > self.cache_bytes:
+            return
+        self._cache[key] = frame
+        self._cached_bytes += frame.nbytes
+        while self._cached_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+
+    def load_clip(self, vid, start_index, clip_len):
+        """clip_len x H x W x 3 uint8 frames of vid from start_index, as load_one_clip."""
+        if self._data is None:
+            self._data = np.memmap(self.prefix + '.bin', dtype=np.uint8, mode='r')
+        if start_index < 0 or start_index + clip_len > self.num_frames(vid):
+            raise IndexError('frames {}-{} of {} ({} frames)'.format(
+                start_index, start_index + clip_len, vid, self.num_frames(vid)))
+        first = self.frame_start[self.video_index[vid]] + start_index
+        frames = [self._cache_get(first + i) for i in range(clip_len)] if self.cache_bytes else [None] * clip_len
+        missing = [i for i in range(clip_len) if frames[i] is None]
+        data = [self._data[self.offset[first + i]:self.offset[first + i] + self.length[first + i]].tobytes()
+                for i in missing]
+        if self.decode_threads > 0 and len(missing) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.decode_threads)
+            decoded = list(self._pool.map(decode_frame, data))
+        else:
+            decoded = [decode_frame(d) for d in data]
+        for i, frame in zip(missing, decoded):
+            frames[i] = frame
+            if self.cache_bytes:
+                self._cache_put(first + i, frame)
+        return np.array(frames)
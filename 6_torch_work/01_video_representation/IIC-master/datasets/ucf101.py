@@ -10,6 +10,8 @@ from PIL import Image
 
 import accimage
 
+from datasets.clip_storage import ClipReader
+
 
 def image_to_np(image):
   image_np = np.empty([image.channels, image.height, image.width], dtype=np.uint8)
@@ -48,6 +50,13 @@ def load_one_clip(foldername, framenames, start_index, clip_len):
     return np.array(one_clip)
 
 
+def load_clips(clip_readers, folders, vid, framenames, start_index, clip_len):
+    """rgb, u and v clips, from the packed frames if clip_readers else from the frame folders"""
+    if clip_readers:
+        return [reader.load_clip(vid, start_index, clip_len) for reader in clip_readers]
+    return [load_one_clip(folder, framenames, start_index, clip_len) for folder in folders]
+
+
 class UCF101Dataset(Dataset):
     """UCF101 dataset for recognition. The class index start from 0.
     Args:
@@ -57,7 +66,7 @@ class UCF101Dataset(Dataset):
         transforms_ (object): composed transforms which takes in PIL image and output tensors.
         test_sample_num： number of clips sampled from a video. 1 for clip accuracy.
     """
-    def __init__(self, root_dir, clip_len=16, split='1', train=True, transforms_=None, test_sample_num=10):
+    def __init__(self, root_dir, clip_len=16, split='1', train=True, transforms_=None, test_sample_num=10, packed_dir=None, cache_mb=0):
         self.root_dir = root_dir
         self.clip_len = clip_len
         self.split = split
@@ -65,6 +74,11 @@ class UCF101Dataset(Dataset):
         self.transforms_ = transforms_
         self.test_sample_num = test_sample_num
         self.toPIL = transforms.ToPILImage()
+        # rgb, u and v frames packed by pack_frames.py, read instead of the frame folders
+        self.clip_readers = None
+        if packed_dir:
+            self.clip_readers = [ClipReader(os.path.join(packed_dir, modality), cache_bytes=cache_mb << 20)
+                                 for modality in ['rgb', 'u', 'v']]
         class_idx_path = os.path.join(root_dir, 'split', 'classInd.txt')
         self.class_idx2label = pd.read_csv(class_idx_path, header=None, sep=' ').set_index(0)[1]
         self.class_label2idx = pd.read_csv(class_idx_path, header=None, sep=' ').set_index(1)[0]
@@ -105,17 +119,21 @@ class UCF101Dataset(Dataset):
             vid = vids[0] + '_HandstandPushups_' + vids[2] + '_' + vids[3]
         #'''
 
-        rgb_folder = os.path.join('/work/taoli/ucf101/jpegs_256/', vid)
-        u_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/u/', vid)
-        v_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/v/', vid)
-
-        filenames = ['frame000001.jpg']
-        for parent, dirnames, filenames in os.walk(rgb_folder):
-            if 'n_frames' in filenames:
-                filenames.remove('n_frames')
-            filenames = sorted(filenames)
-        framenames = filenames
-        length = len(framenames) - 1
+        if self.clip_readers:
+            rgb_folder = u_folder = v_folder = framenames = None
+            length = self.clip_readers[0].num_frames(vid) - 1
+        else:
+            rgb_folder = os.path.join('/work/taoli/ucf101/jpegs_256/', vid)
+            u_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/u/', vid)
+            v_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/v/', vid)
+
+            filenames = ['frame000001.jpg']
+            for parent, dirnames, filenames in os.walk(rgb_folder):
+                if 'n_frames' in filenames:
+                    filenames.remove('n_frames')
+                filenames = sorted(filenames)
+            framenames = filenames
+            length = len(framenames) - 1
         if length < 16:
             print(vid, length)
             print('\n')
@@ -124,9 +142,8 @@ class UCF101Dataset(Dataset):
         # random select a clip for train
         if self.train:
             clip_start = random.randint(0, length - self.clip_len)
-            clip = load_one_clip(rgb_folder, framenames, clip_start, self.clip_len)
-            u_clip = load_one_clip(u_folder, framenames, clip_start, self.clip_len)
-            v_clip = load_one_clip(v_folder, framenames, clip_start, self.clip_len)
+            clip, u_clip, v_clip = load_clips(self.clip_readers, [rgb_folder, u_folder, v_folder], vid,
+                                              framenames, clip_start, self.clip_len)
 
             if self.transforms_:
                 trans_clip = []
@@ -167,9 +184,8 @@ class UCF101Dataset(Dataset):
             for i in np.linspace(self.clip_len/2, length-self.clip_len/2, self.test_sample_num):
                 clip_start = int(i - self.clip_len/2)
                 #clip = videodata[clip_start: clip_start + self.clip_len]
-                clip = load_one_clip(rgb_folder, framenames, clip_start, self.clip_len)
-                u_clip = load_one_clip(u_folder, framenames, clip_start, self.clip_len)
-                v_clip = load_one_clip(v_folder, framenames, clip_start, self.clip_len)
+                clip, u_clip, v_clip = load_clips(self.clip_readers, [rgb_folder, u_folder, v_folder], vid,
+                                                  framenames, clip_start, self.clip_len)
                 if self.transforms_:
                     trans_clip = []
                     trans_u_clip = []
@@ -215,13 +231,18 @@ class UCF101ClipRetrievalDataset(Dataset):
         sample_num(int): number of clips per video.
         transforms_ (object): composed transforms which takes in PIL image and output tensors.
     """
-    def __init__(self, root_dir, clip_len, sample_num, train=True, transforms_=None, split='1'):
+    def __init__(self, root_dir, clip_len, sample_num, train=True, transforms_=None, split='1', packed_dir=None, cache_mb=0):
         self.root_dir = root_dir
         self.clip_len = clip_len
         self.sample_num = sample_num
         self.train = train
         self.transforms_ = transforms_
         self.toPIL = transforms.ToPILImage()
+        # rgb, u and v frames packed by pack_frames.py, read instead of the frame folders
+        self.clip_readers = None
+        if packed_dir:
+            self.clip_readers = [ClipReader(os.path.join(packed_dir, modality), cache_bytes=cache_mb << 20)
+                                 for modality in ['rgb', 'u', 'v']]
         class_idx_path = os.path.join(root_dir, 'split', 'classInd.txt')
         self.class_idx2label = pd.read_csv(class_idx_path, header=None, sep=' ').set_index(0)[1]
         self.class_label2idx = pd.read_csv(class_idx_path, header=None, sep=' ').set_index(1)[0]
@@ -259,17 +280,21 @@ class UCF101ClipRetrievalDataset(Dataset):
         if vids[1] == 'HandStandPushups':
             vid = vids[0] + '_HandstandPushups_' + vids[2] + '_' + vids[3]
 
-        rgb_folder = os.path.join('/work/taoli/ucf101/jpegs_256/', vid) # + v_**
-        u_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/u/', vid)
-        v_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/v/', vid)
-
-        filenames = ['frame000001.jpg']
-        for parent, dirnames, filenames in os.walk(rgb_folder):
-            if 'n_frames' in filenames:
-                filenames.remove('n_frames')
-            filenames = sorted(filenames)
-        framenames = filenames
-        length = len(framenames) - 1
+        if self.clip_readers:
+            rgb_folder = u_folder = v_folder = framenames = None
+            length = self.clip_readers[0].num_frames(vid) - 1
+        else:
+            rgb_folder = os.path.join('/work/taoli/ucf101/jpegs_256/', vid) # + v_**
+            u_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/u/', vid)
+            v_folder = os.path.join('/work/taoli/ucf101/tvl1_flow/v/', vid)
+
+            filenames = ['frame000001.jpg']
+            for parent, dirnames, filenames in os.walk(rgb_folder):
+                if 'n_frames' in filenames:
+                    filenames.remove('n_frames')
+                filenames = sorted(filenames)
+            framenames = filenames
+            length = len(framenames) - 1
 
         all_clips = []
         all_u_clips = []
@@ -278,9 +303,8 @@ class UCF101ClipRetrievalDataset(Dataset):
         for i in np.linspace(self.clip_len/2, length-self.clip_len/2, self.sample_num):
             clip_start = int(i - self.clip_len/2)
             #clip = videodata[clip_start: clip_start + self.clip_len]
-            clip = load_one_clip(rgb_folder, framenames, clip_start, self.clip_len)
-            u_clip = load_one_clip(u_folder, framenames, clip_start, self.clip_len)
-            v_clip = load_one_clip(v_folder, framenames, clip_start, self.clip_len)
+            clip, u_clip, v_clip = load_clips(self.clip_readers, [rgb_folder, u_folder, v_folder], vid,
+                                              framenames, clip_start, self.clip_len)
             if self.transforms_:
                 trans_clip = []
                 trans_u_clip = []
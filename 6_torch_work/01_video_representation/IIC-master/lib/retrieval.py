@@ -0,0 +1,88 @@
+"""Top-k retrieval accuracy of test features among train features, by blocks.
+
+The features of a split are an array or a list of arrays (shards, e.g. np.load(path, mmap_mode='r') of the
+.npy files of several replicas), of shape (N, D) or (N, clips, D) averaged over the clips as in
+retrieve_clips.py; the labels are (N,) or (N, clips), the label of the first clip. The train shards are read
+once, block by block, and only the max(ks) nearest neighbours (cosine distance) of each test sample are kept.
+"""
+import glob
+import os
+
+import numpy as np
+import torch
+
+
+def load_feature_shards(feature_dir, split):
+    """Memory-mapped <split>_feature*.npy and <split>_class*.npy of feature_dir, in the order of the names."""
+    feature_paths = sorted(glob.glob(os.path.join(feature_dir, split + '_feature*.npy')))
+    class_paths = sorted(glob.glob(os.path.join(feature_dir, split + '_class*.npy')))
+    assert feature_paths and len(feature_paths) == len(class_paths), (feature_paths, class_paths)
+    features = [np.load(path, mmap_mode='r') for path in feature_paths]
+    labels = [np.load(path, mmap_mode='r') for path in class_paths]
+    return features, labels
+
+
+def _as_list(shards):
+    return list(shards) if isinstance(shards, (list, tuple)) else [shards]
+
+
+def _blocks(shards, block_size):
+    """Normalized float32 feature blocks of the shards, with their first index."""
+    start = 0
+    for shard in _as_list(shards):
+        for i in range(0, len(shard), block_size):
+            block = torch.from_numpy(np.array(shard[i:i + block_size], dtype=np.float32))
+            if block.dim() == 3:
+                block = block.mean(1)
+            yield start + i, torch.nn.functional.normalize(block, dim=1)
+        start += len(shard)
+
+
+def _labels(shards):
+    labels = np.concatenate([np.asarray(shard) for shard in _as_list(shards)])
+    return labels[:, 0] if labels.ndim == 2 else labels
+
+
+def nearest_neighbors(test_features, train_features, k, test_block_size=1024, train_block_size=8192):
+    """Indices (num_test, k) of the k nearest train samples of each test sample, nearest first."""
+    test = torch.cat([block for _, block in _blocks(test_features, test_block_size)])
+    best_sims = torch.full((len(test), 0), -float('inf'))
+    best_indices = torch.zeros((len(test), 0), dtype=torch.long)
+    for start, train in _blocks(train_features, train_block_size):
+        width = min(k, best_sims.size(1) + len(train))
+        new_sims, new_indices = torch.empty((len(test), width)), torch.empty((len(test), width), dtype=torch.long)
+        for i in range(0, len(test), test_block_size):
+            sims, indices = torch.mm(test[i:i + test_block_size], train.t()).topk(min(k, len(train)), dim=1)
+            # merged with the neighbours in the previous train blocks
+            sims = torch.cat([best_sims[i:i + test_block_size], sims], 1)
+            indices = torch.cat([best_indices[i:i + test_block_size], indices + start], 1)
+            sims, order = sims.topk(width, dim=1)
+            new_sims[i:i + test_block_size] = sims
+            new_indices[i:i + test_block_size] = indices.gather(1, order)
+        best_sims, best_indices = new_sims, new_indices
+    return best_indices.numpy()
+
+
+def retrieval_hits(indices, test_labels, train_labels, ks):
+    """{k: (num_test,) bool, a neighbour among the k nearest (columns of indices) has the test label}"""
+    # hit_at[:, j]: a neighbour among the j + 1 nearest has the test label
+    hit_at = np.logical_or.accumulate(train_labels[indices] == test_labels[:, None], axis=1)
+    return {k: hit_at[:, min(k, hit_at.shape[1]) - 1] for k in ks}
+
+
+def topk_retrieval_accuracy(test_features, test_labels, train_features, train_labels, ks=(1, 5, 10, 20, 50),
+                            test_block_size=1024, train_block_size=8192):
+    """Number of test samples with a train sample of their class among their k nearest neighbours, for each
+    k of ks ({k: count}), and the same per class as accuracies ({k: array of num_classes}, nan for the classes
+    without test samples)."""
+    test_labels, train_labels = _labels(test_labels), _labels(train_labels)
+    indices = nearest_neighbors(test_features, train_features, max(ks), test_block_size, train_block_size)
+    hits = retrieval_hits(indices, test_labels, train_labels, ks)
+    num_classes = int(max(test_labels.max(), train_labels.max())) + 1
+    class_count = np.bincount(test_labels, minlength=num_classes)
+    topk_correct, class_accuracy = {}, {}
+    for k in ks:
+        topk_correct[k] = int(hits[k].sum())
+        with np.errstate(invalid='ignore'):
+            class_accuracy[k] = np.bincount(test_labels, weights=hits[k], minlength=num_classes) / class_count
+    return topk_correct, class_accuracy
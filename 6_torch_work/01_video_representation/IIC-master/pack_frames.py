@@ -0,0 +1,35 @@
+"""
+Packs the frame folders of a modality (path/to/dataset/video_id/frames.jpg) in <output>.bin and <output>.npz,
+read by datasets.clip_storage.ClipReader. For the pre-computed frames of the datasets:
+
+    python pack_frames.py --frames_dir /path/to/ucf101/jpegs_256 --output data/ucf101/packed/rgb
+    python pack_frames.py --frames_dir /path/to/ucf101/tvl1_flow/u --output data/ucf101/packed/u
+    python pack_frames.py --frames_dir /path/to/ucf101/tvl1_flow/v --output data/ucf101/packed/v
+    python train_ssl.py --dataset=ucf101 --packed_dir data/ucf101/packed --cache_mb 512
+"""
+import os
+import time
+import argparse
+
+from datasets.clip_storage import pack_frame_dirs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames_dir', type=str, required=True, help='one folder of frames per video')
+    parser.add_argument('--output', type=str, required=True, help='prefix of the .bin and .npz files')
+    parser.add_argument('--workers', type=int, default=8, help='processes reading the folders')
+    return parser.parse_args()
+
+
+def main(args):
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+    pack_frame_dirs(args.frames_dir, args.output, workers=args.workers)
+    print('packed {} in {:.1f}s'.format(args.frames_dir, time.time() - start_time))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -22,6 +22,7 @@ from datasets.hmdb51 import HMDB51ClipRetrievalDataset
 from models.c3d import C3D
 from models.r3d import R3DNet
 from models.r21d import R2Plus1DNet
+from lib.retrieval import load_feature_shards, topk_retrieval_accuracy
 
 import ast
 
@@ -155,37 +156,18 @@ def extract_feature(args):
 def topk_retrieval(args):
     """Extract features from test split and search on train split features."""
     print('Load local .npy files. from ...', args.feature_dir)
-    X_train = np.load(os.path.join(args.feature_dir, 'train_feature.npy'))
-    y_train = np.load(os.path.join(args.feature_dir, 'train_class.npy'))
-    X_train = np.mean(X_train,1)
-    y_train = y_train[:,0]
-    X_train = X_train.reshape((-1, X_train.shape[-1]))
-    y_train = y_train.reshape(-1)
-
-    X_test = np.load(os.path.join(args.feature_dir, 'test_feature.npy'))
-    y_test = np.load(os.path.join(args.feature_dir, 'test_class.npy'))
-    X_test = np.mean(X_test,1)
-    y_test = y_test[:,0]
-    X_test = X_test.reshape((-1, X_test.shape[-1]))
-    y_test = y_test.reshape(-1)
+    X_train, y_train = load_feature_shards(args.feature_dir, 'train')
+    X_test, y_test = load_feature_shards(args.feature_dir, 'test')
 
     ks = [1, 5, 10, 20, 50]
-    topk_correct = {k:0 for k in ks}
+    topk_correct, class_accuracy = topk_retrieval_accuracy(X_test, y_test, X_train, y_train, ks,
+                                                           args.test_block_size, args.train_block_size)
 
-    distances = cosine_distances(X_test, X_train)
-    indices = np.argsort(distances)
-
-    for k in ks:
-        top_k_indices = indices[:, :k]
-        for ind, test_label in zip(top_k_indices, y_test):
-            labels = y_train[ind]
-            if test_label in labels:
-                topk_correct[k] += 1
-    
+    total = sum(len(x) for x in X_test)
     for k in ks:
         correct = topk_correct[k]
-        total = len(X_test)
-        print('Top-{}, correct = {:.2f}, total = {}, acc = {:.3f}'.format(k, correct, total, correct/total))
+        print('Top-{}, correct = {:.2f}, total = {}, acc = {:.3f}, mean class acc = {:.3f}'.format(
+            k, correct, total, correct/total, np.nanmean(class_accuracy[k])))
 
     with open(os.path.join(args.feature_dir, 'topk_correct.json'), 'w') as fp:
         json.dump(topk_correct, fp)
@@ -205,6 +187,8 @@ def parse_args():
     parser.add_argument('--extract', default=True, type=ast.literal_eval, help='extract features when True')
     parser.add_argument('--modality', default='res', type=str, help='modality from [rgb, res, u, v]') 
     parser.add_argument('--merge', default=False, type=ast.literal_eval, help='If True, merge two input.') 
+    parser.add_argument('--test_block_size', type=int, default=1024, help='test features compared at once')
+    parser.add_argument('--train_block_size', type=int, default=8192, help='train features read at once')
     args = parser.parse_args()
     return args
 
@@ -72,6 +72,8 @@ def parse_option():
 
     # dataset
     parser.add_argument('--dataset', type=str, default='ucf101', choices=['ucf101', 'hmdb51'])
+    parser.add_argument('--packed_dir', type=str, default='', help='rgb, u and v frames packed by pack_frames.py (default: frame folders)')
+    parser.add_argument('--cache_mb', type=int, default=0, help='MB of decoded frames cached per modality and worker')
 
     # specify folder
     #parser.add_argument('--data_folder', type=str, default=None, help='path to data')
@@ -263,9 +265,11 @@ def main():
                 transforms.ToTensor()
             ]) 
     if args.dataset == 'ucf101':
-        trainset = UCF101Dataset('./data/ucf101/', transforms_=train_transforms)
+        trainset = UCF101Dataset('./data/ucf101/', transforms_=train_transforms,
+                                 packed_dir=args.packed_dir, cache_mb=args.cache_mb)
     else:
-        trainset = HMDB51Dataset('./data/hmdb51/', transforms_=train_transforms)
+        trainset = HMDB51Dataset('./data/hmdb51/', transforms_=train_transforms,
+                                 packed_dir=args.packed_dir, cache_mb=args.cache_mb)
 
     train_loader = DataLoader(trainset, batch_size=args.batch_size, shuffle=True,
                                         num_workers=args.num_workers, pin_memory=True, drop_last=True)
@@ -0,0 +1,67 @@
+"""
+Time of evaluation.evaluate (NMI, ARI, F and ACC from one contingency table) against the sklearn scores it
+replaced, each computed from the samples, and of the contingency table accumulated over batches:
+
+    python benchmark_evaluation.py --num_samples 10000000 --num_clusters 10
+
+The labels are random, the clusters the labels with --noise of them replaced by random clusters.
+"""
+import time
+import argparse
+
+import numpy as np
+from sklearn import metrics
+from scipy.optimize import linear_sum_assignment
+
+from evaluation import evaluation, cluster_metrics
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_samples', type=int, default=10000000)
+    parser.add_argument('--num_clusters', type=int, default=10)
+    parser.add_argument('--noise', type=float, default=0.4)
+    parser.add_argument('--batch_size', type=int, default=500)
+    return parser.parse_args()
+
+
+def sklearn_evaluate(label, pred):
+    """ evaluate before the contingency table, with scipy's Hungarian for Munkres """
+    nmi = metrics.normalized_mutual_info_score(label, pred)
+    ari = metrics.adjusted_rand_score(label, pred)
+    f = metrics.fowlkes_mallows_score(label, pred)
+    confusion_matrix = metrics.confusion_matrix(label, pred)
+    rows, cols = linear_sum_assignment(-confusion_matrix)
+    acc = confusion_matrix[rows, cols].sum() / len(label)
+    return nmi, ari, f, acc
+
+
+def main(args):
+    rng = np.random.RandomState(0)
+    label = rng.randint(0, args.num_clusters, args.num_samples)
+    pred = np.where(rng.rand(args.num_samples) < args.noise, rng.randint(0, args.num_clusters, args.num_samples),
+                    (label + 3) % args.num_clusters)
+
+    start_time = time.time()
+    scores = evaluation.evaluate(label, pred)
+    print('contingency table: {:.2f}s  NMI = {:.6f} ARI = {:.6f} F = {:.6f} ACC = {:.6f}'.format(
+        time.time() - start_time, *scores))
+
+    start_time = time.time()
+    contingency = cluster_metrics.ClusterContingency()
+    for i in range(0, args.num_samples, args.batch_size):
+        contingency.add(label[i:i + args.batch_size], pred[i:i + args.batch_size])
+    streamed = cluster_metrics.cluster_scores(contingency.table)
+    print('batches of {}:    {:.2f}s  NMI = {:.6f} ARI = {:.6f} F = {:.6f} ACC = {:.6f}'.format(
+        args.batch_size, time.time() - start_time, streamed['NMI'], streamed['ARI'], streamed['FMI'],
+        streamed['ACC']))
+
+    start_time = time.time()
+    reference = sklearn_evaluate(label, pred)
+    print('sklearn:           {:.2f}s  NMI = {:.6f} ARI = {:.6f} F = {:.6f} ACC = {:.6f}'.format(
+        time.time() - start_time, *reference))
+    print('max difference: {:.2e}'.format(max(abs(a - b) for a, b in zip(scores, reference))))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -1,33 +1,29 @@
 import numpy as np
 from sklearn import metrics
-from munkres import Munkres
+from scipy.optimize import linear_sum_assignment
+from evaluation import cluster_metrics
 
 
 def evaluate(label, pred):
-    nmi = metrics.normalized_mutual_info_score(label, pred)
-    ari = metrics.adjusted_rand_score(label, pred)
-    f = metrics.fowlkes_mallows_score(label, pred)
-    pred_adjusted = get_y_preds(label, pred, len(set(label)))
-    acc = metrics.accuracy_score(pred_adjusted, label)
+    # all the scores from one contingency table instead of one pass over the samples each
+    table = cluster_metrics.contingency_table(label, pred)
+    nmi = cluster_metrics.nmi(table)
+    ari = cluster_metrics.ari(table)
+    f = cluster_metrics.fmi(table)
+    acc = cluster_metrics.accuracy(table)
     return nmi, ari, f, acc
 
 
 def calculate_cost_matrix(C, n_clusters):
-    cost_matrix = np.zeros((n_clusters, n_clusters))
     # cost_matrix[i,j] will be the cost of assigning cluster i to label j
-    for j in range(n_clusters):
-        s = np.sum(C[:, j])  # number of examples in cluster i
-        for i in range(n_clusters):
-            t = C[i, j]
-            cost_matrix[j, i] = s - t
-    return cost_matrix
+    # C.sum(0)[j]: number of examples in cluster j
+    return C.sum(0)[:n_clusters, None] - C[:n_clusters, :n_clusters].T
 
 
 def get_cluster_labels_from_indices(indices):
-    n_clusters = len(indices)
-    cluster_labels = np.zeros(n_clusters)
-    for i in range(n_clusters):
-        cluster_labels[i] = indices[i][1]
+    rows, cols = indices
+    cluster_labels = np.zeros(len(rows))
+    cluster_labels[rows] = cols
     return cluster_labels
 
 
@@ -44,7 +40,7 @@ def get_y_preds(y_true, cluster_assignments, n_clusters):
     confusion_matrix = metrics.confusion_matrix(y_true, cluster_assignments, labels=None)
     # compute accuracy based on optimal 1:1 assignment of clusters to labels
     cost_matrix = calculate_cost_matrix(confusion_matrix, n_clusters)
-    indices = Munkres().compute(cost_matrix)
+    indices = linear_sum_assignment(cost_matrix)
     kmeans_to_true_cluster_labels = get_cluster_labels_from_indices(indices)
 
     if np.min(cluster_assignments) != 0:
@@ -40,7 +40,7 @@ def run(args):
     # model
     torch.cuda.set_device(args.gpuid[0])
     sbert = SentenceTransformer(MODEL_CLASS[args.bert])
-    cluster_centers = get_kmeans_centers(sbert, train_loader, args.num_classes) 
+    cluster_centers = get_kmeans_centers(sbert, train_loader, args.num_classes, random_state=args.seed)
     model = SCCLBert(sbert, cluster_centers=cluster_centers, alpha=args.alpha)  
     model = model.cuda()
 
@@ -0,0 +1,124 @@
+"""
+Clustering scores computed from the contingency table of the labels and the clusters.
+
+The table is built with one np.bincount per batch of labels (ClusterContingency accumulates it over batches),
+ACC, NMI, ARI, FMI and purity are then computed from the table only, with the same values as the per sample
+implementations (cluster_acc, sklearn's normalized_mutual_info_score, adjusted_rand_score and
+fowlkes_mallows_score).
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+def contingency_table(y_true, y_pred, n_true=None, n_pred=None):
+    """(n_true, n_pred) int64 table, table[i, j] = number of samples of label i in cluster j.
+    Labels and clusters are non-negative integers, n_true / n_pred default to their max + 1."""
+    y_true, y_pred = np.asarray(y_true, dtype=np.int64).ravel(), np.asarray(y_pred, dtype=np.int64).ravel()
+    assert y_true.size == y_pred.size
+    n_true = n_true or (int(y_true.max()) + 1 if y_true.size else 0)
+    n_pred = n_pred or (int(y_pred.max()) + 1 if y_pred.size else 0)
+    return np.bincount(y_true * n_pred + y_pred, minlength=n_true * n_pred).reshape(n_true, n_pred)
+
+
+def _entropy(counts):
+    counts = counts[counts > 0].astype(np.float64)
+    if counts.size == 1:
+        return 1.0
+    total = counts.sum()
+    return -np.sum((counts / total) * (np.log(counts) - np.log(total)))
+
+
+def optimal_assignment(table):
+    """(rows, cols) of the one-to-one label/cluster matching with the most samples."""
+    return linear_sum_assignment(table, maximize=True)
+
+
+def accuracy(table):
+    """Clustering accuracy: fraction of the samples in the best one-to-one matching (Hungarian)."""
+    rows, cols = optimal_assignment(table)
+    return table[rows, cols].sum() / table.sum()
+
+
+def purity(table):
+    """Fraction of the samples of the majority label of their cluster."""
+    return table.max(0).sum() / table.sum()
+
+
+def _nonempty(table):
+    return table[table.sum(1) > 0][:, table.sum(0) > 0]
+
+
+def mutual_info(table):
+    """Mutual information (nats) of the labels and the clusters, as sklearn's mutual_info_score."""
+    table = _nonempty(table)
+    if table.shape[0] <= 1 or table.shape[1] <= 1:
+        return 0.0
+    total = float(table.sum())
+    row_sums, col_sums = table.sum(1), table.sum(0)
+    i, j = np.nonzero(table)
+    n_ij = table[i, j].astype(np.float64)
+    log_outer = np.log(total) + np.log(total) - np.log(row_sums[i] * col_sums[j])
+    mi = n_ij / total * (np.log(n_ij) - np.log(total)) + n_ij / total * log_outer
+    mi = np.where(np.abs(mi) < np.finfo(mi.dtype).eps, 0.0, mi)
+    return max(float(mi.sum()), 0.0)
+
+
+def nmi(table):
+    """Normalized mutual information, arithmetic normalization (sklearn's default)."""
+    table = _nonempty(table)
+    if table.shape[0] == table.shape[1] <= 1:
+        return 1.0
+    mi = mutual_info(table)
+    if mi == 0:
+        return 0.0
+    return float(mi / ((_entropy(table.sum(1)) + _entropy(table.sum(0))) / 2))
+
+
+def _pair_counts(table):
+    """sum_ij n_ij^2, sum_i a_i^2, sum_j b_j^2 and n, as python ints for the products of ari."""
+    return (int((table ** 2).sum()), int((table.sum(1) ** 2).sum()), int((table.sum(0) ** 2).sum()),
+            int(table.sum()))
+
+
+def ari(table):
+    """Adjusted Rand index, from the pair confusion matrix as sklearn."""
+    sum_squares, row_squares, col_squares, n = _pair_counts(table)
+    tp = sum_squares - n
+    fp = col_squares - sum_squares
+    fn = row_squares - sum_squares
+    tn = n ** 2 - fp - fn - sum_squares
+    if fn == 0 and fp == 0:
+        return 1.0
+    return 2.0 * (tp * tn - fn * fp) / ((tp + fn) * (fn + tn) + (tp + fp) * (fp + tn))
+
+
+def fmi(table):
+    """Fowlkes-Mallows index."""
+    sum_squares, row_squares, col_squares, n = _pair_counts(table)
+    tk, pk, qk = sum_squares - n, col_squares - n, row_squares - n
+    return float(np.sqrt(tk / pk) * np.sqrt(tk / qk)) if tk != 0 else 0.0
+
+
+def cluster_scores(table):
+    return {'ACC': accuracy(table), 'NMI': nmi(table), 'ARI': ari(table), 'FMI': fmi(table),
+            'purity': purity(table)}
+
+
+class ClusterContingency(object):
+    """Contingency table accumulated over batches of (labels, clusters), the table grows with them."""
+    def __init__(self, n_true=0, n_pred=0):
+        self.table = np.zeros((n_true, n_pred), dtype=np.int64)
+
+    def add(self, y_true, y_pred):
+        y_true, y_pred = np.asarray(y_true, dtype=np.int64).ravel(), np.asarray(y_pred, dtype=np.int64).ravel()
+        if y_true.size == 0:
+            return
+        n_true = max(self.table.shape[0], int(y_true.max()) + 1)
+        n_pred = max(self.table.shape[1], int(y_pred.max()) + 1)
+        if (n_true, n_pred) != self.table.shape:
+            self.table = np.pad(self.table, ((0, n_true - self.table.shape[0]), (0, n_pred - self.table.shape[1])))
+        self.table += contingency_table(y_true, y_pred, n_true, n_pred)
+
+    def scores(self):
+        return cluster_scores(self.table)
@@ -7,37 +7,39 @@ Date: 02/26/2021
 
 import torch
 import numpy as np
-from utils.metric import Confusion
-from sklearn.cluster import KMeans
+from utils.cluster_metrics import ClusterContingency, accuracy
+from sklearn.cluster import MiniBatchKMeans
+
+def get_kmeans_centers(embedder, train_loader, num_classes, chunk_size=4096, random_state=None):
+    """Mini-batch k-means over the embeddings of train_loader, fitted chunk by chunk of about chunk_size
+    embeddings while they are encoded, without keeping them. The clustering accuracy is that of the cluster
+    of each chunk when it is fitted."""
+    chunk_size = max(chunk_size, 3 * num_classes)
+    clustering_model = MiniBatchKMeans(n_clusters=num_classes, random_state=random_state)
+    contingency = ClusterContingency(num_classes, num_classes)
+    chunk_embeddings, chunk_labels = [], []
+    num_embeddings = 0
+
+    def fit_chunk():
+        embeddings = np.concatenate(chunk_embeddings, axis=0)
+        labels = torch.cat(chunk_labels, dim=0)
+        clustering_model.partial_fit(embeddings)
+        contingency.add(labels.numpy(), clustering_model.predict(embeddings))
+        del chunk_embeddings[:], chunk_labels[:]
 
-def get_kmeans_centers(embedder, train_loader, num_classes):
     for i, batch in enumerate(train_loader):
 
         text, label = batch['text'], batch['label']
         corpus_embeddings = embedder.encode(text)
-        # print("corpus_embeddings", type(corpus_embeddings), corpus_embeddings.shape)
-        if i == 0:
-            all_labels = label
-            all_embeddings = corpus_embeddings
-        else:
-            all_labels = torch.cat((all_labels, label), dim=0)
-            all_embeddings = np.concatenate((all_embeddings, corpus_embeddings), axis=0)
-
-    # Perform kmean clustering
-    confusion = Confusion(num_classes)
-    clustering_model = KMeans(n_clusters=num_classes)
-    clustering_model.fit(all_embeddings)
-    cluster_assignment = clustering_model.labels_
-
-    true_labels = all_labels
-    pred_labels = torch.tensor(cluster_assignment)    
-    print("all_embeddings:{}, true_labels:{}, pred_labels:{}".format(all_embeddings.shape, len(true_labels), len(pred_labels)))
-
-    confusion.add(pred_labels, true_labels)
-    confusion.optimal_assignment(num_classes)
-    print("Iterations:{}, Clustering ACC:{:.3f}, centers:{}".format(clustering_model.n_iter_, confusion.acc(), clustering_model.cluster_centers_.shape))
+        chunk_embeddings.append(corpus_embeddings)
+        chunk_labels.append(label)
+        num_embeddings += len(corpus_embeddings)
+        if sum(len(e) for e in chunk_embeddings) >= chunk_size:
+            fit_chunk()
+    if chunk_embeddings:
+        fit_chunk()
+
+    print("all_embeddings:{}, true_labels:{}".format((num_embeddings, clustering_model.cluster_centers_.shape[1]), contingency.table.sum()))
+    print("Iterations:{}, Clustering ACC:{:.3f}, centers:{}".format(clustering_model.n_steps_, accuracy(contingency.table), clustering_model.cluster_centers_.shape))
     
     return clustering_model.cluster_centers_
-
-
-
@@ -11,20 +11,13 @@ import torch
 import numpy as np
 from scipy.optimize import linear_sum_assignment as hungarian
 from sklearn.metrics.cluster import normalized_mutual_info_score, adjusted_rand_score, adjusted_mutual_info_score
+from utils.cluster_metrics import contingency_table, accuracy, nmi, ari
 
 cluster_nmi = normalized_mutual_info_score
 def cluster_acc(y_true, y_pred):
     y_true = y_true.astype(np.int64)
     assert y_pred.size == y_true.size
-    D = max(y_pred.max(), y_true.max()) + 1
-    w = np.zeros((D, D), dtype=np.int64)
-    for i in range(y_pred.size):
-        w[y_pred[i], y_true[i]] += 1
-  
-    # ind = sklearn.utils.linear_assignment_.linear_assignment(w.max() - w)
-    # row_ind, col_ind = linear_assignment(w.max() - w)
-    row_ind, col_ind = hungarian(w.max() - w)
-    return sum([w[i, j] for i, j in zip(row_ind, col_ind)]) * 1.0 / y_pred.size
+    return accuracy(contingency_table(y_true, y_pred))
 
 class AverageMeter(object):
     """Computes and stores the average and current value"""
@@ -165,24 +158,16 @@ class Confusion(object):
             print('')
         
     def conf2label(self):
-        conf=self.conf
-        gt_classes_count=conf.sum(1).squeeze()
-        n_sample = gt_classes_count.sum().item()
-        gt_label = torch.zeros(n_sample)
-        pred_label = torch.zeros(n_sample)
-        cur_idx = 0
-        for c in range(conf.size(0)):
-            if gt_classes_count[c]>0:
-                gt_label[cur_idx:cur_idx+gt_classes_count[c]].fill_(c)
-            for p in range(conf.size(1)):
-                if conf[c][p]>0:
-                    pred_label[cur_idx:cur_idx+conf[c][p]].fill_(p)
-                cur_idx = cur_idx + conf[c][p];
+        conf=self.conf.cpu()
+        rows,cols = conf.size()
+        gt_label = torch.repeat_interleave(torch.arange(rows), conf.sum(1)).float()
+        pred_label = torch.repeat_interleave(torch.arange(cols).repeat(rows), conf.reshape(-1)).float()
         return gt_label,pred_label
     
     def clusterscores(self):
+        conf = self.conf.cpu().numpy()
         target,pred = self.conf2label()
-        NMI = normalized_mutual_info_score(target,pred)
-        ARI = adjusted_rand_score(target,pred)
+        NMI = nmi(conf)
+        ARI = ari(conf)
         AMI = adjusted_mutual_info_score(target,pred)
         return {'NMI':NMI,'ARI':ARI,'AMI':AMI}
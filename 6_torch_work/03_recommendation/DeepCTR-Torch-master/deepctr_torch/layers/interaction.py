@@ -1,4 +1,5 @@
 import itertools
+import math
 
 import torch
 import torch.nn as nn
@@ -114,6 +115,10 @@ class BilinearInteraction(nn.Module):
         - **embedding_size** : Positive integer, embedding size of sparse features.
         - **bilinear_type** : String, types of bilinear functions used in this layer.
         - **seed** : A Python integer to use as random seed.
+      Notes
+        - For ``'each'`` and ``'interaction'`` the weights of all fields (or field pairs) are kept in one
+          ``(num_weights, embedding_size, embedding_size)`` parameter and applied with a single ``bmm``.
+          ``state_dict`` still uses one ``bilinear.<k>.weight`` entry per ``nn.Linear``, as in earlier versions.
       References
         - [FiBiNET: Combining Feature Importance and Bilinear feature Interaction for Click-Through Rate Prediction
 Tongwen](https://arxiv.org/pdf/1905.09433.pdf)
@@ -127,47 +132,60 @@ Tongwen](https://arxiv.org/pdf/1905.09433.pdf)
         super(BilinearInteraction, self).__init__()
         self.bilinear_type = bilinear_type
         self.seed = seed
-        self.bilinear = nn.ModuleList()
+        self.row, self.col = [], []
+        for i, j in itertools.combinations(range(filed_size), 2):
+            self.row.append(i)
+            self.col.append(j)
         if self.bilinear_type == "all":
             self.bilinear = nn.Linear(embedding_size,
                                       embedding_size,
                                       bias=False)
-        elif self.bilinear_type == "each":
-            for _ in range(filed_size):
-                self.bilinear.append(
-                    nn.Linear(embedding_size, embedding_size, bias=False))
-        elif self.bilinear_type == "interaction":
-            for i, j in itertools.combinations(range(filed_size), 2):
-                self.bilinear.append(
-                    nn.Linear(embedding_size, embedding_size, bias=False))
+        elif self.bilinear_type in ("each", "interaction"):
+            num_weights = filed_size if self.bilinear_type == "each" else len(self.row)
+            self.weight = nn.Parameter(torch.Tensor(num_weights, embedding_size, embedding_size))
+            for weight in self.weight.data:
+                # same initialization as nn.Linear
+                nn.init.kaiming_uniform_(weight, a=math.sqrt(5))
+            self._register_state_dict_hook(_split_bilinear_weight)
         else:
             raise NotImplementedError
         self.to(device)
 
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict,
+                              missing_keys, unexpected_keys, error_msgs):
+        if self.bilinear_type != "all":
+            keys = [prefix + 'bilinear.%d.weight' % k for k in range(self.weight.shape[0])]
+            if prefix + 'weight' not in state_dict and all(key in state_dict for key in keys):
+                state_dict[prefix + 'weight'] = torch.stack([state_dict.pop(key) for key in keys])
+        super(BilinearInteraction, self)._load_from_state_dict(state_dict, prefix, local_metadata, strict,
+                                                               missing_keys, unexpected_keys, error_msgs)
+
     def forward(self, inputs):
         if len(inputs.shape) != 3:
             raise ValueError(
                 "Unexpected inputs dimensions %d, expect to be 3 dimensions" %
                 (len(inputs.shape)))
-        inputs = torch.split(inputs, 1, dim=1)
+        row = torch.as_tensor(self.row, dtype=torch.long, device=inputs.device)
+        col = torch.as_tensor(self.col, dtype=torch.long, device=inputs.device)
+        # pairs are laid out as (pair, batch, embedding) so that the per-pair
+        # weights are applied as one batched matmul
+        inputs = inputs.transpose(0, 1)
         if self.bilinear_type == "all":
-            p = [
-                torch.mul(self.bilinear(v_i), v_j)
-                for v_i, v_j in itertools.combinations(inputs, 2)
-            ]
+            vid = self.bilinear(inputs).index_select(0, row)
         elif self.bilinear_type == "each":
-            p = [
-                torch.mul(self.bilinear[i](inputs[i]), inputs[j])
-                for i, j in itertools.combinations(range(len(inputs)), 2)
-            ]
+            vid = torch.bmm(inputs, self.weight.transpose(1, 2)).index_select(0, row)
         elif self.bilinear_type == "interaction":
-            p = [
-                torch.mul(bilinear(v[0]), v[1]) for v, bilinear in zip(
-                    itertools.combinations(inputs, 2), self.bilinear)
-            ]
+            vid = torch.bmm(inputs.index_select(0, row), self.weight.transpose(1, 2))
         else:
             raise NotImplementedError
-        return torch.cat(p, dim=1)
+        return torch.mul(vid, inputs.index_select(0, col)).transpose(0, 1)
+
+
+def _split_bilinear_weight(module, state_dict, prefix, local_metadata):
+    """Saves the stacked ``BilinearInteraction.weight`` as one ``bilinear.<k>.weight`` per ``nn.Linear``."""
+    weight = state_dict.pop(prefix + 'weight')
+    for k in range(weight.shape[0]):
+        state_dict[prefix + 'bilinear.%d.weight' % k] = weight[k]
 
 
 class CIN(nn.Module):
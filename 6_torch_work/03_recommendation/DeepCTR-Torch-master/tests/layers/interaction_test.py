@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import itertools
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from deepctr_torch.layers import interaction
+from tests.utils import layer_test
+
+
+def bilinear_reference(state_dict, inputs, bilinear_type):
+    # one nn.Linear per field / field pair, as the layer was originally written
+    inputs = torch.split(inputs, 1, dim=1)
+    if bilinear_type == "all":
+        p = [F.linear(v_i, state_dict['bilinear.weight']) * v_j for v_i, v_j in itertools.combinations(inputs, 2)]
+    elif bilinear_type == "each":
+        p = [F.linear(inputs[i], state_dict['bilinear.%d.weight' % i]) * inputs[j]
+             for i, j in itertools.combinations(range(len(inputs)), 2)]
+    else:
+        p = [F.linear(v[0], state_dict['bilinear.%d.weight' % k]) * v[1]
+             for k, v in enumerate(itertools.combinations(inputs, 2))]
+    return torch.cat(p, dim=1)
+
+
+@pytest.mark.parametrize(
+    'bilinear_type',
+    ["all", "each", "interaction"]
+)
+def test_BilinearInteraction(bilinear_type):
+    field_size, embedding_size = 5, 4
+    layer_test(interaction.BilinearInteraction,
+               kwargs={'filed_size': field_size, 'embedding_size': embedding_size, 'bilinear_type': bilinear_type},
+               input_shape=(2, field_size, embedding_size),
+               expected_output_shape=(2, field_size * (field_size - 1) // 2, embedding_size))
+
+    layer = interaction.BilinearInteraction(field_size, embedding_size, bilinear_type)
+    inputs = torch.randn(3, field_size, embedding_size)
+    state_dict = layer.state_dict()
+    num_linear = {"all": 0, "each": field_size, "interaction": field_size * (field_size - 1) // 2}[bilinear_type]
+    assert all('bilinear.%d.weight' % k in state_dict for k in range(num_linear))
+    assert torch.allclose(layer(inputs), bilinear_reference(state_dict, inputs, bilinear_type), atol=1e-6)
+
+    other = interaction.BilinearInteraction(field_size, embedding_size, bilinear_type)
+    other.load_state_dict(state_dict)
+    assert torch.allclose(other(inputs), layer(inputs))
@@ -0,0 +1,310 @@
+# -*- coding:utf-8 -*-
+"""
+Approximate nearest neighbour retrieval of items for the user embeddings of the matching models, with numpy only:
+
+- ``IVFFlatIndex``: inverted lists over a numpy k-means coarse quantizer, the vectors stored as float32 or int8
+  (scalar quantization), searched batch by batch;
+- ``FlatIndex``: the brute force search, with the same ``add`` / ``search`` API;
+- ``multi_interest_search``: the queries of the multi-interest users of MIND, merged per user;
+- ``recall_at_n``, ``hit_rate`` and ``qps_recall_curve`` to evaluate an index against brute force.
+
+``search`` returns ``(D, I)`` like faiss: the scores (inner product, or minus the squared L2 distance) and the item ids
+of the top k items of every query, best first, ``I = -1`` where fewer than k items were found.
+"""
+import time
+
+import numpy as np
+
+
+def _scores(queries, vectors, metric, sq_norms=None):
+    scores = np.dot(queries, vectors.T)
+    if metric == 'l2':
+        # -|q - x|^2 without the query norm, which does not change the ranking of a query
+        scores *= 2
+        scores -= sq_norms
+    return scores
+
+
+def _topk(scores, k):
+    """Top k columns of every row of scores, best first; (-inf, -1) padded if there are fewer than k columns."""
+    n, m = scores.shape
+    kk = min(k, m)
+    if kk < m:
+        idx = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+    else:
+        idx = np.broadcast_to(np.arange(m), (n, m))
+    top = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-top, axis=1, kind='stable')
+    D = np.full((n, k), -np.inf, dtype=np.float32)
+    I = np.full((n, k), -1, dtype=np.int64)
+    D[:, :kk] = np.take_along_axis(top, order, axis=1)
+    I[:, :kk] = np.take_along_axis(idx, order, axis=1)
+    I[np.isneginf(D)] = -1
+    return D, I
+
+
+def kmeans(x, k, niter=20, max_points_per_centroid=256, seed=1024):
+    """Lloyd k-means on at most ``k * max_points_per_centroid`` sampled rows of x, returns the (k, dim) centroids.
+
+    Empty clusters are re-seeded with random sampled points.
+    """
+    rng = np.random.RandomState(seed)
+    x = np.asarray(x, dtype=np.float32)
+    if len(x) > k * max_points_per_centroid:
+        x = x[np.sort(rng.choice(len(x), k * max_points_per_centroid, replace=False))]
+    if len(x) < k:
+        raise ValueError("kmeans needs at least k={} points, got {}".format(k, len(x)))
+
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(niter):
+        assign = _assign(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        order = np.argsort(assign, kind='stable')
+        sums = np.add.reduceat(x[order], (np.cumsum(counts) - counts)[~empty])
+        centroids[~empty] = sums / counts[~empty, None]
+        centroids[empty] = x[rng.choice(len(x), empty.sum(), replace=False)]
+    return centroids
+
+
+def _assign(x, centroids, batch_size=65536):
+    """Index of the nearest (L2) centroid of every row of x."""
+    sq_norms = (centroids ** 2).sum(1)
+    return np.concatenate([_scores(x[i:i + batch_size], centroids, 'l2', sq_norms).argmax(1)
+                           for i in range(0, len(x), batch_size)]) if len(x) else np.zeros(0, dtype=np.int64)
+
+
+class FlatIndex(object):
+    """Brute force search, the reference of the approximate indexes.
+
+    :param metric: str, ``'ip'`` (inner product, the scores of the matching models) or ``'l2'``.
+    """
+
+    def __init__(self, metric='ip'):
+        if metric not in ('ip', 'l2'):
+            raise ValueError("metric must be 'ip' or 'l2'")
+        self.metric = metric
+        self.vectors = None
+        self.ids = None
+
+    def train(self, x):
+        pass
+
+    def add(self, x, ids=None):
+        x = np.asarray(x, dtype=np.float32)
+        ids = np.arange(len(x)) if ids is None else np.asarray(ids)
+        self.vectors = x if self.vectors is None else np.concatenate([self.vectors, x])
+        self.ids = ids if self.ids is None else np.concatenate([self.ids, ids])
+        self.sq_norms = (self.vectors ** 2).sum(1)
+
+    @property
+    def ntotal(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    def search(self, queries, k, batch_size=1024):
+        queries = np.asarray(queries, dtype=np.float32)
+        # at most 2^24 scores (64MB) per batch
+        batch_size = max(1, min(batch_size, 2 ** 24 // max(self.ntotal, 1)))
+        D, I = [], []
+        for start in range(0, len(queries), batch_size):
+            q = queries[start:start + batch_size]
+            d, i = _topk(_scores(q, self.vectors, self.metric, self.sq_norms), k)
+            D.append(self._finalize(q, d))
+            I.append(np.where(i >= 0, self.ids[i], -1))
+        return np.concatenate(D), np.concatenate(I)
+
+    def _finalize(self, q, D):
+        if self.metric == 'l2':
+            D = D - (q ** 2).sum(1, keepdims=True)
+        return D
+
+
+class IVFFlatIndex(FlatIndex):
+    """Inverted file index: the items are partitioned by a k-means coarse quantizer, and a query only scores the
+    items of its ``nprobe`` closest lists.
+
+    :param nlist: int, number of lists (k-means centroids), default ``4 * sqrt(number of training points)``.
+    :param metric: str, ``'ip'`` or ``'l2'``. The lists are built with L2 k-means and probed with the metric.
+    :param quantize: None or ``'int8'``: store the vectors as int8 codes with a per dimension scale (4x less memory).
+    :param nprobe: int, default number of lists searched per query.
+    :param niter: int, k-means iterations.
+    :param seed: int, k-means seed.
+    """
+
+    def __init__(self, nlist=None, metric='ip', quantize=None, nprobe=8, niter=20, seed=1024):
+        super(IVFFlatIndex, self).__init__(metric)
+        if quantize not in (None, 'int8'):
+            raise ValueError("quantize must be None or 'int8'")
+        self.nlist = nlist
+        self.quantize = quantize
+        self.nprobe = nprobe
+        self.niter = niter
+        self.seed = seed
+        self.centroids = None
+        self.scale = None
+
+    def train(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if self.nlist is None:
+            self.nlist = max(1, int(4 * np.sqrt(len(x))))
+        self.centroids = kmeans(x, self.nlist, self.niter, seed=self.seed)
+        self.centroid_sq_norms = (self.centroids ** 2).sum(1)
+        if self.quantize == 'int8':
+            self.scale = np.maximum(np.abs(x).max(0), 1e-12) / 127.
+
+    def add(self, x, ids=None):
+        if self.centroids is None:
+            raise RuntimeError("train the index before adding vectors")
+        x = np.asarray(x, dtype=np.float32)
+        ids = np.arange(self.ntotal, self.ntotal + len(x)) if ids is None else np.asarray(ids)
+        lists = _assign(x, self.centroids)
+        if self.quantize == 'int8':
+            x = np.clip(np.round(x / self.scale), -127, 127).astype(np.int8)
+        if self.vectors is not None:
+            # re-sort the previous vectors with the new ones
+            x = np.concatenate([self.vectors, x])
+            ids = np.concatenate([self.ids, ids])
+            lists = np.concatenate([np.repeat(np.arange(self.nlist), np.diff(self.offsets)), lists])
+
+        order = np.argsort(lists, kind='stable')
+        self.vectors, self.ids = x[order], ids[order]
+        self.offsets = np.r_[0, np.cumsum(np.bincount(lists, minlength=self.nlist))]
+        self.sq_norms = (self._decode(self.vectors) ** 2).sum(1)
+
+    def _decode(self, codes):
+        if self.quantize == 'int8':
+            return codes.astype(np.float32) * self.scale
+        return codes
+
+    def search(self, queries, k, nprobe=None, batch_size=1024):
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = np.asarray(queries, dtype=np.float32)
+        D, I = [], []
+        for start in range(0, len(queries), batch_size):
+            q = queries[start:start + batch_size]
+            d, i = self._search_batch(q, k, nprobe)
+            D.append(self._finalize(q, d))
+            I.append(i)
+        return np.concatenate(D), np.concatenate(I)
+
+    def _search_batch(self, q, k, nprobe):
+        coarse = _scores(q, self.centroids, self.metric, self.centroid_sq_norms)
+        probes = _topk(coarse, nprobe)[1]
+
+        # candidates of query i from its j-th probed list go to columns [j * k, (j + 1) * k)
+        D = np.full((len(q), nprobe * k), -np.inf, dtype=np.float32)
+        I = np.full((len(q), nprobe * k), -1, dtype=np.int64)
+        flat = probes.ravel()
+        order = np.argsort(flat, kind='stable')
+        lists, bounds = np.unique(flat[order], return_index=True)
+        bounds = np.r_[bounds, len(order)]
+        q_scaled = q * self.scale if self.quantize == 'int8' else q
+
+        for list_id, begin, end in zip(lists, bounds[:-1], bounds[1:]):
+            lo, hi = self.offsets[list_id], self.offsets[list_id + 1]
+            if lo == hi:
+                continue
+            rows, slots = np.divmod(order[begin:end], nprobe)
+            # for int8, (q * scale) . codes == q . decoded vectors
+            codes = self.vectors[lo:hi].astype(np.float32, copy=False)
+            d, i = _topk(_scores(q_scaled[rows], codes, self.metric, self.sq_norms[lo:hi]), k)
+            columns = slots[:, None] * k + np.arange(k)
+            D[rows[:, None], columns] = d
+            I[rows[:, None], columns] = np.where(i >= 0, lo + i, -1)
+
+        D, top = _topk(D, k)
+        I = np.take_along_axis(I, np.maximum(top, 0), axis=1)
+        valid = (top >= 0) & (I >= 0)
+        return D, np.where(valid, self.ids[np.maximum(I, 0)], -1)
+
+
+def multi_interest_search(index, user_embeddings, k, per_interest_k=None, **search_kwargs):
+    """Search the items of the multi-interest user embeddings of MIND: every interest is a query, and the results of
+    the interests of a user are merged (an item keeps its best score) into the user's top k.
+
+    :param index: an index with a ``search(queries, k, **search_kwargs)`` method (``FlatIndex``, ``IVFFlatIndex``, faiss).
+    :param user_embeddings: 3D array ``(num_users, k_max, dim)``, e.g. the output of MIND's user embedding model.
+    :param k: int, number of items returned per user.
+    :param per_interest_k: int, number of items searched per interest, default k.
+    :return: ``(D, I)`` of shape ``(num_users, k)``.
+    """
+    user_embeddings = np.asarray(user_embeddings, dtype=np.float32)
+    num_users, k_max, dim = user_embeddings.shape
+    per_interest_k = per_interest_k or k
+    D, I = index.search(user_embeddings.reshape(-1, dim), per_interest_k, **search_kwargs)
+    D = D.reshape(num_users, k_max * per_interest_k).astype(np.float32)
+    I = I.reshape(num_users, k_max * per_interest_k)
+
+    # sort every row by (item id, -score): the duplicates of an item follow its best score
+    order = np.lexsort((-D, I), axis=1)
+    D, I = np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+    duplicate = np.zeros_like(I, dtype=bool)
+    duplicate[:, 1:] = I[:, 1:] == I[:, :-1]
+    D[duplicate | (I < 0)] = -np.inf
+
+    D, top = _topk(D, k)
+    return D, np.where(top >= 0, np.take_along_axis(I, np.maximum(top, 0), axis=1), -1)
+
+
+def _row_isin(ids, true_ids):
+    """Whether ids[i, j] is in true_ids[i], for every row i."""
+    offset = max(ids.max(initial=0), true_ids.max(initial=0)) + 2
+    rows = np.arange(len(ids))[:, None]
+    true_keys = (rows * offset + true_ids + 1)[true_ids >= 0]
+    return np.isin(rows * offset + ids + 1, true_keys) & (ids >= 0)
+
+
+def recall_at_n(ids, true_ids, N=None):
+    """Mean over the queries of the fraction of ``true_ids[i]`` (e.g. the brute force top N) found in ``ids[i, :N]``.
+
+    The vectorized ``recall_N`` of ``deepmatch.utils`` for all the queries at once.
+    """
+    ids, true_ids = np.asarray(ids), np.asarray(true_ids)
+    if true_ids.ndim == 1:
+        true_ids = true_ids[:, None]
+    if N is not None:
+        ids = ids[:, :N]
+    found = _row_isin(true_ids, ids).sum(1)
+    return float(np.mean(found / np.maximum((true_ids >= 0).sum(1), 1)))
+
+
+def hit_rate(ids, targets, N=None):
+    """Fraction of the queries with at least one of their ``targets`` (e.g. the next clicked item) in ``ids[i, :N]``."""
+    ids, targets = np.asarray(ids), np.asarray(targets)
+    if targets.ndim == 1:
+        targets = targets[:, None]
+    if N is not None:
+        ids = ids[:, :N]
+    return float(np.mean(_row_isin(targets, ids).any(1)))
+
+
+def qps_recall_curve(index, queries, k, nprobes=(1, 2, 4, 8, 16, 32, 64), true_ids=None, exact_index=None):
+    """Queries per second and recall@k against brute force of ``index`` for every ``nprobe``.
+
+    :param index: ``IVFFlatIndex``.
+    :param queries: 2D array of queries, or 3D ``(num_users, k_max, dim)`` for MIND (searched by
+        ``multi_interest_search``).
+    :param k: int, number of items retrieved.
+    :param nprobes: the values of nprobe.
+    :param true_ids: the brute force top k ids, computed with ``exact_index`` if None.
+    :param exact_index: ``FlatIndex`` over the same items, for the true ids.
+    :return: list of dicts with the keys ``nprobe``, ``qps``, ``recall``.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+
+    def search(searcher, **kwargs):
+        if queries.ndim == 3:
+            return multi_interest_search(searcher, queries, k, **kwargs)
+        return searcher.search(queries, k, **kwargs)
+
+    if true_ids is None:
+        true_ids = search(exact_index)[1]
+    curve = []
+    for nprobe in nprobes:
+        if nprobe > index.nlist:
+            break
+        start = time.time()
+        _, ids = search(index, nprobe=nprobe)
+        elapsed = time.time() - start
+        curve.append({'nprobe': nprobe, 'qps': len(queries) / elapsed, 'recall': recall_at_n(ids, true_ids)})
+    return curve
@@ -111,3 +111,127 @@ def gen_model_input_sdm(train_set, user_profile, seq_short_len, seq_prefer_len):
         train_model_input[key] = user_profile.loc[train_model_input['user_id']][key].values
 
     return train_model_input, train_label
+
+
+def _user_sequences(data):
+    """Sort once by timestamp then (stably) by user, as ``data.groupby('user_id')`` of the timestamp sorted data.
+
+    Returns the sorted data, the start offset and the number of rows of each user.
+    """
+    data = data.sort_values("timestamp")
+    order = np.argsort(data['user_id'].values, kind='stable')
+    data = data.iloc[order]
+    user_ids = data['user_id'].values
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]]) if len(data) else np.zeros(0, dtype=np.int64)
+    lengths = np.diff(np.r_[starts, len(data)])
+    return data, starts, lengths
+
+
+def _sample_positions(starts, lengths):
+    """The (user index, target row, history length) of the samples ``i = 1 .. len - 1`` of every user."""
+    num_samples = np.maximum(lengths - 1, 0)
+    user_index = np.repeat(np.arange(len(starts)), num_samples)
+    first_sample = np.cumsum(num_samples) - num_samples
+    hist_len = np.arange(num_samples.sum()) - first_sample[user_index] + 1
+    return user_index, starts[user_index] + hist_len, hist_len
+
+
+def _history(values, target_rows, hist_len, maxlen, skip=0):
+    """Padded (post) reversed histories: row ``j`` is ``values[target_row - 1 - skip - j]`` while ``j < hist_len - skip``."""
+    j = np.arange(maxlen)
+    valid = j < (hist_len - skip)[:, None]
+    rows = np.where(valid, target_rows[:, None] - 1 - skip - j, 0)
+    return np.where(valid, values[rows], 0).astype('int32')
+
+
+def _sample_negatives(item_ids, user_index, starts, lengths, size, rng):
+    """Draw ``size`` negatives per sample, uniformly among the items of ``item_ids`` the sample's user did not click.
+
+    The r-th item not clicked by a user is ``r + k``, k the number of clicked items ``p_j`` (sorted, j-th of the user)
+    with ``p_j - j <= r``: all the users are sampled at once with one searchsorted, without rejection.
+    """
+    items = np.unique(item_ids)
+    num_items = len(items)
+    users = np.repeat(np.arange(len(starts)), lengths)
+    keys = np.unique(users * num_items + np.searchsorted(items, item_ids))
+    pos_users, pos_items = keys // num_items, keys % num_items
+    num_pos = np.bincount(pos_users, minlength=len(starts))
+    first_pos = np.cumsum(num_pos) - num_pos
+    skip_keys = pos_users * num_items + pos_items - (np.arange(len(keys)) - first_pos[pos_users])
+
+    sample_users = np.repeat(user_index, size)
+    num_candidates = num_items - num_pos[sample_users]
+    if (num_candidates <= 0).any():
+        raise ValueError("a user clicked all the items, no negative to sample")
+    r = (rng.random_sample(len(sample_users)) * num_candidates).astype(np.int64)
+    k = np.searchsorted(skip_keys, sample_users * num_items + r, side='right') - first_pos[sample_users]
+    return items[r + k]
+
+
+def gen_data_set_arrays(data, negsample=0, seq_max_len=50, seed=None):
+    """Vectorized ``gen_data_set`` + padding of ``gen_model_input``.
+
+    Same samples as ``gen_data_set`` (negatives drawn from the same distribution), as shuffled dicts of numpy arrays:
+    ``user_id``, ``movie_id``, ``hist_movie_id`` (most recent first, padded to seq_max_len), ``hist_len``, ``label``
+    and ``rating`` (0 for negatives). Use ``gen_model_input_arrays`` to add the user profile.
+    """
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    data, starts, lengths = _user_sequences(data)
+    user_ids, movie_ids, ratings = data['user_id'].values, data['movie_id'].values, data['rating'].values
+    user_index, target_rows, hist_len = _sample_positions(starts, lengths)
+    is_test = target_rows == (starts + lengths - 1)[user_index]
+
+    def make_set(mask, negatives=0):
+        samples = {"user_id": user_ids[target_rows[mask]], "movie_id": movie_ids[target_rows[mask]],
+                   "hist_movie_id": _history(movie_ids, target_rows[mask], hist_len[mask], seq_max_len),
+                   "hist_len": hist_len[mask], "label": np.ones(mask.sum(), dtype=np.int64),
+                   "rating": ratings[target_rows[mask]]}
+        if negatives > 0:
+            neg_items = _sample_negatives(movie_ids, user_index[mask], starts, lengths, negatives, rng)
+            for key, value in samples.items():
+                samples[key] = np.concatenate([value, np.repeat(value, negatives, axis=0)])
+            samples["movie_id"][mask.sum():] = neg_items
+            samples["label"][mask.sum():] = 0
+            samples["rating"][mask.sum():] = 0
+        permutation = rng.permutation(len(samples["label"]))
+        return {key: value[permutation] for key, value in samples.items()}
+
+    return make_set(~is_test, negsample), make_set(is_test)
+
+
+def gen_data_set_sdm_arrays(data, seq_short_len=5, seq_prefer_len=50, seed=None):
+    """Vectorized ``gen_data_set_sdm`` + padding of ``gen_model_input_sdm``.
+
+    Same samples as ``gen_data_set_sdm``, as shuffled dicts of numpy arrays: ``user_id``, ``movie_id``,
+    ``short_movie_id``, ``prefer_movie_id``, ``short_sess_length``, ``prefer_sess_length``, ``short_genres``,
+    ``prefer_genres``, ``label`` and ``rating``. Use ``gen_model_input_arrays`` to add the user profile.
+    """
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    data, starts, lengths = _user_sequences(data)
+    user_ids, movie_ids, genres = data['user_id'].values, data['movie_id'].values, data['genres'].values
+    ratings = data['rating'].values
+    user_index, target_rows, hist_len = _sample_positions(starts, lengths)
+    is_test = target_rows == (starts + lengths - 1)[user_index]
+
+    def make_set(mask):
+        rows, lens = target_rows[mask], hist_len[mask]
+        samples = {"user_id": user_ids[rows], "movie_id": movie_ids[rows],
+                   "short_movie_id": _history(movie_ids, rows, lens, seq_short_len),
+                   "prefer_movie_id": _history(movie_ids, rows, lens, seq_prefer_len, skip=seq_short_len),
+                   "short_sess_length": np.minimum(lens, seq_short_len),
+                   "prefer_sess_length": np.maximum(lens - seq_short_len, 0),
+                   "short_genres": _history(genres, rows, lens, seq_short_len),
+                   "prefer_genres": _history(genres, rows, lens, seq_prefer_len, skip=seq_short_len),
+                   "label": np.ones(len(rows), dtype=np.int64), "rating": ratings[rows]}
+        permutation = rng.permutation(len(rows))
+        return {key: value[permutation] for key, value in samples.items()}
+
+    return make_set(~is_test), make_set(is_test)
+
+
+def gen_model_input_arrays(data_set, user_profile):
+    """Model input and labels of a ``gen_data_set_arrays`` / ``gen_data_set_sdm_arrays`` set."""
+    model_input = {key: value for key, value in data_set.items() if key not in ("label", "rating")}
+    for key in ["gender", "age", "occupation", "zip"]:
+        model_input[key] = user_profile.loc[model_input['user_id']][key].values
+    return model_input, data_set["label"]
@@ -0,0 +1,53 @@
+import argparse
+import time
+
+import numpy as np
+
+from deepmatch.ann import FlatIndex, IVFFlatIndex, multi_interest_search, qps_recall_curve
+
+# QPS / recall@N curve of the numpy IVF-flat index against brute force, on synthetic clustered embeddings:
+#   python run_ann_benchmark.py --num_items 1000000 --dim 32 --num_queries 10000 --k_max 2
+
+
+def synthetic_embeddings(num_items, num_queries, k_max, dim, num_clusters, seed):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(num_clusters, dim).astype(np.float32)
+    items = centers[rng.randint(num_clusters, size=num_items)] + 0.5 * rng.randn(num_items, dim).astype(np.float32)
+    queries = centers[rng.randint(num_clusters, size=(num_queries, k_max))] \
+        + 0.5 * rng.randn(num_queries, k_max, dim).astype(np.float32)
+    return items, queries[:, 0] if k_max == 1 else queries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_items', type=int, default=1000000)
+    parser.add_argument('--num_queries', type=int, default=10000)
+    parser.add_argument('--dim', type=int, default=32)
+    parser.add_argument('--k_max', type=int, default=1, help='interests per user, >1 for MIND')
+    parser.add_argument('--num_clusters', type=int, default=1000)
+    parser.add_argument('--N', type=int, default=50)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobes', type=str, default='1,2,4,8,16,32,64')
+    parser.add_argument('--seed', type=int, default=1024)
+    args = parser.parse_args()
+
+    items, queries = synthetic_embeddings(args.num_items, args.num_queries, args.k_max, args.dim, args.num_clusters,
+                                          args.seed)
+    exact = FlatIndex()
+    exact.add(items)
+    start = time.time()
+    if queries.ndim == 3:
+        true_ids = multi_interest_search(exact, queries, args.N)[1]
+    else:
+        true_ids = exact.search(queries, args.N)[1]
+    print("brute force: {:.0f} qps".format(len(queries) / (time.time() - start)))
+
+    for quantize in (None, 'int8'):
+        index = IVFFlatIndex(nlist=args.nlist, quantize=quantize, seed=args.seed)
+        start = time.time()
+        index.train(items)
+        index.add(items)
+        print("IVF{},{}: built in {:.1f}s".format(index.nlist, quantize or 'flat', time.time() - start))
+        for point in qps_recall_curve(index, queries, args.N, [int(n) for n in args.nprobes.split(',')], true_ids):
+            print("    nprobe {:4d}  {:8.0f} qps  recall@{} {:.4f}".format(point['nprobe'], point['qps'], args.N,
+                                                                          point['recall']))
@@ -81,31 +81,25 @@ if __name__ == "__main__":
     print(user_embs.shape)
     print(item_embs.shape)
 
-    # 5. [Optional] ANN search by faiss  and evaluate the result
-
-    # test_true_label = {line[0]:[line[2]] for line in test_set}
-    #
-    # import numpy as np
-    # import faiss
-    # from tqdm import tqdm
-    # from deepmatch.utils import recall_N
-    #
-    # index = faiss.IndexFlatIP(embedding_dim)
-    # # faiss.normalize_L2(item_embs)
-    # index.add(item_embs)
-    # # faiss.normalize_L2(user_embs)
-    # D, I = index.search(np.ascontiguousarray(user_embs), 50)
-    # s = []
-    # hit = 0
-    # for i, uid in tqdm(enumerate(test_user_model_input['user_id'])):
-    #     try:
-    #         pred = [item_profile['movie_id'].values[x] for x in I[i]]
-    #         filter_item = None
-    #         recall_score = recall_N(test_true_label[uid], pred, N=50)
-    #         s.append(recall_score)
-    #         if test_true_label[uid] in pred:
-    #             hit += 1
-    #     except:
-    #         print(i)
-    # print("recall", np.mean(s))
-    # print("hr", hit / len(test_user_model_input['user_id']))
+    # 5. ANN search with an IVF index of deepmatch.ann and evaluate the result
+
+    import numpy as np
+    from deepmatch.ann import FlatIndex, IVFFlatIndex, multi_interest_search, recall_at_n, hit_rate
+
+    test_true_label = np.array([line[2] for line in test_set])
+    item_ids = item_profile['movie_id'].values
+
+    exact_index = FlatIndex(metric='ip')
+    exact_index.add(item_embs, ids=item_ids)
+    index = IVFFlatIndex(metric='ip', nprobe=4)
+    index.train(item_embs)
+    index.add(item_embs, ids=item_ids)
+
+    if user_embs.ndim == 3:  # MIND: one embedding per interest
+        _, true_ids = multi_interest_search(exact_index, user_embs, 50)
+        _, I = multi_interest_search(index, user_embs, 50)
+    else:
+        _, true_ids = exact_index.search(user_embs, 50)
+        _, I = index.search(user_embs, 50)
+    print("recall of the ANN search", recall_at_n(I, true_ids, N=50))
+    print("hr", hit_rate(I, test_true_label, N=50))
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from deepmatch.ann import FlatIndex, IVFFlatIndex, multi_interest_search, recall_at_n, hit_rate, qps_recall_curve
+
+
+def get_embeddings(num_items=2000, num_queries=100, dim=8, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(20, dim).astype(np.float32)
+    items = centers[rng.randint(20, size=num_items)] + 0.3 * rng.randn(num_items, dim).astype(np.float32)
+    queries = centers[rng.randint(20, size=num_queries)] + 0.3 * rng.randn(num_queries, dim).astype(np.float32)
+    return items, queries
+
+
+@pytest.mark.parametrize(
+    'metric',
+    ['ip', 'l2']
+)
+def test_FlatIndex(metric):
+    items, queries = get_embeddings()
+    index = FlatIndex(metric)
+    index.add(items, ids=np.arange(len(items)) + 10)
+    D, I = index.search(queries, 5)
+    scores = queries @ items.T if metric == 'ip' else -((queries[:, None] - items) ** 2).sum(-1)
+    assert np.array_equal(I, np.argsort(-scores, 1)[:, :5] + 10)
+    assert np.allclose(D, np.sort(scores, 1)[:, ::-1][:, :5], atol=1e-4)
+
+
+@pytest.mark.parametrize(
+    'metric,quantize',
+    [('ip', None), ('l2', None), ('ip', 'int8'), ('l2', 'int8')]
+)
+def test_IVFFlatIndex(metric, quantize):
+    items, queries = get_embeddings()
+    exact = FlatIndex(metric)
+    exact.add(items)
+    true_D, true_I = exact.search(queries, 10)
+
+    index = IVFFlatIndex(nlist=16, metric=metric, quantize=quantize)
+    index.train(items)
+    index.add(items[:1000])
+    index.add(items[1000:])
+    D, I = index.search(queries, 10, nprobe=16)
+    assert D.shape == I.shape == (len(queries), 10)
+    if quantize is None:
+        assert np.array_equal(I, true_I)
+        assert np.allclose(D, true_D, atol=1e-4)
+    else:
+        assert recall_at_n(I, true_I) > 0.9
+
+    curve = qps_recall_curve(index, queries, 10, nprobes=(1, 4, 16), true_ids=true_I)
+    assert [point['nprobe'] for point in curve] == [1, 4, 16]
+    assert curve[0]['recall'] <= curve[-1]['recall']
+
+
+def test_IVFFlatIndex_fewer_items_than_k():
+    items, queries = get_embeddings(num_items=50)
+    index = IVFFlatIndex(nlist=10)
+    index.train(items)
+    index.add(items)
+    D, I = index.search(queries, 10, nprobe=1)
+    assert ((I == -1) == np.isneginf(D)).all()
+    assert (I[:, 0] >= 0).all()
+
+
+def test_multi_interest_search():
+    items, queries = get_embeddings(num_queries=120)
+    user_embeddings = queries.reshape(40, 3, -1)
+    index = FlatIndex()
+    index.add(items)
+    D, I = multi_interest_search(index, user_embeddings, 10)
+    scores = np.max(np.stack([user_embeddings[:, j] @ items.T for j in range(3)]), 0)
+    assert recall_at_n(I, np.argsort(-scores, 1)[:, :10]) == 1.0
+    assert all(len(set(row)) == 10 for row in I)
+
+    ivf = IVFFlatIndex(nlist=16)
+    ivf.train(items)
+    ivf.add(items)
+    curve = qps_recall_curve(ivf, user_embeddings, 10, nprobes=(16,), exact_index=index)
+    assert curve[0]['recall'] == 1.0
+
+
+def test_recall_hit_rate():
+    ids = np.array([[1, 2, 3], [4, 5, -1]])
+    assert recall_at_n(ids, np.array([[1, 9], [5, 4]])) == 0.75
+    assert recall_at_n(ids, np.array([[3], [4]]), N=2) == 0.5
+    assert hit_rate(ids, np.array([3, 7])) == 0.5
+    assert hit_rate(ids, np.array([3, -1]), N=2) == 0.0
+
+
+if __name__ == "__main__":
+    pass
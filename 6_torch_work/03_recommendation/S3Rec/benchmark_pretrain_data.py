@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Samples/sec of the pretraining batches built by PretrainDataset.__getitem__ and by PretrainCollator,
+# and statistics of both samplers, on synthetic user sequences:
+#
+#   python benchmark_pretrain_data.py --num_users 20000 --item_size 12000 --num_batches 200
+
+import time
+import argparse
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, RandomSampler
+
+from datasets import PretrainDataset, PretrainCollator
+from utils import set_seed
+
+
+def synthetic_data(num_users, item_size, attribute_size, seed):
+    rng = np.random.RandomState(seed)
+    popularity = 1.0 / np.arange(1, item_size - 1) ** 0.8
+    popularity /= popularity.sum()
+    user_seq = [(1 + rng.choice(item_size - 2, size=rng.randint(5, 100), p=popularity)).tolist()
+                for _ in range(num_users)]
+    long_sequence = [item for seq in user_seq for item in seq]
+    item2attribute = {str(item): sorted(set(rng.randint(1, attribute_size, size=rng.randint(1, 6)).tolist()))
+                      for item in range(1, item_size - 1) if rng.rand() < 0.9}
+    return user_seq, long_sequence, item2attribute
+
+
+def batch_statistics(batch, args):
+    attributes, masked_item_sequence, pos_items, neg_items, masked_segment_sequence, pos_segment, neg_segment = batch
+    valid = pos_items > 0
+    lengths = valid.sum(1)
+    maskable = valid.clone()
+    maskable[:, -1] = False
+    masked = masked_item_sequence == args.mask_id
+    in_segment = (masked_segment_sequence == args.mask_id) & (lengths >= 2).unsqueeze(1)
+    sample_length = in_segment.sum(1).double()
+    start_id = (in_segment.double().argmax(1) - (args.max_seq_length - lengths)).double()
+    segment_rows = lengths >= 2
+    neg_in_seq = ((neg_items[masked].unsqueeze(1) == pos_items[masked.nonzero()[:, 0]]).any(1)).sum().item()
+    return {
+        'mask rate': (masked & maskable).sum().item() / maskable.sum().item(),
+        'negatives in the sequence': neg_in_seq,
+        'negative item mean / item_size': neg_items[masked].double().mean().item() / args.item_size,
+        'segment length / (len // 2)': (sample_length[segment_rows] / (lengths[segment_rows] // 2)).mean().item(),
+        'segment start / (len - length)': (start_id[segment_rows]
+                                           / (lengths[segment_rows] - sample_length[segment_rows]).clamp(min=1)).mean().item(),
+        'attributes per position': attributes.sum(2)[valid].double().mean().item(),
+    }
+
+
+def run(name, dataloader, args, num_batches):
+    stats, count = {}, 0
+    start = time.time()
+    for i, batch in enumerate(dataloader):
+        count += batch[0].size(0)
+        if i + 1 == num_batches:
+            break
+    elapsed = time.time() - start
+    for i, batch in enumerate(dataloader):
+        for key, value in batch_statistics(batch, args).items():
+            stats[key] = stats.get(key, 0) + value / 20
+        if i + 1 == 20:
+            break
+    print(f'{name:18s} {count / elapsed:10.1f} samples/sec')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_users', default=20000, type=int)
+    parser.add_argument('--item_size', default=12000, type=int)
+    parser.add_argument('--attribute_size', default=1200, type=int)
+    parser.add_argument('--max_seq_length', default=50, type=int)
+    parser.add_argument('--pre_batch_size', default=100, type=int)
+    parser.add_argument('--mask_p', default=0.2, type=float)
+    parser.add_argument('--num_batches', default=200, type=int)
+    parser.add_argument('--seed', default=42, type=int)
+    args = parser.parse_args()
+    set_seed(args.seed)
+
+    user_seq, long_sequence, args.item2attribute = synthetic_data(
+        args.num_users, args.item_size, args.attribute_size, args.seed)
+    args.mask_id = args.item_size - 1
+
+    pretrain_dataset = PretrainDataset(args, user_seq, long_sequence)
+    legacy = DataLoader(pretrain_dataset, sampler=RandomSampler(pretrain_dataset), batch_size=args.pre_batch_size)
+    collated = DataLoader(pretrain_dataset.part_sequence, sampler=RandomSampler(pretrain_dataset.part_sequence),
+                          batch_size=args.pre_batch_size, collate_fn=PretrainCollator(args, long_sequence))
+
+    legacy_stats = run('PretrainDataset', legacy, args, args.num_batches)
+    collated_stats = run('PretrainCollator', collated, args, args.num_batches)
+    print(f'{"":32s} {"PretrainDataset":>16s} {"PretrainCollator":>16s}')
+    for key in legacy_stats:
+        print(f'{key:32s} {legacy_stats[key]:16.4f} {collated_stats[key]:16.4f}')
+
+    # same input sequences: the deterministic outputs are equal
+    sequences = [pretrain_dataset.part_sequence[i] for i in range(0, len(pretrain_dataset), 97)][:256]
+    expected = [pretrain_dataset[i] for i in range(0, len(pretrain_dataset), 97)][:256]
+    batch = PretrainCollator(args, long_sequence)(sequences)
+    print('same pos_items and attributes:',
+          all(torch.equal(batch[k], torch.stack([e[k] for e in expected])) for k in (0, 2)))
+
+
+if __name__ == '__main__':
+    main()
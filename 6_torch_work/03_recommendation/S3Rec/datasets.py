@@ -3,7 +3,7 @@ import random
 import torch
 from torch.utils.data import Dataset
 
-from utils import neg_sample
+from utils import neg_sample, get_item2attribute_csr, expand_csr_rows
 
 class PretrainDataset(Dataset):
 
@@ -116,6 +116,89 @@ class PretrainDataset(Dataset):
                        torch.tensor(neg_segment, dtype=torch.long),)
         return cur_tensors
 
+class PretrainCollator(object):
+    """
+    Builds the pretraining batch of a list of PretrainDataset.part_sequence entries with tensor ops:
+    the same seven tensors as PretrainDataset.__getitem__, with the same sampling distributions
+    (masked items, negative items out of the sequence, segment length and positions), drawn from
+    the torch random generator instead of `random`.
+
+    pretrain_dataloader = DataLoader(pretrain_dataset.part_sequence, sampler=RandomSampler(...),
+                                     batch_size=args.pre_batch_size, collate_fn=PretrainCollator(args, long_sequence))
+    """
+
+    def __init__(self, args, long_sequence):
+        self.args = args
+        self.max_len = args.max_seq_length
+        self.long_sequence = torch.tensor(long_sequence, dtype=torch.long)
+        attribute_matrix = get_item2attribute_csr(args.item2attribute, args.item_size, args.attribute_size)
+        self.attribute_indptr = torch.from_numpy(attribute_matrix.indptr.astype('int64'))
+        self.attribute_indices = torch.from_numpy(attribute_matrix.indices.astype('int64'))
+
+    def sample_neg_items(self, pos_items, rows):
+        # one item out of pos_items[row] for every row in rows, by rejection like neg_sample
+        neg_items = torch.randint(1, self.args.item_size, (len(rows),))
+        todo = torch.arange(len(rows))
+        while len(todo):
+            in_seq = (pos_items[rows[todo]] == neg_items[todo].unsqueeze(1)).any(1)
+            todo = todo[in_seq]
+            neg_items[todo] = torch.randint(1, self.args.item_size, (len(todo),))
+        return neg_items
+
+    def attributes(self, pos_items):
+        # multi-hot attributes of every position, from the csr item -> attribute matrix
+        items = pos_items.view(-1)
+        position, attribute = expand_csr_rows(self.attribute_indptr, self.attribute_indices, items)
+        attributes = torch.zeros(len(items), self.args.attribute_size, dtype=torch.long)
+        attributes[position, attribute] = 1
+        return attributes.view(pos_items.size(0), self.max_len, -1)
+
+    def __call__(self, sequences):
+        args, max_len = self.args, self.max_len
+        batch_size = len(sequences)
+        sequences = [sequence[-max_len:] for sequence in sequences]
+        lengths = torch.tensor([len(sequence) for sequence in sequences])
+        pad_len = max_len - lengths
+
+        # padding sequence
+        rows = torch.arange(batch_size).repeat_interleave(lengths)
+        seq_start = (lengths.cumsum(0) - lengths).repeat_interleave(lengths)
+        cols = pad_len.repeat_interleave(lengths) + torch.arange(len(rows)) - seq_start
+        pos_items = torch.zeros(batch_size, max_len, dtype=torch.long)
+        pos_items[rows, cols] = torch.tensor([item for sequence in sequences for item in sequence], dtype=torch.long)
+        position = torch.arange(max_len).unsqueeze(0) - pad_len.unsqueeze(1)  # index in the sequence, < 0 for padding
+        valid = position >= 0
+
+        # Masked Item Prediction, the last position is always masked
+        masked = (torch.rand(batch_size, max_len) < args.mask_p) & valid
+        masked[:, -1] = True
+        masked_rows, masked_cols = masked.nonzero(as_tuple=True)
+        neg_items = pos_items.clone()
+        neg_items[masked_rows, masked_cols] = self.sample_neg_items(pos_items, masked_rows)
+        masked_item_sequence = pos_items.masked_fill(masked, args.mask_id)
+
+        # Segment Prediction, on the sequences of at least 2 items
+        sample_length = 1 + (torch.rand(batch_size, dtype=torch.float64) * (lengths // 2)).long()
+        start_id = (torch.rand(batch_size, dtype=torch.float64) * (lengths - sample_length + 1)).long()
+        neg_start_id = (torch.rand(batch_size, dtype=torch.float64)
+                        * (len(self.long_sequence) - sample_length + 1)).long()
+        segment_offset = position - start_id.unsqueeze(1)
+        in_segment = (segment_offset >= 0) & (segment_offset < sample_length.unsqueeze(1)) \
+            & (lengths >= 2).unsqueeze(1)
+        out_segment = valid & ~in_segment & (lengths >= 2).unsqueeze(1)
+        masked_segment_sequence = pos_items.masked_fill(in_segment, args.mask_id)
+        pos_segment = pos_items.masked_fill(out_segment, args.mask_id)
+        neg_index = (neg_start_id.unsqueeze(1) + segment_offset).clamp(0, len(self.long_sequence) - 1)
+        neg_segment = torch.where(in_segment, self.long_sequence[neg_index], pos_segment)
+
+        return (self.attributes(pos_items),
+                masked_item_sequence,
+                pos_items,
+                neg_items,
+                masked_segment_sequence,
+                pos_segment,
+                neg_segment)
+
 class SASRecDataset(Dataset):
 
     def __init__(self, args, user_seq, test_neg_items=None, data_type='train'):
@@ -47,6 +47,9 @@ def main():
     parser.add_argument("--adam_beta1", type=float, default=0.9, help="adam first beta value")
     parser.add_argument("--adam_beta2", type=float, default=0.999, help="adam second beta value")
     parser.add_argument("--gpu_id", type=str, default="0", help="gpu_id")
+    parser.add_argument("--item_chunk_size", type=int, default=65536, help="items scored at a time in full ranking")
+    parser.add_argument("--dense_full_sort", action="store_true",
+                        help="full ranking on the dense numpy score matrix (train_matrix.toarray + argpartition)")
 
     args = parser.parse_args()
 
@@ -10,7 +10,7 @@ from torch.utils.data import DataLoader, RandomSampler
 import os
 import argparse
 
-from datasets import PretrainDataset
+from datasets import PretrainDataset, PretrainCollator
 from trainers import PretrainTrainer
 from models import S3RecModel
 
@@ -53,6 +53,8 @@ def main():
     parser.add_argument("--mip_weight", type=float, default=1.0, help="mip loss weight")
     parser.add_argument("--map_weight", type=float, default=1.0, help="map loss weight")
     parser.add_argument("--sp_weight", type=float, default=0.5, help="sp loss weight")
+    parser.add_argument("--per_sample_data", action="store_true",
+                        help="build the pretrain batches sample by sample with PretrainDataset instead of PretrainCollator")
 
     parser.add_argument("--weight_decay", type=float, default=0.0, help="weight_decay of adam")
     parser.add_argument("--adam_beta1", type=float, default=0.9, help="adam first beta value")
@@ -89,11 +91,18 @@ def main():
     model = S3RecModel(args=args)
     trainer = PretrainTrainer(model, None, None, None, args)
 
+    pretrain_collator = None if args.per_sample_data else PretrainCollator(args, long_sequence)
+
     for epoch in range(args.pre_epochs):
 
         pretrain_dataset = PretrainDataset(args, user_seq, long_sequence)
-        pretrain_sampler = RandomSampler(pretrain_dataset)
-        pretrain_dataloader = DataLoader(pretrain_dataset, sampler=pretrain_sampler, batch_size=args.pre_batch_size)
+        if pretrain_collator is None:
+            pretrain_sampler = RandomSampler(pretrain_dataset)
+            pretrain_dataloader = DataLoader(pretrain_dataset, sampler=pretrain_sampler, batch_size=args.pre_batch_size)
+        else:
+            pretrain_sampler = RandomSampler(pretrain_dataset.part_sequence)
+            pretrain_dataloader = DataLoader(pretrain_dataset.part_sequence, sampler=pretrain_sampler,
+                                             batch_size=args.pre_batch_size, collate_fn=pretrain_collator)
 
         trainer.pretrain(epoch, pretrain_dataloader)
 
@@ -10,7 +10,7 @@ import torch
 import torch.nn as nn
 from torch.optim import Adam
 
-from utils import recall_at_k, ndcg_k, get_metric
+from utils import get_metric, hit_ndcg_at_k, expand_csr_rows
 
 
 class Trainer:
@@ -69,8 +69,9 @@ class Trainer:
     def get_full_sort_score(self, epoch, answers, pred_list):
         recall, ndcg = [], []
         for k in [5, 10, 15, 20]:
-            recall.append(recall_at_k(answers, pred_list, k))
-            ndcg.append(ndcg_k(answers, pred_list, k))
+            recall_k, ndcg_k = hit_ndcg_at_k(answers, pred_list, k)
+            recall.append(recall_k)
+            ndcg.append(ndcg_k)
         post_fix = {
             "Epoch": epoch,
             "HIT@5": '{:.4f}'.format(recall[0]), "NDCG@5": '{:.4f}'.format(ndcg[0]),
@@ -121,6 +122,32 @@ class Trainer:
         rating_pred = torch.matmul(seq_out, test_item_emb.transpose(0, 1))
         return rating_pred
 
+    def predict_full_topk(self, seq_out, user_ids, topk=20):
+        # top k items of predict_full, scored item_chunk_size items at a time, the scores of the
+        # items of the users in train_matrix being set to 0 as in the dense path
+        train_matrix = self.args.train_matrix
+        if getattr(self, '_train_matrix', None) is not train_matrix:
+            self._train_matrix = train_matrix
+            self._train_indptr = torch.from_numpy(train_matrix.indptr.astype(np.int64)).to(self.device)
+            self._train_indices = torch.from_numpy(train_matrix.indices.astype(np.int64)).to(self.device)
+        history_row, history_item = expand_csr_rows(self._train_indptr, self._train_indices, user_ids)
+
+        test_item_emb = self.model.item_embeddings.weight
+        item_chunk_size = getattr(self.args, 'item_chunk_size', 65536)
+        top_scores, top_items = None, None
+        for start in range(0, test_item_emb.size(0), item_chunk_size):
+            # [batch chunk]
+            rating_pred = torch.matmul(seq_out, test_item_emb[start:start + item_chunk_size].transpose(0, 1))
+            in_chunk = (history_item >= start) & (history_item < start + rating_pred.size(1))
+            rating_pred[history_row[in_chunk], history_item[in_chunk] - start] = 0
+            scores, items = rating_pred.topk(min(topk, rating_pred.size(1)), dim=1)
+            items += start
+            if top_scores is not None:
+                scores, index = torch.cat([top_scores, scores], 1).topk(min(topk, top_scores.size(1) + scores.size(1)), dim=1)
+                items = torch.cat([top_items, items], 1).gather(1, index)
+            top_scores, top_items = scores, items
+        return top_items
+
 class PretrainTrainer(Trainer):
 
     def __init__(self, model,
@@ -249,7 +276,18 @@ class FinetuneTrainer(Trainer):
 
             pred_list = None
 
-            if full_sort:
+            if full_sort and not getattr(self.args, 'dense_full_sort', False):
+                pred_list, answer_list = [], []
+                with torch.no_grad():
+                    for i, batch in rec_data_iter:
+                        batch = tuple(t.to(self.device) for t in batch)
+                        user_ids, input_ids, target_pos, target_neg, answers = batch
+                        recommend_output = self.model.finetune(input_ids)[:, -1, :]
+                        pred_list.append(self.predict_full_topk(recommend_output, user_ids, 20).cpu().numpy())
+                        answer_list.append(answers.cpu().numpy())
+                return self.get_full_sort_score(epoch, np.concatenate(answer_list), np.concatenate(pred_list))
+
+            elif full_sort:
                 answer_list = None
                 for i, batch in rec_data_iter:
                     # 0. batch_data will be sent into the device(GPU or cpu)
@@ -4,6 +4,7 @@
 
 import numpy as np
 import math
+import itertools
 import random
 import os
 import json
@@ -95,41 +96,31 @@ def avg_pooling(x, dim):
     return x.sum(dim=dim)/x.size(dim)
 
 
-def generate_rating_matrix_valid(user_seq, num_users, num_items):
-    # three lists are used to construct sparse matrix
-    row = []
-    col = []
-    data = []
-    for user_id, item_list in enumerate(user_seq):
-        for item in item_list[:-2]: #
-            row.append(user_id)
-            col.append(item)
-            data.append(1)
-
-    row = np.array(row)
-    col = np.array(col)
-    data = np.array(data)
+def generate_rating_matrix(user_seq, num_users, num_items, num_hold_out):
+    # csr matrix of the items of every user, except the last num_hold_out ones
+    lengths = np.array([max(len(item_list) - num_hold_out, 0) for item_list in user_seq], dtype=np.int64)
+    row = np.repeat(np.arange(len(user_seq)), lengths)
+    col = np.fromiter(itertools.chain.from_iterable(item_list[:len(item_list) - num_hold_out]
+                                                    for item_list in user_seq if len(item_list) > num_hold_out),
+                      dtype=np.int64, count=int(lengths.sum()))
+    data = np.ones(len(col), dtype=np.int64)
     rating_matrix = csr_matrix((data, (row, col)), shape=(num_users, num_items))
 
     return rating_matrix
 
+def generate_rating_matrix_valid(user_seq, num_users, num_items):
+    return generate_rating_matrix(user_seq, num_users, num_items, 2)
+
 def generate_rating_matrix_test(user_seq, num_users, num_items):
-    # three lists are used to construct sparse matrix
-    row = []
-    col = []
-    data = []
-    for user_id, item_list in enumerate(user_seq):
-        for item in item_list[:-1]: #
-            row.append(user_id)
-            col.append(item)
-            data.append(1)
-
-    row = np.array(row)
-    col = np.array(col)
-    data = np.array(data)
-    rating_matrix = csr_matrix((data, (row, col)), shape=(num_users, num_items))
+    return generate_rating_matrix(user_seq, num_users, num_items, 1)
 
-    return rating_matrix
+def expand_csr_rows(indptr, indices, rows):
+    # (index in rows, column) of the non zero entries of the rows `rows` of a csr matrix, as torch tensors
+    start = indptr[rows]
+    count = indptr[rows + 1] - start
+    position = torch.arange(len(rows), device=rows.device).repeat_interleave(count)
+    offset = torch.arange(int(count.sum()), device=rows.device) - (count.cumsum(0) - count).repeat_interleave(count)
+    return position, indices[start.repeat_interleave(count) + offset]
 
 def get_user_seqs(data_file):
     lines = open(data_file).readlines()
@@ -198,18 +189,40 @@ def get_item2attribute_json(data_file):
     attribute_size = max(attribute_set) # 331
     return item2attribute, attribute_size
 
+def get_item2attribute_csr(item2attribute, item_size, attribute_size):
+    # [item_size, attribute_size] 0/1 csr matrix of item2attribute, the items out of range are dropped
+    row = []
+    col = []
+    for item, attributes in item2attribute.items():
+        item = int(item)
+        if 0 <= item < item_size:
+            row.extend([item] * len(attributes))
+            col.extend(attributes)
+    data = np.ones(len(row), dtype=np.int64)
+    attribute_matrix = csr_matrix((data, (np.array(row, dtype=np.int64), np.array(col, dtype=np.int64))),
+                                  shape=(item_size, attribute_size))
+    attribute_matrix.sum_duplicates()
+    attribute_matrix.data[:] = 1
+    return attribute_matrix
+
 def get_metric(pred_list, topk=10):
-    NDCG = 0.0
-    HIT = 0.0
-    MRR = 0.0
     # [batch] the answer's rank
-    for rank in pred_list:
-        MRR += 1.0 / (rank + 1.0)
-        if rank < topk:
-            NDCG += 1.0 / np.log2(rank + 2.0)
-            HIT += 1.0
+    rank = np.asarray(pred_list, dtype=np.float64)
+    hit = rank < topk
+    HIT = hit.sum()
+    NDCG = (1.0 / np.log2(rank[hit] + 2.0)).sum()
+    MRR = (1.0 / (rank + 1.0)).sum()
     return HIT /len(pred_list), NDCG /len(pred_list), MRR /len(pred_list)
 
+def hit_ndcg_at_k(answers, pred_list, topk):
+    # recall_at_k and ndcg_k of all the users at once, answers: [users n] (distinct items), pred_list: [users >= topk]
+    answers = np.asarray(answers)
+    hits = (np.asarray(pred_list)[:, :topk, None] == answers[:, None, :]).any(2)
+    recall = hits.sum(1) / answers.shape[1]
+    idcg = idcg_k(min(topk, answers.shape[1]))
+    ndcg = (hits / np.log2(np.arange(2, topk + 2))).sum(1) / idcg
+    return recall.mean(), ndcg.mean()
+
 def precision_at_k_per_sample(actual, predicted, topk):
     num_hits = 0
     for place in predicted:
@@ -0,0 +1,81 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+"""Benchmark of the CPU clustering backend on synthetic features.
+
+    python benchmark_clustering.py --n 1000000 --dim 256 --k 1000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import clustering
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark of the CPU clustering backend')
+    parser.add_argument('--n', type=int, default=1000000, help='number of features (default: 1M)')
+    parser.add_argument('--dim', type=int, default=256, help='feature dim (default: 256)')
+    parser.add_argument('--pca', type=int, default=256, help='dim after PCA-whitening (default: 256)')
+    parser.add_argument('--k', type=int, default=1000, help='number of clusters (default: 1000)')
+    parser.add_argument('--niter', type=int, default=20, help='Lloyd iterations (default: 20)')
+    parser.add_argument('--batch_size', type=int, default=10000,
+                        help='mini-batch k-means batch size (default: 10000)')
+    parser.add_argument('--nnn', type=int, default=5, help='neighbors of the kNN graph (default: 5)')
+    parser.add_argument('--nlist', type=int, default=0,
+                        help='cells of the kNN graph (default: sqrt(n))')
+    parser.add_argument('--nprobe', type=int, default=8, help='cells searched per cell (default: 8)')
+    parser.add_argument('--nq', type=int, default=1000,
+                        help='queries checked against the exact kNN (default: 1000)')
+    parser.add_argument('--seed', type=int, default=31, help='random seed (default: 31)')
+    return parser.parse_args()
+
+
+def synthetic_features(n, dim, n_centers, seed):
+    """Gaussian blobs with a decaying spectrum, generated in chunks."""
+    rng = np.random.RandomState(seed)
+    scales = np.linspace(1, 0.1, dim).astype('float32')
+    centers = (rng.randn(n_centers, dim) * 2 * scales).astype('float32')
+    x = np.empty((n, dim), dtype='float32')
+    for start in range(0, n, 65536):
+        size = min(65536, n - start)
+        x[start:start + size] = centers[rng.randint(n_centers, size=size)] \
+            + rng.randn(size, dim).astype('float32') * scales
+    return x
+
+
+def timed(name, fn, *args, **kwargs):
+    end = time.time()
+    res = fn(*args, **kwargs)
+    print('{0}: {1:.1f} s'.format(name, time.time() - end))
+    return res
+
+
+def main(args):
+    x = timed('generate {0} x {1}'.format(args.n, args.dim),
+              synthetic_features, args.n, args.dim, args.k, args.seed)
+    xb = timed('PCA-whitening (chunked)', clustering.preprocess_features_cpu, x, args.pca)
+    del x
+
+    for name, batch_size, niter in (('Lloyd', None, args.niter),
+                                    ('mini-batch', args.batch_size, 10 * args.niter)):
+        _, loss = timed('k-means {0}, k={1}'.format(name, args.k), clustering.run_kmeans_cpu,
+                        xb, args.k, niter=niter, batch_size=batch_size, seed=args.seed)
+        print('    loss: {0:.1f}'.format(loss))
+
+    nlist = args.nlist or int(np.sqrt(args.n))
+    I, _ = timed('kNN graph, nnn={0} nlist={1} nprobe={2}'.format(args.nnn, nlist, args.nprobe),
+                 clustering.make_graph_cpu, xb, args.nnn, nlist=nlist, nprobe=args.nprobe,
+                 seed=args.seed)
+    queries = np.random.RandomState(args.seed).choice(args.n, args.nq, replace=False)
+    exact, _ = clustering._knn_search(xb[queries], xb, args.nnn + 1)
+    recall = np.mean([len(set(a) & set(b)) for a, b in zip(I[queries], exact)]) / (args.nnn + 1)
+    print('    recall@{0} vs exact: {1:.3f}'.format(args.nnn + 1, recall))
+
+
+if __name__ == '__main__':
+    main(parse_args())
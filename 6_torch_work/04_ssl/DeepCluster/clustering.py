@@ -6,7 +6,10 @@
 #
 import time
 
-import faiss
+try:
+    import faiss
+except ImportError:
+    faiss = None
 import numpy as np
 from PIL import Image
 from PIL import ImageFile
@@ -19,6 +22,9 @@ ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 __all__ = ['PIC', 'Kmeans', 'cluster_assign', 'arrange_clustering']
 
+# memory used by one block of pairwise distances in the CPU backend
+CPU_BLOCK_BYTES = 256 * 2 ** 20
+
 
 def pil_loader(path):
     """Loads an image.
@@ -73,14 +79,32 @@ class ReassignedDataset(data.Dataset):
         return len(self.imgs)
 
 
-def preprocess_features(npdata, pca=256):
+def resolve_backend(backend):
+    """Returns 'faiss' or 'cpu'. 'auto' picks faiss when it sees a GPU.
+    """
+    if backend == 'auto':
+        if faiss is not None and hasattr(faiss, 'get_num_gpus') and faiss.get_num_gpus() > 0:
+            return 'faiss'
+        return 'cpu'
+    if backend not in ('faiss', 'cpu'):
+        raise ValueError('unknown clustering backend: {0}'.format(backend))
+    if backend == 'faiss' and faiss is None:
+        raise ImportError('the faiss backend needs faiss, use the cpu backend')
+    return backend
+
+
+def preprocess_features(npdata, pca=256, backend='faiss', chunk_size=65536):
     """Preprocess an array of features.
     Args:
         npdata (np.array N * ndim): features to preprocess
         pca (int): dim of output
+        backend (str): 'faiss', or 'cpu' to fit the PCA-whitening over chunks
+        chunk_size (int): rows per chunk of the cpu backend
     Returns:
         np.array of dim N * pca: data PCA-reduced, whitened and L2-normalized
     """
+    if resolve_backend(backend) == 'cpu':
+        return preprocess_features_cpu(npdata, pca, chunk_size)
     _, ndim = npdata.shape
     npdata =  npdata.astype('float32')
 
@@ -97,15 +121,140 @@ def preprocess_features(npdata, pca=256):
     return npdata
 
 
-def make_graph(xb, nnn):
+def preprocess_features_cpu(npdata, pca=256, chunk_size=65536):
+    """PCA-whitening and L2-normalization fitted over chunks of rows.
+    The mean and covariance are accumulated chunk by chunk in float64, so
+    npdata may be a np.memmap larger than memory.
+    Args:
+        npdata (np.array N * ndim): features to preprocess
+        pca (int): dim of output
+        chunk_size (int): rows per chunk
+    Returns:
+        np.array of dim N * pca: data PCA-reduced, whitened and L2-normalized
+    """
+    n_data, ndim = npdata.shape
+    total = np.zeros(ndim, dtype='float64')
+    cov = np.zeros((ndim, ndim), dtype='float64')
+    for start in range(0, n_data, chunk_size):
+        chunk = np.asarray(npdata[start:start + chunk_size], dtype='float64')
+        total += chunk.sum(0)
+        cov += chunk.T.dot(chunk)
+    mean = total / n_data
+    cov = cov / n_data - np.outer(mean, mean)
+
+    # the pca leading eigenvectors, scaled by eigenvalue ** -0.5
+    eigval, eigvec = np.linalg.eigh(cov)
+    order = np.argsort(eigval)[::-1][:pca]
+    eigval = np.maximum(eigval[order], np.finfo('float64').tiny)
+    proj = (eigvec[:, order] / np.sqrt(eigval)).astype('float32')
+    bias = mean.astype('float32').dot(proj)
+
+    out = np.empty((n_data, proj.shape[1]), dtype='float32')
+    for start in range(0, n_data, chunk_size):
+        chunk = np.asarray(npdata[start:start + chunk_size], dtype='float32')
+        res = chunk.dot(proj) - bias
+        res /= np.linalg.norm(res, axis=1, keepdims=True)
+        out[start:start + chunk_size] = res
+    return out
+
+
+def _block_rows(n_cols, block_bytes=None):
+    """Number of rows of a float32 block with n_cols columns."""
+    block_bytes = block_bytes or CPU_BLOCK_BYTES
+    return max(1, int(block_bytes // (4 * max(1, n_cols))))
+
+
+def _knn_search(xq, xb, k, xb_norms=None):
+    """Exact L2 k nearest neighbors of xq among xb, sorted by distance.
+    Returns:
+        np.array len(xq) * k: ids in xb
+        np.array len(xq) * k: squared L2 distances
+    """
+    if xb_norms is None:
+        xb_norms = (xb ** 2).sum(1)
+    k = min(k, len(xb))
+    I = np.empty((len(xq), k), dtype='int64')
+    D = np.empty((len(xq), k), dtype='float32')
+    step = _block_rows(len(xb))
+    for start in range(0, len(xq), step):
+        q = xq[start:start + step]
+        dist = xb_norms[np.newaxis, :] - 2 * q.dot(xb.T)
+        dist += (q ** 2).sum(1)[:, np.newaxis]
+        if k == 1:
+            ids = np.argmin(dist, axis=1)[:, np.newaxis]
+        elif k < len(xb):
+            ids = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            ids = np.tile(np.arange(len(xb)), (len(q), 1))
+        d = np.take_along_axis(dist, ids, 1)
+        order = np.argsort(d, axis=1, kind='stable')
+        I[start:start + step] = np.take_along_axis(ids, order, 1)
+        D[start:start + step] = np.maximum(np.take_along_axis(d, order, 1), 0)
+    return I, D
+
+
+def make_graph_cpu(xb, nnn, nlist=None, nprobe=8, seed=None):
+    """Builds a graph of nearest neighbors on CPU.
+    Without nlist the search is exact, in blocks of CPU_BLOCK_BYTES. With nlist,
+    the data is split in nlist k-means cells and the points of a cell are only
+    compared with the points of the nprobe cells nearest to its centroid.
+    Args:
+        xb (np.array): data
+        nnn (int): number of nearest neighbors
+        nlist (int): number of cells, None for the exact search
+        nprobe (int): number of cells searched for the points of a cell
+        seed (int): seed of the coarse k-means
+    Returns:
+        list: for each data the list of ids to its nnn nearest neighbors
+        list: for each data the list of distances to its nnn NN
+    """
+    xb = np.ascontiguousarray(xb, dtype='float32')
+    if not nlist:
+        return _knn_search(xb, xb, nnn + 1)
+
+    n_data = len(xb)
+    labels, _, centroids = run_kmeans_cpu(xb, nlist, niter=5, max_points_per_centroid=32,
+                                          seed=seed, return_centroids=True)
+    labels = np.asarray(labels)
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+    probes, _ = _knn_search(centroids, centroids, nlist)
+    norms = (xb ** 2).sum(1)
+
+    I = np.empty((n_data, nnn + 1), dtype='int64')
+    D = np.empty((n_data, nnn + 1), dtype='float32')
+    for cell in range(nlist):
+        queries = order[bounds[cell]:bounds[cell + 1]]
+        if len(queries) == 0:
+            continue
+        # probe at least nprobe cells, and enough cells for nnn + 1 neighbors
+        candidates, n_probed = [], 0
+        for probe in probes[cell]:
+            candidates.append(order[bounds[probe]:bounds[probe + 1]])
+            n_probed += 1
+            if n_probed >= nprobe and sum(len(c) for c in candidates) > nnn:
+                break
+        candidates = np.concatenate(candidates)
+        ids, dist = _knn_search(xb[queries], xb[candidates], nnn + 1, norms[candidates])
+        I[queries] = candidates[ids]
+        D[queries] = dist
+    return I, D
+
+
+def make_graph(xb, nnn, backend='faiss', nlist=None, nprobe=8):
     """Builds a graph of nearest neighbors.
     Args:
         xb (np.array): data
         nnn (int): number of nearest neighbors
+        backend (str): 'faiss' for a GPU flat index or 'cpu', see make_graph_cpu
+        nlist (int): number of cells of the cpu backend, None for the exact search
+        nprobe (int): number of cells searched by the cpu backend
     Returns:
         list: for each data the list of ids to its nnn nearest neighbors
         list: for each data the list of distances to its nnn NN
     """
+    if resolve_backend(backend) == 'cpu':
+        return make_graph_cpu(xb, nnn, nlist, nprobe, seed=np.random.randint(1234))
     N, dim = xb.shape
 
     # we need only a StandardGpuResources per GPU
@@ -147,14 +296,20 @@ def cluster_assign(images_lists, dataset):
     return ReassignedDataset(image_indexes, pseudolabels, dataset, t)
 
 
-def run_kmeans(x, nmb_clusters, verbose=False):
-    """Runs kmeans on 1 GPU.
+def run_kmeans(x, nmb_clusters, verbose=False, backend='faiss', batch_size=None):
+    """Runs kmeans on 1 GPU, or on CPU.
     Args:
         x: data
         nmb_clusters (int): number of clusters
+        backend (str): 'faiss' or 'cpu', see run_kmeans_cpu
+        batch_size (int): mini-batch size of the cpu backend, None for Lloyd
     Returns:
         list: ids of data in each cluster
     """
+    if resolve_backend(backend) == 'cpu':
+        I, loss = run_kmeans_cpu(x, nmb_clusters, batch_size=batch_size,
+                                 seed=np.random.randint(1234), verbose=verbose)
+        return I, loss
     n_data, d = x.shape
 
     # faiss implementation of k-means
@@ -183,6 +338,143 @@ def run_kmeans(x, nmb_clusters, verbose=False):
     return [int(n[0]) for n in I], losses[-1]
 
 
+def kmeans_plusplus(x, k, rng, n_trials=None):
+    """Greedy k-means++ seeding: at each step n_trials candidates are drawn with
+    probability proportional to the squared distance to the closest centroid,
+    and the one reducing the potential the most is kept.
+    Args:
+        x (np.array N * dim): data, N >= k
+        k (int): number of centroids
+        rng (np.random.RandomState): random state
+        n_trials (int): candidates per centroid, default 2 + log(k)
+    Returns:
+        np.array k * dim: centroids
+    """
+    n_data = len(x)
+    n_trials = n_trials or 2 + int(np.log(k))
+    norms = (x ** 2).sum(1)
+    centroids = np.empty((k, x.shape[1]), dtype='float32')
+    centroids[0] = x[rng.randint(n_data)]
+    closest = np.maximum(norms - 2 * x.dot(centroids[0]) + (centroids[0] ** 2).sum(), 0)
+    for i in range(1, k):
+        total = closest.sum()
+        if total > 0:
+            ids = np.searchsorted(np.cumsum(closest), rng.rand(n_trials) * total)
+            ids = np.minimum(ids, n_data - 1)
+        else:
+            ids = rng.randint(n_data, size=n_trials)
+        dist = norms[np.newaxis, :] - 2 * x[ids].dot(x.T) + norms[ids][:, np.newaxis]
+        dist = np.minimum(closest, np.maximum(dist, 0))
+        best = int(np.argmin(dist.sum(1)))
+        centroids[i] = x[ids[best]]
+        closest = dist[best]
+    return centroids
+
+
+def _assign(x, centroids):
+    """Returns the id of the closest centroid of each row and the squared distance."""
+    I, D = _knn_search(x, centroids, 1)
+    return I[:, 0], D[:, 0]
+
+
+def _split_empty_clusters(centroids, counts, rng):
+    """Moves empty centroids next to a large cluster, like faiss does: the
+    cluster is picked with probability proportional to its size - 1, and the
+    two centroids are pushed apart symmetrically.
+    """
+    eps = 1 / 1024.
+    for i in np.flatnonzero(counts == 0):
+        weights = np.maximum(counts - 1, 0).astype('float64')
+        if weights.sum() == 0:
+            break
+        j = rng.choice(len(counts), p=weights / weights.sum())
+        sign = np.where(np.arange(centroids.shape[1]) % 2 == 0, 1 + eps, 1 - eps)
+        centroids[i] = centroids[j] * sign
+        centroids[j] = centroids[j] * (2 - sign)
+        counts[i] = counts[j] // 2
+        counts[j] -= counts[i]
+
+
+def run_kmeans_cpu(x, nmb_clusters, niter=20, batch_size=None, max_points_per_centroid=None,
+                   seed=None, verbose=False, return_centroids=False):
+    """Runs kmeans on CPU with k-means++ initialization.
+    Lloyd iterations go through the data in blocks of CPU_BLOCK_BYTES, the
+    distances are computed by the (multi-threaded) BLAS matrix product.
+    With batch_size, each of the niter iterations instead updates the centroids
+    from one random mini-batch, with per-centroid learning rates (Sculley, 2010).
+    Args:
+        x (np.array N * dim): data
+        nmb_clusters (int): number of clusters
+        niter (int): number of iterations
+        batch_size (int): size of the mini-batches, None for Lloyd
+        max_points_per_centroid (int): train on a random subset of
+                                       nmb_clusters * max_points_per_centroid points
+        seed (int): random seed
+        return_centroids (bool): also return the centroids
+    Returns:
+        list: ids of data in each cluster
+        float: final k-means loss, the sum of squared distances to the centroids
+    """
+    rng = np.random.RandomState(seed)
+    x = np.ascontiguousarray(x, dtype='float32')
+    n_data = len(x)
+    assert n_data >= nmb_clusters, 'fewer points than clusters'
+
+    train = x
+    if max_points_per_centroid and n_data > nmb_clusters * max_points_per_centroid:
+        train = x[np.sort(rng.choice(n_data, nmb_clusters * max_points_per_centroid, replace=False))]
+    # seed with k-means++ on a sample, its cost grows as sample size * nmb_clusters
+    n_seed = min(len(train), 16 * nmb_clusters)
+    sample = train if n_seed == len(train) else train[rng.choice(len(train), n_seed, replace=False)]
+    centroids = kmeans_plusplus(sample, nmb_clusters, rng)
+
+    losses = []
+    counts = np.zeros(nmb_clusters, dtype='int64')
+    for it in range(niter):
+        if batch_size:
+            batch = train[rng.randint(len(train), size=batch_size)]
+            labels, dist = _assign(batch, centroids)
+            # per-centroid learning rate 1 / count, applied on the batch means
+            batch_counts = np.bincount(labels, minlength=nmb_clusters)
+            sums = csr_matrix((np.ones(len(batch), dtype='float32'), (labels, np.arange(len(batch)))),
+                              shape=(nmb_clusters, len(batch))).dot(batch)
+            counts += batch_counts
+            seen = batch_counts > 0
+            lr = (batch_counts[seen] / counts[seen])[:, np.newaxis]
+            centroids[seen] += lr * (sums[seen] / batch_counts[seen, np.newaxis] - centroids[seen])
+            losses.append(float(dist.sum()) * len(train) / len(batch))
+        else:
+            sums = np.zeros((nmb_clusters, x.shape[1]), dtype='float64')
+            counts[:] = 0
+            loss = 0.
+            step = _block_rows(nmb_clusters)
+            for start in range(0, len(train), step):
+                block = train[start:start + step]
+                labels, dist = _assign(block, centroids)
+                counts += np.bincount(labels, minlength=nmb_clusters)
+                sums += csr_matrix((np.ones(len(block), dtype='float32'), (labels, np.arange(len(block)))),
+                                   shape=(nmb_clusters, len(block))).dot(block)
+                loss += float(dist.sum())
+            losses.append(loss)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+            _split_empty_clusters(centroids, counts, rng)
+
+    # final assignment of all the data
+    I = np.empty(n_data, dtype='int64')
+    loss = 0.
+    step = _block_rows(nmb_clusters)
+    for start in range(0, n_data, step):
+        I[start:start + step], dist = _assign(x[start:start + step], centroids)
+        loss += float(dist.sum())
+    if verbose:
+        print('k-means loss evolution: {0}'.format(np.array(losses + [loss])))
+
+    if return_centroids:
+        return I.tolist(), loss, centroids
+    return I.tolist(), loss
+
+
 def arrange_clustering(images_lists):
     pseudolabels = []
     image_indexes = []
@@ -194,8 +486,17 @@ def arrange_clustering(images_lists):
 
 
 class Kmeans(object):
-    def __init__(self, k):
+    """k-means clustering of PCA-whitened features.
+        Args:
+            k (int): number of clusters
+            backend (str): 'faiss' (GPU), 'cpu' or 'auto' (faiss if a GPU is seen)
+            batch_size (int): mini-batch k-means of the cpu backend, None for Lloyd
+    """
+
+    def __init__(self, k, backend='faiss', batch_size=None):
         self.k = k
+        self.backend = backend
+        self.batch_size = batch_size
 
     def cluster(self, data, verbose=False):
         """Performs k-means clustering.
@@ -205,10 +506,10 @@ class Kmeans(object):
         end = time.time()
 
         # PCA-reducing, whitening and L2-normalization
-        xb = preprocess_features(data)
+        xb = preprocess_features(data, backend=self.backend)
 
         # cluster the data
-        I, loss = run_kmeans(xb, self.k, verbose)
+        I, loss = run_kmeans(xb, self.k, verbose, backend=self.backend, batch_size=self.batch_size)
         self.images_lists = [[] for i in range(self.k)]
         for i in range(len(data)):
             self.images_lists[I[i]].append(i)
@@ -236,11 +537,7 @@ def make_adjacencyW(I, D, sigma):
     indices = np.reshape(np.delete(I, 0, 1), (1, -1))
     indptr = np.multiply(k, np.arange(V + 1))
 
-    def exp_ker(d):
-        return np.exp(-d / sigma**2)
-
-    exp_ker = np.vectorize(exp_ker)
-    res_D = exp_ker(D)
+    res_D = np.exp(-D / sigma**2)
     data = np.reshape(np.delete(res_D, 0, 1), (1, -1))
     adj_matrix = csr_matrix((data[0], indices[0], indptr), shape=(V, V))
     return adj_matrix
@@ -323,25 +620,30 @@ class PIC(object):
                                       the cluster of its closest non
                                       singleton nearest neighbors (up to nnn
                                       nearest neighbors).
+            backend (str): 'faiss' (GPU), 'cpu' or 'auto' (faiss if a GPU is seen)
+            nlist (int): number of cells of the cpu kNN graph, None for the exact search
         Attributes:
             images_lists (list of list): for each cluster, the list of image indexes
                                          belonging to this cluster
     """
 
-    def __init__(self, args=None, sigma=0.2, nnn=5, alpha=0.001, distribute_singletons=True):
+    def __init__(self, args=None, sigma=0.2, nnn=5, alpha=0.001, distribute_singletons=True,
+                 backend='faiss', nlist=None):
         self.sigma = sigma
         self.alpha = alpha
         self.nnn = nnn
         self.distribute_singletons = distribute_singletons
+        self.backend = backend
+        self.nlist = nlist
 
     def cluster(self, data, verbose=False):
         end = time.time()
 
         # preprocess the data
-        xb = preprocess_features(data)
+        xb = preprocess_features(data, backend=self.backend)
 
         # construct nnn graph
-        I, D = make_graph(xb, self.nnn)
+        I, D = make_graph(xb, self.nnn, backend=self.backend, nlist=self.nlist)
 
         # run PIC
         clust = run_pic(I, D, self.sigma, self.alpha)
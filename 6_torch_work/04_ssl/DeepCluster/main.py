@@ -9,7 +9,6 @@ import os
 import pickle
 import time
 
-import faiss
 import numpy as np
 from sklearn.metrics.cluster import normalized_mutual_info_score
 import torch
@@ -36,6 +35,8 @@ def parse_args():
     parser.add_argument('--sobel', action='store_true', help='Sobel filtering')
     parser.add_argument('--clustering', type=str, choices=['Kmeans', 'PIC'],
                         default='Kmeans', help='clustering algorithm (default: Kmeans)')
+    parser.add_argument('--clustering_backend', type=str, choices=['faiss', 'cpu', 'auto'],
+                        default='faiss', help='faiss on GPU, or numpy on CPU (default: faiss)')
     parser.add_argument('--nmb_cluster', '--k', type=int, default=10000,
                         help='number of cluster for k-means (default: 10000)')
     parser.add_argument('--lr', default=0.05, type=float,
@@ -136,7 +137,8 @@ def main(args):
                                              pin_memory=True)
 
     # clustering algorithm to use
-    deepcluster = clustering.__dict__[args.clustering](args.nmb_cluster)
+    deepcluster = clustering.__dict__[args.clustering](args.nmb_cluster,
+                                                       backend=args.clustering_backend)
 
     # training convnet with DeepCluster
     for epoch in range(args.start_epoch, args.epochs):
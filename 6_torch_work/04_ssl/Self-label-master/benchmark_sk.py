@@ -0,0 +1,101 @@
+"""Compare the dense and the chunked CPU Sinkhorn-Knopp label assignment.
+
+    python benchmark_sk.py --n 100000 --k 1000 --hc 2
+    python benchmark_sk.py --n 100000 --k 1000 --hc 2 --memmap-dir /tmp/sk
+
+Each variant runs in its own process, reporting wall time, peak traced
+allocations and peak RSS; the labels are then compared.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+import sinkhornknopp as sk
+from util import py_softmax
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmark of the Sinkhorn-Knopp label assignment')
+    parser.add_argument('--n', default=100000, type=int, help='number of images (default: 100000)')
+    parser.add_argument('--k', default=1000, type=int, help='number of clusters per head (default: 1000)')
+    parser.add_argument('--hc', default=2, type=int, help='number of heads (default: 2)')
+    parser.add_argument('--dim', default=256, type=int, help='pre-last-layer size (default: 256)')
+    parser.add_argument('--lamb', default=25, type=int, help='lambda (default: 25)')
+    parser.add_argument('--chunk-size', default=16384, type=int, help='rows per block (default: 16384)')
+    parser.add_argument('--threads', default=0, type=int, help='argmax threads (default: all)')
+    parser.add_argument('--memmap-dir', default='', type=str, help='memory-map the chunked matrices there')
+    parser.add_argument('--mode', default='', choices=['', 'dense', 'chunked'], help=argparse.SUPPRESS)
+    parser.add_argument('--out', default='', type=str, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def synthetic_inputs(args):
+    rng = np.random.RandomState(0)
+    centers = rng.randn(args.k, args.dim).astype(np.float32)
+    acts = centers[rng.randint(args.k, size=args.n)] + rng.randn(args.n, args.dim).astype(np.float32)
+    heads = [(rng.randn(args.dim, args.k).astype(np.float32) / np.sqrt(args.dim),
+              rng.randn(args.k).astype(np.float32) * 0.1) for _ in range(args.hc)]
+    return acts, heads
+
+
+def run_dense(args, acts, heads):
+    """ the matmul + softmax of cpu_sk, then optimize_L_sk, head after head """
+    self = SimpleNamespace(L=torch.zeros(args.hc, args.n, dtype=torch.long), outs=[args.k] * args.hc,
+                           lamb=args.lamb, dtype=np.float64, dev='cpu')
+    for nh, (weight, bias) in enumerate(heads):
+        self.PS = None
+        self.PS = acts @ weight.astype(np.float64) + bias.astype(np.float64)
+        self.PS = py_softmax(self.PS, 1)
+        sk.optimize_L_sk(self, nh=nh)
+    return self.L.numpy()
+
+
+def run_chunked(args, acts, heads):
+    self = SimpleNamespace(sk_memmap_dir=args.memmap_dir)
+    Qs = sk.build_sk_matrices(acts, heads, args.lamb, args.chunk_size,
+                              buffer=lambda nh, shape: sk._sk_buffer(self, 'Q%d' % nh, shape))
+    labels = sk.sinkhorn_chunked(Qs, args.chunk_size, threads=args.threads or None)
+    return np.stack(labels)
+
+
+def run_mode(args):
+    acts, heads = synthetic_inputs(args)
+    tracemalloc.start()
+    start = time.time()
+    labels = run_dense(args, acts, heads) if args.mode == 'dense' else run_chunked(args, acts, heads)
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    np.save(args.out, labels)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+    print(f"{args.mode:8s} time {elapsed:7.1f}s  peak allocated {peak / 2 ** 20:8.1f}MB  peak RSS {rss:8.1f}MB",
+          flush=True)
+
+
+def main(args):
+    tmp = tempfile.mkdtemp()
+    labels = {}
+    for mode in ('dense', 'chunked'):
+        out = os.path.join(tmp, mode + '.npy')
+        cmd = [sys.executable, __file__, '--mode', mode, '--out', out] + sys.argv[1:]
+        subprocess.run(cmd, check=True)
+        labels[mode] = np.load(out)
+    for nh in range(args.hc):
+        same = (labels['dense'][nh] == labels['chunked'][nh]).mean()
+        print(f"head {nh}: {same * 100:.3f}% labels equal to the dense implementation")
+
+
+if __name__ == '__main__':
+    args = get_parser()
+    if args.mode:
+        run_mode(args)
+    else:
+        main(args)
@@ -50,10 +50,16 @@ class Optimizer:
         self.outs = [self.K]*args.hc
         # activations of previous to last layer to be saved if using multiple heads.
         self.presize = 4096 if args.arch == 'alexnet' else 2048
+        # chunked float32 variant of the CPU SK-algo
+        self.sk_chunk_size = args.sk_chunk_size
+        self.sk_memmap_dir = args.sk_memmap_dir
+        self.sk_threads = args.sk_threads or None
 
     def optimize_labels(self, niter):
         if not args.cpu and torch.cuda.device_count() > 1:
             sk.gpu_sk(self)
+        elif self.sk_chunk_size > 0:
+            sk.chunked_sk(self)
         else:
             self.dtype = np.float64
             sk.cpu_sk(self)
@@ -187,6 +193,9 @@ def get_parser():
     parser.add_argument('--augs', default=3, type=int, help='augmentation level (default: 3)')
     parser.add_argument('--lamb', default=25, type=int, help='for pseudoopt: lambda (default:25) ')
     parser.add_argument('--cpu', default=False, action='store_true', help='use CPU variant (slow) (default: off)')
+    parser.add_argument('--sk-chunk-size', default=0, type=int, help='CPU variant in float32 row blocks of this size (default: 0, dense)')
+    parser.add_argument('--sk-memmap-dir', default='', type=str, help='memory-map the chunked SK matrices in this folder (default: RAM)')
+    parser.add_argument('--sk-threads', default=0, type=int, help='threads of the chunked SK argmax (default: all)')
 
 
     # architecture
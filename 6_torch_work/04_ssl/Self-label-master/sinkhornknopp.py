@@ -1,7 +1,9 @@
+import os
 import torch
 import torch.nn as nn
 import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 from util import py_softmax, MovingAverage
 from multigpu import gpu_mul_Ax, gpu_mul_xA, aggreg_multi_gpu, gpu_mul_AB
@@ -229,3 +231,180 @@ def optimize_L_sk_multi(self, nh=0):
           flush=True)
     # finally, assign the new labels ########################
     self.L[nh] = newL
+
+
+def chunked_sk(self):
+    """ Sinkhorn Knopp optimization on CPU in float32 row blocks
+        * stores logits (one head) or pre-last-layer activations (several heads)
+          in RAM or, with self.sk_memmap_dir, in memory-mapped files
+        * builds the transport matrix of every head in one pass over row blocks
+        * each Sinkhorn iteration streams the row blocks once, for all heads
+        * memory besides the matrices is O(chunk x K), not O(N x K) float64
+    """
+    # 1. aggregate inputs:
+    N = len(self.pseudo_loader.dataset)
+    dim = self.K if self.hc == 1 else self.presize
+    acts = _sk_buffer(self, 'acts', (N, dim))
+    now = time.time()
+    l_dl = len(self.pseudo_loader)
+    batch_time = MovingAverage(intertia=0.9)
+    self.model.headcount = 1
+    with torch.no_grad():
+        for batch_idx, (data, _, _selected) in enumerate(self.pseudo_loader):
+            data = data.to(self.dev)
+            mass = data.size(0)
+            acts[_selected.numpy(), :] = self.model(data).cpu().numpy()
+            batch_time.update(time.time() - now)
+            now = time.time()
+            if batch_idx % 50 == 0:
+                print(
+                    f"Aggregating batch {batch_idx:03}/{l_dl}, speed: {mass / batch_time.avg:04.1f}Hz",
+                    end='\r',
+                    flush=True)
+    self.model.headcount = self.hc
+    print("Aggreg of outputs  took {0:.2f} min".format(
+        (time.time() - now) / 60.),
+          flush=True)
+
+    # 2. solve label assignment via sinkhorn-knopp, all heads at once:
+    if self.hc == 1:
+        heads = [None]
+    else:
+        heads = []
+        for nh in range(self.hc):
+            tl = getattr(self.model, "top_layer%d" % nh)
+            heads.append((tl.weight.detach().cpu().numpy().T.astype(np.float32),
+                          tl.bias.detach().cpu().numpy().astype(np.float32)))
+    tt = time.time()
+    Qs = build_sk_matrices(acts, heads, self.lamb, self.sk_chunk_size,
+                           buffer=lambda nh, shape: _sk_buffer(self, 'Q%d' % nh, shape))
+    print(f"transport matrices took {(time.time() - tt)/60:.2f}min", flush=True)
+    del acts
+    labels = sinkhorn_chunked(Qs, self.sk_chunk_size, threads=self.sk_threads)
+    for nh, argmaxes in enumerate(labels):
+        self.L[nh] = torch.LongTensor(argmaxes).to(self.dev)
+    print('opt took {0:.2f}min'.format((time.time() - tt) / 60.), flush=True)
+    return
+
+
+def _sk_buffer(self, name, shape):
+    """ float32 array of shape, memory-mapped in self.sk_memmap_dir if it is set """
+    if not getattr(self, 'sk_memmap_dir', None):
+        return np.empty(shape, dtype=np.float32)
+    os.makedirs(self.sk_memmap_dir, exist_ok=True)
+    return np.lib.format.open_memmap(os.path.join(self.sk_memmap_dir, name + '.npy'),
+                                     mode='w+', dtype=np.float32, shape=shape)
+
+
+def build_sk_matrices(acts, heads, lamb, chunk_size=65536, buffer=None):
+    """ the transport matrices P ** lamb of every head, in float32, N x K
+
+        P ** lamb is rescaled by a positive factor per row and per column so that
+        every row and every column has a maximum of 1: the scalings are absorbed
+        by the Sinkhorn vectors and the labels are unchanged, but float32 does not
+        underflow where P ** lamb is below ~1e-38.
+
+        Parameters:
+            acts (N x D array): logits (head None) or pre-last-layer activations
+            heads (list): per head None, or (weight D x K, bias K) of the last layer
+            lamb (float): the lambda of the SK algorithm
+            chunk_size (int): rows per block
+            buffer (callable): buffer(nh, shape) returns the float32 array of head nh
+    """
+    N = len(acts)
+    buffer = buffer or (lambda nh, shape: np.empty(shape, dtype=np.float32))
+    Qs, colmax = [], []
+    for nh, head in enumerate(heads):
+        K = acts.shape[1] if head is None else head[0].shape[1]
+        Qs.append(buffer(nh, (N, K)))
+        colmax.append(np.full(K, -np.inf, dtype=np.float32))
+    # pass 1: lamb * log-softmax, minus its row maximum
+    for start in range(0, N, chunk_size):
+        block = np.asarray(acts[start:start + chunk_size], dtype=np.float32)
+        for nh, head in enumerate(heads):
+            logits = block if head is None else block @ head[0] + head[1]
+            # the log-softmax normalizer is constant per row: only the row max matters
+            logits = lamb * (logits - logits.max(1, keepdims=True))
+            Qs[nh][start:start + chunk_size] = logits
+            np.maximum(colmax[nh], logits.max(0), out=colmax[nh])
+    # pass 2: exponentiate, minus the column maximum
+    for start in range(0, N, chunk_size):
+        for Q, cmax in zip(Qs, colmax):
+            block = np.asarray(Q[start:start + chunk_size])
+            block -= cmax
+            np.exp(block, out=block)
+            # flush entries that make float32 subnormals in the matrix-vector
+            # products, which are many times slower; they are < 1e-30 of both
+            # their row and column maximum
+            block[block < 1e-30] = 0
+            Q[start:start + chunk_size] = block
+    return Qs
+
+
+def sinkhorn_chunked(Qs, chunk_size=65536, threads=None, tol=1e-1):
+    """ Sinkhorn-Knopp on N x K float32 matrices, streaming row blocks.
+
+        Each iteration of the dense optimize_L_sk, r = 1/K / (P c) then
+        c = 1/N / (r P), is done in one pass: for each row block, c of the block
+        is updated from r and its contribution to the next P c is accumulated.
+        All heads share the passes, the ones converged are skipped.
+
+        Parameters:
+            Qs (list): N x K float32 arrays (or memmaps), one per head
+            chunk_size (int): rows per block
+            threads (int): threads of the final argmax, default os.cpu_count()
+            tol (float): stop a head when sum |c / c_new - 1| < tol, checked every 10 iters
+        Returns:
+            list: per head the label (argmax of the transport plan) of each row
+    """
+    N = len(Qs[0])
+    inv_N = 1. / N
+    cs = [np.full(N, inv_N) for _ in Qs]
+    # P c for the initial uniform c: the column sums / N
+    sums = [np.zeros(Q.shape[1]) for Q in Qs]
+    for start in range(0, N, chunk_size):
+        for Q, s in zip(Qs, sums):
+            s += np.asarray(Q[start:start + chunk_size]).sum(0, dtype=np.float64) * inv_N
+    rs = [1. / Q.shape[1] / s for Q, s in zip(Qs, sums)]
+    active = list(range(len(Qs)))
+    counters = [0] * len(Qs)
+    errs = [1e6] * len(Qs)
+    while active:
+        sums = {nh: np.zeros(Qs[nh].shape[1]) for nh in active}
+        check = {nh: counters[nh] % 10 == 0 for nh in active}
+        err = {nh: 0. for nh in active}
+        for start in range(0, N, chunk_size):
+            for nh in active:
+                block = np.asarray(Qs[nh][start:start + chunk_size])
+                c_new = inv_N / (block @ rs[nh].astype(np.float32)).astype(np.float64)
+                if check[nh]:
+                    c_old = cs[nh][start:start + chunk_size]
+                    err[nh] += np.nansum(np.abs(c_old / c_new - 1))
+                cs[nh][start:start + chunk_size] = c_new
+                sums[nh] += c_new.astype(np.float32) @ block
+        for nh in list(active):
+            if check[nh]:
+                errs[nh] = err[nh]
+            counters[nh] += 1
+            if errs[nh] <= tol:
+                # like the dense loop, stop with the r the last c was computed from
+                print("head %d error: " % nh, errs[nh], 'step ', counters[nh], flush=True)
+                active.remove(nh)
+            else:
+                rs[nh] = 1. / Qs[nh].shape[1] / sums[nh]
+    return [parallel_argmax(Q, r, chunk_size, threads) for Q, r in zip(Qs, rs)]
+
+
+def parallel_argmax(Q, r, chunk_size=65536, threads=None):
+    """ argmax over columns of Q * r, row blocks spread over threads """
+    r = r.astype(np.float32)
+    N = len(Q)
+    out = np.empty(N, dtype=np.int64)
+
+    def run(start):
+        block = np.asarray(Q[start:start + chunk_size]) * r
+        out[start:start + chunk_size] = np.nanargmax(block, 1)
+
+    with ThreadPoolExecutor(threads or os.cpu_count()) as pool:
+        list(pool.map(run, range(0, N, chunk_size)))
+    return out
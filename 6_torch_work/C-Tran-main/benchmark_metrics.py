@@ -0,0 +1,90 @@
+"""
+Time of the per label AUC, AP, AUPR, recall at FDR and optimal threshold of multilabel_metrics, and of the
+sklearn loops of utils/metrics.py, on synthetic scores:
+
+    python benchmark_metrics.py --num_samples 1000000 --num_labels 1000
+
+The labels are generated --block_size at a time, so that the (num_samples, num_labels) matrices are never
+held in memory. sklearn runs on the first --check_labels labels only, its time is extrapolated to all the
+labels, and the largest differences with multilabel_metrics are printed.
+"""
+import time
+import math
+import argparse
+import warnings
+
+import numpy as np
+from sklearn import metrics
+
+from utils.label_metrics import multilabel_metrics
+
+warnings.filterwarnings("ignore")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_samples', type=int, default=1000000)
+    parser.add_argument('--num_labels', type=int, default=1000)
+    parser.add_argument('--block_size', type=int, default=50, help='labels generated at a time')
+    parser.add_argument('--check_labels', type=int, default=10, help='labels also scored with sklearn')
+    parser.add_argument('--known_ratio', type=float, default=0.25, help='ratio of known labels, masked out of the AP')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def synthetic_block(num_samples, num_labels, known_ratio, seed):
+    """ Positives at 0.1% to 10% per label, scores rounded to 1e-4 so that there are ties """
+    rng = np.random.RandomState(seed)
+    rate = 10 ** rng.uniform(-3, -1, num_labels).astype(np.float32)
+    targets = (rng.rand(num_samples, num_labels).astype(np.float32) < rate).astype(np.float32)
+    scores = rng.rand(num_samples, num_labels).astype(np.float32) + targets * rng.rand(num_labels).astype(np.float32)
+    scores = np.round(scores / 2, 4).astype(np.float32)
+    unknown = (rng.rand(num_samples, num_labels) >= known_ratio).astype(np.float32)
+    return targets, scores, unknown
+
+
+def sklearn_metrics(targets, scores, unknown):
+    """ The loops of utils/metrics.py (before multilabel_metrics) on every column """
+    results = {'auc': [], 'ap': [], 'aupr': [], 'recall_at_fdr': [], 'threshold': []}
+    for j in range(targets.shape[1]):
+        y, s = targets[:, j], scores[:, j]
+        results['auc'].append(metrics.roc_auc_score(y, s))
+        precision, recall, _ = metrics.precision_recall_curve(y, s, pos_label=1)
+        results['aupr'].append(metrics.auc(recall, precision))
+        fdr = 1 - precision
+        results['recall_at_fdr'].append(recall[next(i for i, x in enumerate(fdr) if x <= 0.5)])
+        fpr, tpr, threshold = metrics.roc_curve(y, s, pos_label=1, drop_intermediate=False)
+        results['threshold'].append(threshold[np.argmin(np.abs(tpr - (1 - fpr)))])
+        known = unknown[:, j] > 0
+        results['ap'].append(metrics.average_precision_score(y[known], s[known], pos_label=1))
+    return results
+
+
+def main(args):
+    total, reference, checked = 0., None, None
+    for block, start in enumerate(range(0, args.num_labels, args.block_size)):
+        num_labels = min(args.block_size, args.num_labels - start)
+        targets, scores, unknown = synthetic_block(args.num_samples, num_labels, args.known_ratio, args.seed + block)
+        start_time = time.time()
+        results = multilabel_metrics(targets, scores, names=['auc', 'aupr', 'recall_at_fdr', 'threshold'])
+        results.update(multilabel_metrics(targets, scores, mask=unknown, names=['ap']))
+        total += time.time() - start_time
+        if block == 0:
+            check = min(args.check_labels, num_labels)
+            start_time = time.time()
+            reference = sklearn_metrics(targets[:, :check], scores[:, :check], unknown[:, :check])
+            sklearn_time = (time.time() - start_time) / check
+            checked = {name: values[:check] for name, values in results.items()}
+        print('labels {:5d}/{}  {:8.1f}s'.format(start + num_labels, args.num_labels, total), flush=True)
+
+    print('{} samples x {} labels'.format(args.num_samples, args.num_labels))
+    print('multilabel_metrics   {:10.1f}s'.format(total))
+    print('sklearn loops        {:10.1f}s (extrapolated from {} labels)'.format(sklearn_time * args.num_labels,
+                                                                               len(reference['auc'])))
+    for name in reference:
+        error = max(abs(a - b) for a, b in zip(reference[name], checked[name]) if not math.isnan(a))
+        print('max abs difference {:14s} {:.3e}'.format(name, error))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,113 @@
+"""
+Images/sec of MtgDataset (one JPEG file per image) and of PackedImageDataset with the encoded, jpeg and raw
+storages, through a shuffled DataLoader:
+
+    python benchmark_packed_dataset.py --num_images 2000 --workers 4
+    python benchmark_packed_dataset.py --img_dir data/mtg_202105_06_multi_label_video --labels_path data/val.csv
+
+Without --img_dir, --num_images synthetic JPEGs are written in a temporary directory. The transform resizes
+the images to --scale_size x --scale_size and center crops them to --crop_size (the test transform of
+load_data.py, done with PIL and numpy), the samples are those of training (testing=False). On a local disk
+the loose files are read from the page cache after the first pass, the gap is larger on network file systems.
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, RandomSampler
+
+from dataloaders.data_utils import read_label_csv
+from dataloaders.mtg_dataset import MtgDataset
+from dataloaders.packed_dataset import PackedImageDataset, ShardShuffleSampler, pack_images
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--img_dir', type=str, default='', help='default: synthetic images')
+    parser.add_argument('--labels_path', type=str, default='')
+    parser.add_argument('--num_images', type=int, default=2000)
+    parser.add_argument('--image_size', type=str, default='1280x720', help='size of the synthetic images')
+    parser.add_argument('--num_labels', type=int, default=78)
+    parser.add_argument('--scale_size', type=int, default=640)
+    parser.add_argument('--crop_size', type=int, default=576)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--shard_size', type=int, default=256, help='MB per shard')
+    parser.add_argument('--output_dir', type=str, default='', help='where to pack (default: a temporary dir)')
+    return parser.parse_args()
+
+
+def synthetic_images(img_dir, labels_path, num_images, image_size, num_labels, seed=0):
+    """ Smooth color gradients with noise, encoded at JPEG quality 90, and random labels """
+    rng = np.random.RandomState(seed)
+    width, height = map(int, image_size.split('x'))
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    os.makedirs(img_dir, exist_ok=True)
+    with open(labels_path, 'w') as f:
+        f.write(','.join(['name'] + ['label{}'.format(i) for i in range(num_labels)]) + '\n')
+        for i in range(num_images):
+            a, b, c = rng.rand(3, 3, 1, 1)
+            image = 255 * (0.5 + 0.25 * np.sin(a * x / 50 + b * y / 40 + 6 * c))
+            image = np.clip(image.transpose(1, 2, 0) + rng.normal(0, 8, (height, width, 3)), 0, 255)
+            Image.fromarray(image.astype(np.uint8)).save(os.path.join(img_dir, '{:07d}.jpg'.format(i)), quality=90)
+            f.write(','.join(['{:07d}'.format(i)] + [str(int(v)) for v in rng.rand(num_labels) < 0.05]) + '\n')
+
+
+class ResizeCenterCrop(object):
+    def __init__(self, scale_size, crop_size):
+        self.scale_size = scale_size
+        self.crop_size = crop_size
+
+    def __call__(self, image):
+        if image.size != (self.scale_size, self.scale_size):
+            image = image.resize((self.scale_size, self.scale_size), Image.BILINEAR)
+        start = (self.scale_size - self.crop_size) // 2
+        image = np.asarray(image)[start:start + self.crop_size, start:start + self.crop_size]
+        return torch.from_numpy(np.ascontiguousarray(image.transpose(2, 0, 1), dtype=np.float32) / 255)
+
+
+def images_per_sec(dataset, sampler, args):
+    loader = DataLoader(dataset, batch_size=args.batch_size, sampler=sampler, num_workers=args.workers)
+    count, start_time = 0, time.time()
+    for batch in loader:
+        count += batch['image'].size(0)
+    return count / (time.time() - start_time)
+
+
+def main(args):
+    tmp = tempfile.mkdtemp()
+    if not args.img_dir:
+        args.img_dir, args.labels_path = os.path.join(tmp, 'images'), os.path.join(tmp, 'labels.csv')
+        synthetic_images(args.img_dir, args.labels_path, args.num_images, args.image_size, args.num_labels)
+    output_dir = args.output_dir or tmp
+    transform = ResizeCenterCrop(args.scale_size, args.crop_size)
+
+    loose = MtgDataset(img_dir=args.img_dir, image_transform=transform, labels_path=args.labels_path)
+    loose.num_labels = loose.labels.shape[1]
+    print('{:28s} {:8.1f} images/sec'.format('loose files', images_per_sec(loose, RandomSampler(loose), args)))
+
+    img_names, label_names, labels = read_label_csv(args.labels_path)
+    for storage, resize in [('encoded', 0), ('jpeg', args.scale_size), ('raw', args.scale_size)]:
+        packed_dir = os.path.join(output_dir, storage)
+        start_time = time.time()
+        pack_images(args.img_dir, img_names, labels, packed_dir, label_names=label_names, storage=storage,
+                    resize=resize, shard_bytes=args.shard_size << 20, workers=max(1, args.workers))
+        pack_time = time.time() - start_time
+        size = sum(os.path.getsize(os.path.join(packed_dir, f)) for f in os.listdir(packed_dir)) / 2 ** 20
+        packed = PackedImageDataset(packed_dir, image_transform=transform)
+        speed = images_per_sec(packed, ShardShuffleSampler(packed), args)
+        print('{:28s} {:8.1f} images/sec  (packed in {:.1f}s, {:.0f}MB)'.format(
+            'packed, ' + storage + (' {}x{}'.format(resize, resize) if resize else ''), speed, pack_time, size))
+        checked = range(0, len(loose), max(1, len(loose) // 20))
+        same_labels = all(torch.equal(loose[i]['labels'], packed[i]['labels']) for i in checked)
+        difference = max((loose[i]['image'] - packed[i]['image']).abs().max().item() * 255 for i in checked)
+        print('{:28s} same labels: {}, max pixel difference with the loose files: {:.0f}'.format(
+            '', same_labels, difference))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -12,6 +12,8 @@ def get_args(parser, eval=False):
         choices=['coco', 'voc', 'coco1000', 'nus', 'vg', 'news', 'cub', 'mtg'],
         default='coco')
     parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--packed_dataroot', type=str, default='',
+                        help='train/val/test dirs written by pack_images.py (mtg)')
     parser.add_argument('--results_dir', type=str, default='results/')
     parser.add_argument('--test_known', type=int, default=0)
 
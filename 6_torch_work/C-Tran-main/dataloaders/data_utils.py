@@ -48,3 +48,23 @@ def image_loader(path, transform):
         image = transform(image)
 
     return image
+
+
+def read_label_csv(labels_path):
+    """Image names, label names and (n, num_labels) labels of a csv of lines name,label_1,...,label_n.
+    Lines whose first label is not a number are skipped, the first of them gives the label names."""
+    img_names, label_names, rows = [], [], []
+    with open(labels_path, 'r') as f:
+        for line in f:
+            arr = line.rstrip().split(',')
+            try:
+                float(arr[1])
+            except:
+                if not rows:
+                    label_names = arr[1:]
+                continue
+            img_names.append(arr[0])
+            rows.append(arr[1:])
+    # all the rows converted at once
+    labels = np.array(rows, dtype=np.float64)
+    return img_names, label_names, labels
@@ -2,7 +2,7 @@ import os
 import torch
 import numpy as np
 from PIL import Image
-from dataloaders.data_utils import get_unk_mask_indices
+from dataloaders.data_utils import get_unk_mask_indices, read_label_csv
 
 
 class MtgDataset(torch.utils.data.Dataset):
@@ -19,28 +19,10 @@ class MtgDataset(torch.utils.data.Dataset):
         self.img_dir = img_dir
         self.known_labels = known_labels
         self.testing = testing
-        self.img_names = []
-        self.labels = []
-        self.label_names = []
-        i = 0
-        with open(labels_path, 'r') as f:
-            for line in f:
-                label_vector = np.zeros(self.num_labels)
-                line = line.rstrip()
-                arr = line.split(',')
-                try:
-                    float(arr[1])
-                except:
-                    if i == 0:
-                        self.label_names = arr[1:]
-                    continue
-                self.img_names.append(arr[0])
-                label_vector = [float(d) for d in arr[1:]]
-                self.labels.append(label_vector)
-                i += 1
+        self.img_names, self.label_names, self.labels = read_label_csv(labels_path)
 
-        # self.labels = np.array(self.labels).astype(np.float32)
-        self.labels = np.array(self.labels).astype(int)
+        # self.labels = self.labels.astype(np.float32)
+        self.labels = self.labels.astype(int)
         self.image_transform = image_transform
         self.epoch = 1
 
@@ -0,0 +1,168 @@
+"""
+Images packed into large shard files, read through memory maps.
+
+A packed directory holds shard-00000.bin, shard-00001.bin, ... (the records of the images, one after
+the other in the order of the label csv) and index.npz (shard, offset and length of each record, the
+image names, labels and label names, and the storage of the records):
+    encoded: the bytes of the image files, decoded when read
+    jpeg:    images resized to resize x resize and encoded again as JPEG
+    raw:     images resized to resize x resize, stored decoded as height x width x 3 uint8 arrays
+Resizing to the scale_size of the transforms does their first step, Resize((scale_size, scale_size)),
+once when packing.
+"""
+import io
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import torch
+from PIL import Image
+from dataloaders.data_utils import get_unk_mask_indices
+
+STORAGES = ['encoded', 'jpeg', 'raw']
+
+
+def _load_record(task):
+    path, storage, resize, quality = task
+    if storage == 'encoded':
+        with open(path, 'rb') as f:
+            return f.read(), 0, 0
+    image = Image.open(path).convert('RGB')
+    if resize:
+        image = image.resize((resize, resize), Image.BILINEAR)
+    if storage == 'raw':
+        return np.asarray(image, dtype=np.uint8).tobytes(), image.height, image.width
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue(), image.height, image.width
+
+
+def pack_images(img_dir, img_names, labels, output_dir, label_names=(), ext='.jpg', storage='encoded',
+                resize=0, quality=95, shard_bytes=1 << 30, workers=8, chunksize=16):
+    """Writes the images img_dir/name + ext of img_names and their labels in output_dir. The images are
+    read (and resized) by `workers` processes and written sequentially in shards of about shard_bytes."""
+    assert storage in STORAGES, storage
+    assert storage != 'jpeg' or resize > 0, 'the jpeg storage is for resized images'
+    os.makedirs(output_dir, exist_ok=True)
+    num_images = len(img_names)
+    shard, offset, length = np.zeros(num_images, np.int32), np.zeros(num_images, np.int64), np.zeros(num_images, np.int64)
+    height, width = np.zeros(num_images, np.int32), np.zeros(num_images, np.int32)
+
+    tasks = ((os.path.join(img_dir, name + ext), storage, resize, quality) for name in img_names)
+    pool = Pool(workers) if workers > 1 else None
+    records = pool.imap(_load_record, tasks, chunksize) if pool else map(_load_record, tasks)
+    num_shards, position, out = 0, 0, None
+    for index, (record, record_height, record_width) in enumerate(records):
+        if out is None or position > 0 and position + len(record) > shard_bytes:
+            if out is not None:
+                out.close()
+            out = open(os.path.join(output_dir, 'shard-{:05d}.bin'.format(num_shards)), 'wb')
+            num_shards, position = num_shards + 1, 0
+        out.write(record)
+        shard[index], offset[index], length[index] = num_shards - 1, position, len(record)
+        height[index], width[index] = record_height, record_width
+        position += len(record)
+    if out is not None:
+        out.close()
+    if pool:
+        pool.close()
+        pool.join()
+
+    # written last: a packed directory with an index is complete
+    np.savez(os.path.join(output_dir, 'index.npz'), shard=shard, offset=offset, length=length,
+             height=height, width=width, labels=np.asarray(labels, dtype=np.float32).reshape(num_images, -1),
+             img_names=np.array(img_names, dtype=str), label_names=np.array(label_names, dtype=str),
+             ext=np.array(ext), storage=np.array(storage), num_shards=np.array(num_shards))
+
+
+class PackedImageDataset(torch.utils.data.Dataset):
+    """The samples of MtgDataset, read from a directory written by pack_images"""
+    def __init__(self, packed_dir, image_transform=None, known_labels=0, testing=False):
+        self.packed_dir = packed_dir
+        with np.load(os.path.join(packed_dir, 'index.npz')) as index:
+            self.shard, self.offset, self.length = index['shard'], index['offset'], index['length']
+            self.height, self.width = index['height'], index['width']
+            self.labels = index['labels']
+            self.img_names, self.label_names = list(index['img_names']), list(index['label_names'])
+            self.ext, self.storage = str(index['ext']), str(index['storage'])
+            self.num_shards = int(index['num_shards'])
+        self.num_labels = self.labels.shape[1]
+        self.known_labels = known_labels
+        self.testing = testing
+        self.image_transform = image_transform
+        self.epoch = 1
+        self._shards = {}
+
+    def __getstate__(self):
+        # the memory maps are opened again by each DataLoader worker
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def _record(self, index):
+        shard = self.shard[index]
+        if shard not in self._shards:
+            self._shards[shard] = np.memmap(os.path.join(self.packed_dir, 'shard-{:05d}.bin'.format(shard)),
+                                            dtype=np.uint8, mode='r')
+        return self._shards[shard][self.offset[index]:self.offset[index] + self.length[index]]
+
+    def load_image(self, index):
+        record = self._record(index)
+        if self.storage == 'raw':
+            return Image.fromarray(np.array(record).reshape(self.height[index], self.width[index], 3))
+        return Image.open(io.BytesIO(record.tobytes())).convert('RGB')
+
+    def __getitem__(self, index):
+        name = self.img_names[index] + self.ext
+        image = self.load_image(index)
+
+        if self.image_transform:
+            image = self.image_transform(image)
+
+        labels = torch.Tensor(self.labels[index])
+        unk_mask_indices = get_unk_mask_indices(image, self.testing,
+                                                self.num_labels,
+                                                self.known_labels, self.epoch)
+
+        mask = labels.clone()
+        mask.scatter_(0, torch.Tensor(unk_mask_indices).long(), -1)
+
+        sample = {}
+        sample['image'] = image
+        sample['labels'] = labels
+        sample['mask'] = mask
+        sample['imageIDs'] = str(name)
+
+        return sample
+
+    def __len__(self):
+        return len(self.img_names)
+
+
+class ShardShuffleSampler(torch.utils.data.Sampler):
+    """Shuffles the shards of a PackedImageDataset, then the samples within windows of shards_per_window
+    consecutive shards: the DataLoader workers read a few shards at a time, mostly sequentially, instead
+    of the whole dataset at random. The order changes at each epoch (each iteration over the sampler)."""
+    def __init__(self, dataset, shards_per_window=4, seed=0):
+        self.num_samples = len(dataset)
+        self.shards_per_window = shards_per_window
+        self.seed = seed
+        self.epoch = 0
+        # the samples of a shard are consecutive
+        self.shard_starts = np.searchsorted(dataset.shard, np.arange(dataset.num_shards + 1))
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.RandomState(self.seed + self.epoch)
+        self.epoch += 1
+        shards = rng.permutation(len(self.shard_starts) - 1)
+        for start in range(0, len(shards), self.shards_per_window):
+            window = np.concatenate([np.arange(self.shard_starts[s], self.shard_starts[s + 1])
+                                     for s in shards[start:start + self.shards_per_window]])
+            for index in rng.permutation(window):
+                yield int(index)
+
+    def __len__(self):
+        return self.num_samples
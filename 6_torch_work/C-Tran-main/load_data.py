@@ -12,6 +12,7 @@ from dataloaders.news500_dataset import NewsDataset
 from dataloaders.coco1000_dataset import Coco1000Dataset
 from dataloaders.cub312_dataset import CUBDataset
 from dataloaders.mtg_dataset import MtgDataset
+from dataloaders.packed_dataset import PackedImageDataset, ShardShuffleSampler
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -57,6 +58,7 @@ def get_data(args):
     test_dataset = None
     test_loader = None
     drop_last = False
+    train_sampler = None
     if dataset == 'coco':
         coco_root = os.path.join(data_root, 'coco')
         ann_dir = os.path.join(coco_root, 'annotations_pytorch')
@@ -163,6 +165,20 @@ def get_data(args):
                                      labels_path=anno_dir,
                                      known_labels=args.test_known_labels,
                                      testing=True)
+    elif dataset == 'mtg' and args.packed_dataroot:
+        train_dataset = PackedImageDataset(os.path.join(args.packed_dataroot, 'train'),
+                                           image_transform=trainTransform,
+                                           known_labels=args.train_known_labels,
+                                           testing=False)
+        valid_dataset = PackedImageDataset(os.path.join(args.packed_dataroot, 'val'),
+                                           image_transform=testTransform,
+                                           known_labels=args.test_known_labels,
+                                           testing=True)
+        test_dataset = PackedImageDataset(os.path.join(args.packed_dataroot, 'test'),
+                                          image_transform=testTransform,
+                                          known_labels=args.test_known_labels,
+                                          testing=True)
+        train_sampler = ShardShuffleSampler(train_dataset)
     elif dataset == 'mtg':
         img_root = os.path.join(data_root, '')
         img_dir = os.path.join(img_root, 'mtg_202105_06_multi_label_video')
@@ -246,7 +262,8 @@ def get_data(args):
     if train_dataset is not None:
         train_loader = DataLoader(train_dataset,
                                   batch_size=batch_size,
-                                  shuffle=True,
+                                  shuffle=train_sampler is None,
+                                  sampler=train_sampler,
                                   num_workers=workers,
                                   drop_last=drop_last)
     if valid_dataset is not None:
@@ -0,0 +1,42 @@
+"""
+Packs the images of a label csv (lines name,label_1,...,label_n, the images being img_dir/name.jpg) into
+shard files read by dataloaders.packed_dataset.PackedImageDataset:
+
+    python pack_images.py --img_dir data/mtg_202105_06_multi_label_video --labels_path data/train.csv \
+        --output_dir data/packed/train --storage raw --resize 640 --workers 16
+
+--storage encoded keeps the bytes of the files, jpeg and raw store the images resized to --resize x --resize
+(the Resize((scale_size, scale_size)) of load_data.py), raw without encoding them.
+"""
+import time
+import argparse
+
+from dataloaders.data_utils import read_label_csv
+from dataloaders.packed_dataset import pack_images, STORAGES
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--img_dir', type=str, required=True)
+    parser.add_argument('--labels_path', type=str, required=True)
+    parser.add_argument('--output_dir', type=str, required=True)
+    parser.add_argument('--ext', type=str, default='.jpg')
+    parser.add_argument('--storage', type=str, choices=STORAGES, default='encoded')
+    parser.add_argument('--resize', type=int, default=0, help='side of the stored images, 0 to keep their size')
+    parser.add_argument('--quality', type=int, default=95, help='JPEG quality of the jpeg storage')
+    parser.add_argument('--shard_size', type=int, default=1024, help='MB per shard')
+    parser.add_argument('--workers', type=int, default=8)
+    return parser.parse_args()
+
+
+def main(args):
+    img_names, label_names, labels = read_label_csv(args.labels_path)
+    start_time = time.time()
+    pack_images(args.img_dir, img_names, labels, args.output_dir, label_names=label_names, ext=args.ext,
+                storage=args.storage, resize=args.resize, quality=args.quality,
+                shard_bytes=args.shard_size << 20, workers=args.workers)
+    print('packed {} images in {:.1f}s'.format(len(img_names), time.time() - start_time))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -61,9 +61,7 @@ def compute_metrics(
             all_targets, all_predictions, unknown_label_mask
         )
     else:
-        meanAP = metrics.average_precision_score(
-            all_targets, all_predictions, average="macro", pos_label=1
-        )
+        meanAP = mean_avg_precision(all_targets, all_predictions)
 
     optimal_threshold = 0.5
 
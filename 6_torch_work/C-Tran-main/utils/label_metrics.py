@@ -0,0 +1,145 @@
+"""
+Ranking metrics of all the labels of a multi-label problem at once
+
+The scores of a block of labels are sorted with one batched torch.sort, and the points of the ROC
+and precision/recall curves of every label are the cumulative true/false positive counts at the
+last sample of each group of tied scores, the thresholds sklearn's roc_curve and
+precision_recall_curve use. Labels are processed in blocks of about chunk_elements scores, on the
+device of the inputs.
+"""
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+import torch
+
+
+# (n_labels, n_points) tensors, one column per point of the curves in decreasing threshold order: tps/fps
+# count the positives/negatives scored >= thresholds. Labels with fewer points repeat their last one.
+LabelCurves = namedtuple('LabelCurves', ['thresholds', 'tps', 'fps'])
+
+
+def _as_tensor(x):
+    if torch.is_tensor(x):
+        return x
+    return torch.from_numpy(np.asarray(x))
+
+
+def label_curves(targets, scores, mask=None):
+    """
+    targets, scores: (n_samples, n_labels) arrays or tensors, the positives being targets == 1
+    mask: optional (n_samples, n_labels), only the samples where mask is nonzero count for a label
+        (as the unknown_label_mask of custom_mean_avg_precision)
+    """
+    scores = _as_tensor(scores).detach().t().contiguous()
+    if not scores.is_floating_point():
+        scores = scores.double()
+    positive = _as_tensor(targets).t().to(scores.device) == 1
+    if mask is not None:
+        mask = _as_tensor(mask).t().to(scores.device) != 0
+        positive &= mask
+        # masked samples go last, they do not change the counts
+        scores = scores.masked_fill(~mask, -float('inf'))
+
+    if scores.is_cuda:
+        thresholds, order = scores.sort(dim=1, descending=True)
+    else:
+        # numpy sorts several times faster than torch on cpu, the order of tied scores does not matter
+        order = torch.from_numpy(np.argsort(-scores.numpy(), axis=1))
+        thresholds = scores.gather(1, order)
+    tps = positive.gather(1, order).cumsum(1, dtype=torch.float64)
+    if mask is None:
+        fps = torch.arange(1, tps.size(1) + 1, dtype=torch.float64, device=tps.device) - tps
+    else:
+        fps = mask.gather(1, order).cumsum(1, dtype=torch.float64) - tps
+
+    # keep the last sample of each group of tied scores, packed to the left of each row
+    is_point = torch.ones_like(positive)
+    is_point[:, :-1] = thresholds[:, 1:] != thresholds[:, :-1]
+    column = is_point.cumsum(1) - 1
+    n_points = int(column[:, -1].max()) + 1
+    label, index = is_point.nonzero(as_tuple=True)
+    column = column[label, index]
+    curves = []
+    for values in (thresholds, tps, fps):
+        packed = values[:, -1:].repeat(1, n_points)
+        packed[label, column] = values[label, index]
+        curves.append(packed)
+    return LabelCurves(*curves)
+
+
+def _previous(values, first=0.):
+    # values at the previous point, `first` before the first one
+    return torch.cat([torch.full_like(values[:, :1], first), values[:, :-1]], 1)
+
+
+def _precision(tps, fps, empty=0.):
+    # precision is `empty` where nothing is predicted positive (the counts are integers)
+    ps = tps + fps
+    return (tps / ps.clamp(min=1)).masked_fill(ps == 0, empty)
+
+
+def roc_auc(curves):
+    """ roc_auc_score of every label, nan for the labels with a single class """
+    n_pos, n_neg = curves.tps[:, -1], curves.fps[:, -1]
+    area = (curves.fps - _previous(curves.fps)) * (curves.tps + _previous(curves.tps))
+    return (area.sum(1) / (2 * n_pos * n_neg)).masked_fill((n_pos == 0) | (n_neg == 0), float('nan'))
+
+
+def average_precision(curves):
+    """ average_precision_score of every label, nan for the labels without positives """
+    n_pos = curves.tps[:, -1]
+    ap = (curves.tps - _previous(curves.tps)) * _precision(curves.tps, curves.fps)
+    return (ap.sum(1) / n_pos).masked_fill(n_pos == 0, float('nan'))
+
+
+def pr_auc(curves):
+    """ auc(recall, precision) of the precision_recall_curve of every label, nan for the labels without positives """
+    n_pos = curves.tps[:, -1]
+    precision = _precision(curves.tps, curves.fps)
+    # the curve starts at recall 0, precision 1
+    area = (curves.tps - _previous(curves.tps)) * (precision + _previous(precision, first=1.))
+    return (area.sum(1) / (2 * n_pos)).masked_fill(n_pos == 0, float('nan'))
+
+
+def recall_at_fdr(curves, fdr_cutoff=0.5):
+    """ Highest recall of the points of the precision_recall_curve with 1 - precision <= fdr_cutoff, as compute_fdr """
+    n_pos = curves.tps[:, -1]
+    selected = 1 - _precision(curves.tps, curves.fps) <= fdr_cutoff
+    recall = (curves.tps / n_pos.unsqueeze(1)).masked_fill(~selected, 0).max(1)[0]
+    return recall.masked_fill(n_pos == 0, float('nan'))
+
+
+def optimal_thresholds(curves):
+    """
+    Threshold of the roc_curve point minimizing |tpr - (1 - fpr)| (the highest one on ties),
+    inf for the first point fpr = tpr = 0, nan for the labels with a single class.
+    All the points are candidates, as roc_curve(drop_intermediate=False).
+    """
+    n_pos, n_neg = curves.tps[:, -1:], curves.fps[:, -1:]
+    best, index = (curves.tps / n_pos - (1 - curves.fps / n_neg)).abs().min(1)
+    thresholds = curves.thresholds.gather(1, index.unsqueeze(1)).squeeze(1).double()
+    # the point at threshold inf has gap 1 and comes first
+    thresholds = thresholds.masked_fill(~(best < 1), float('inf'))
+    return thresholds.masked_fill((n_pos[:, 0] == 0) | (n_neg[:, 0] == 0), float('nan'))
+
+
+def multilabel_metrics(targets, scores, mask=None, names=None, fdr_cutoff=0.5, chunk_elements=2 ** 23):
+    """
+    Per label metrics of (n_samples, n_labels) targets and scores, as numpy arrays in an OrderedDict.
+    names: subset of auc, ap, aupr, recall_at_fdr and threshold (see the functions above), default all.
+    """
+    functions = OrderedDict([('auc', roc_auc), ('ap', average_precision), ('aupr', pr_auc),
+                             ('recall_at_fdr', lambda curves: recall_at_fdr(curves, fdr_cutoff)),
+                             ('threshold', optimal_thresholds)])
+    names = list(functions) if names is None else names
+    n_samples, n_labels = scores.shape
+    chunk_size = max(1, chunk_elements // max(1, n_samples))
+    results = OrderedDict((name, []) for name in names)
+    for start in range(0, n_labels, chunk_size):
+        end = min(start + chunk_size, n_labels)
+        curves = label_curves(targets[:, start:end], scores[:, start:end],
+                              None if mask is None else mask[:, start:end])
+        for name in names:
+            results[name].append(functions[name](curves))
+        del curves
+    return OrderedDict((name, torch.cat(values).cpu().numpy()) for name, values in results.items())
@@ -10,13 +10,13 @@ from collections import OrderedDict
 import sys
 import pdb
 from sklearn import metrics
-from threading import Lock
-from threading import Thread
 import torch
 import math
 from pdb import set_trace as stop
 import os
 
+from utils.label_metrics import multilabel_metrics
+
 def error_rate(true_targets,predictions):
     acc = metrics.accuracy_score(true_targets, predictions)
     error_rate = 1-acc
@@ -119,56 +119,22 @@ def f1_score(true_targets, predictions, average='micro', axis=0):
     return f1
 
 
-def compute_aupr_thread(all_targets,all_predictions):
+def _valid(values):
+    return values[~np.isnan(values)]
 
-    aupr_array = []
-    lock = Lock()
-
-    def compute_aupr_(start,end,all_targets,all_predictions):
-        for i in range(all_targets.shape[1]):
-            try:
-                precision, recall, thresholds = metrics.precision_recall_curve(all_targets[:,i], all_predictions[:,i], pos_label=1)
-                auPR = metrics.auc(recall,precision)
-                lock.acquire()
-                aupr_array.append(np.nan_to_num(auPR))
-                lock.release()
-            except Exception:
-                pass
-
-    t1 = Thread(target=compute_aupr_, args=(0,100,all_targets,all_predictions) )
-    t2 = Thread(target=compute_aupr_, args=(100,200,all_targets,all_predictions) )
-    t3 = Thread(target=compute_aupr_, args=(200,300,all_targets,all_predictions) )
-    t4 = Thread(target=compute_aupr_, args=(300,400,all_targets,all_predictions) )
-    t5 = Thread(target=compute_aupr_, args=(400,500,all_targets,all_predictions) )
-    t6 = Thread(target=compute_aupr_, args=(500,600,all_targets,all_predictions) )
-    t7 = Thread(target=compute_aupr_, args=(600,700,all_targets,all_predictions) )
-    t8 = Thread(target=compute_aupr_, args=(700,800,all_targets,all_predictions) )
-    t9 = Thread(target=compute_aupr_, args=(800,900,all_targets,all_predictions) )
-    t10 = Thread(target=compute_aupr_, args=(900,919,all_targets,all_predictions) )
-    t1.start();t2.start();t3.start();t4.start();t5.start();t6.start();t7.start();t8.start();t9.start();t10.start()
-    t1.join();t2.join();t3.join();t4.join();t5.join();t6.join();t7.join();t8.join();t9.join();t10.join()
-
-
-    aupr_array = np.array(aupr_array)
+
+def compute_aupr_thread(all_targets,all_predictions):
+    # all the labels are sorted at once by multilabel_metrics, no threads needed
+    aupr_array = _valid(multilabel_metrics(all_targets, all_predictions, names=['aupr'])['aupr'])
 
     mean_aupr = np.mean(aupr_array)
     median_aupr = np.median(aupr_array)
     return mean_aupr,median_aupr,aupr_array
 
 def compute_fdr(all_targets,all_predictions, fdr_cutoff=0.5):
-    fdr_array = []
-    for i in range(all_targets.shape[1]):
-        try:
-            precision, recall, thresholds = metrics.precision_recall_curve(all_targets[:,i], all_predictions[:,i],pos_label=1)
-            fdr = 1- precision
-            cutoff_index = next(i for i, x in enumerate(fdr) if x <= fdr_cutoff)
-            fdr_at_cutoff = recall[cutoff_index]
-            if not math.isnan(fdr_at_cutoff):
-                fdr_array.append(np.nan_to_num(fdr_at_cutoff))
-        except:
-            pass
-
-    fdr_array = np.array(fdr_array)
+    fdr_array = _valid(multilabel_metrics(all_targets, all_predictions, names=['recall_at_fdr'],
+                                          fdr_cutoff=fdr_cutoff)['recall_at_fdr'])
+
     mean_fdr = np.mean(fdr_array)
     median_fdr = np.median(fdr_array)
     var_fdr = np.var(fdr_array)
@@ -176,17 +142,8 @@ def compute_fdr(all_targets,all_predictions, fdr_cutoff=0.5):
 
 
 def compute_aupr(all_targets,all_predictions):
-    aupr_array = []
-    for i in range(all_targets.shape[1]):
-        try:
-            precision, recall, thresholds = metrics.precision_recall_curve(all_targets[:,i], all_predictions[:,i], pos_label=1)
-            auPR = metrics.auc(recall,precision)
-            if not math.isnan(auPR):
-                aupr_array.append(np.nan_to_num(auPR))
-        except:
-            pass
-
-    aupr_array = np.array(aupr_array)
+    aupr_array = _valid(multilabel_metrics(all_targets, all_predictions, names=['aupr'])['aupr'])
+
     mean_aupr = np.mean(aupr_array)
     median_aupr = np.median(aupr_array)
     var_aupr = np.var(aupr_array)
@@ -195,35 +152,8 @@ def compute_aupr(all_targets,all_predictions):
 
 
 def compute_auc_thread(all_targets,all_predictions):
-
-    auc_array = []
-    lock = Lock()
-
-    def compute_auc_(start,end,all_targets,all_predictions):
-        for i in range(start,end):
-            try:
-                auROC = metrics.roc_auc_score(all_targets[:,i], all_predictions[:,i])
-                lock.acquire()
-                if not math.isnan(auROC):
-                    auc_array.append(auROC)
-                lock.release()
-            except ValueError:
-                pass
-
-    t1 = Thread(target=compute_auc_, args=(0,100,all_targets,all_predictions) )
-    t2 = Thread(target=compute_auc_, args=(100,200,all_targets,all_predictions) )
-    t3 = Thread(target=compute_auc_, args=(200,300,all_targets,all_predictions) )
-    t4 = Thread(target=compute_auc_, args=(300,400,all_targets,all_predictions) )
-    t5 = Thread(target=compute_auc_, args=(400,500,all_targets,all_predictions) )
-    t6 = Thread(target=compute_auc_, args=(500,600,all_targets,all_predictions) )
-    t7 = Thread(target=compute_auc_, args=(600,700,all_targets,all_predictions) )
-    t8 = Thread(target=compute_auc_, args=(700,800,all_targets,all_predictions) )
-    t9 = Thread(target=compute_auc_, args=(800,900,all_targets,all_predictions) )
-    t10 = Thread(target=compute_auc_, args=(900,919,all_targets,all_predictions) )
-    t1.start();t2.start();t3.start();t4.start();t5.start();t6.start();t7.start();t8.start();t9.start();t10.start()
-    t1.join();t2.join();t3.join();t4.join();t5.join();t6.join();t7.join();t8.join();t9.join();t10.join()
-
-    auc_array = np.array(auc_array)
+    # all the labels are sorted at once by multilabel_metrics, no threads needed
+    auc_array = _valid(multilabel_metrics(all_targets, all_predictions, names=['auc'])['auc'])
 
     mean_auc = np.mean(auc_array)
     median_auc = np.median(auc_array)
@@ -231,17 +161,8 @@ def compute_auc_thread(all_targets,all_predictions):
 
 
 def compute_auc(all_targets,all_predictions):
-    auc_array = []
-    lock = Lock()
+    auc_array = _valid(multilabel_metrics(all_targets, all_predictions, names=['auc'])['auc'])
 
-    for i in range(all_targets.shape[1]):
-        try:
-            auROC = metrics.roc_auc_score(all_targets[:,i], all_predictions[:,i])
-            auc_array.append(auROC)
-        except ValueError:
-            pass
-
-    auc_array = np.array(auc_array)
     mean_auc = np.mean(auc_array)
     median_auc = np.median(auc_array)
     var_auc = np.var(auc_array)
@@ -249,32 +170,19 @@ def compute_auc(all_targets,all_predictions):
 
 
 def Find_Optimal_Cutoff(all_targets, all_predictions):
-    thresh_array = []
-    for j in range(all_targets.shape[1]):
-        try:
-            fpr, tpr, threshold = metrics.roc_curve(all_targets[:,j], all_predictions[:,j], pos_label=1)
-            i = np.arange(len(tpr))
-            roc = pd.DataFrame({'tf' : pd.Series(tpr-(1-fpr), index=i), 'threshold' : pd.Series(threshold, index=i)})
-            roc_t = roc.ix[(roc.tf-0).abs().argsort()[:1]]
-            thresh_array.append(list(roc_t['threshold'])[0])
-
-        except:
-            pass
-    return thresh_array
+    # threshold minimizing |tpr - (1 - fpr)| for each label with both classes
+    thresh_array = _valid(multilabel_metrics(all_targets, all_predictions, names=['threshold'])['threshold'])
+    return list(thresh_array)
 
 
 
 def mean_avg_precision(true_targets, predictions, axis=0):
-    meanAP = metrics.average_precision_score(true_targets, predictions, average='macro', pos_label=1)
+    # as average_precision_score(average='macro'), which scores 0 the labels without positives
+    meanAP = np.nan_to_num(multilabel_metrics(true_targets, predictions, names=['ap'])['ap']).mean()
     return meanAP
 
 def custom_mean_avg_precision(all_targets, all_predictions, unknown_label_mask):
-    APs = []
-    for label_idx in range(all_targets.size(1)):
-        all_targets_unk = torch.masked_select(all_targets[:,label_idx],unknown_label_mask[:,label_idx].type(torch.ByteTensor))
-        all_predictions_unk = torch.masked_select(all_predictions[:,label_idx],unknown_label_mask[:,label_idx].type(torch.ByteTensor))
-        if len(all_targets_unk)>0 and all_targets_unk.sum().item() > 0:
-            AP = metrics.average_precision_score(all_targets_unk, all_predictions_unk, average=None, pos_label=1)
-            APs.append(AP)
+    # AP of each label on its unknown labels, the labels without positives among them are skipped
+    APs = _valid(multilabel_metrics(all_targets, all_predictions, mask=unknown_label_mask, names=['ap'])['ap'])
     meanAP = np.array(APs).mean()
     return meanAP
@@ -0,0 +1,81 @@
+"""
+Benchmark of SentenceTransformer.encode_stream on synthetic sentences, on CPU:
+
+    python benchmark_encode_stream.py --model_path bert-base-uncased --num_sentences 10000000 --output_path /data/emb.npy
+
+The sentences are generated on the fly (a fraction of them repeated), so the input is never held in memory. The first
+--check_size sentences are also encoded with SentenceTransformer.encode, to compare the embeddings.
+"""
+import time
+import argparse
+import logging
+import resource
+
+import numpy as np
+
+from sentence_transformers import SentenceTransformer, LoggingHandler
+
+
+logging.basicConfig(format='%(asctime)s - %(filename)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S',
+                    level=logging.INFO,
+                    handlers=[LoggingHandler()])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, required=True, help="The model to encode with")
+    parser.add_argument("--num_sentences", type=int, default=10000000, help="Number of sentences")
+    parser.add_argument("--output_path", type=str, required=True, help="The .npy file of the embeddings")
+    parser.add_argument("--repeat_ratio", type=float, default=0.2, help="Fraction of the sentences which repeat a previous one")
+    parser.add_argument("--max_tokens", type=int, default=8192, help="Max padded tokens per batch")
+    parser.add_argument("--max_batch_size", type=int, default=512, help="Max sentences per batch")
+    parser.add_argument("--window_size", type=int, default=50000, help="Sentences sorted and written at a time")
+    parser.add_argument("--cache_size", type=int, default=100000, help="Tokenized sentences kept in the cache")
+    parser.add_argument("--check_size", type=int, default=10000, help="Sentences compared with encode, 0 to skip")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args()
+
+
+def synthetic_sentences(num_sentences, repeat_ratio, seed, vocab_size=20000):
+    """Sentences of 3 to 60 words from a zipfian vocabulary, repeat_ratio of them taken from the last 10k sentences."""
+    rng = np.random.RandomState(seed)
+    vocab = ['word{}'.format(i) for i in range(vocab_size)]
+    recent = []
+    for idx in range(num_sentences):
+        if recent and rng.rand() < repeat_ratio:
+            sentence = recent[rng.randint(len(recent))]
+        else:
+            word_ids = np.minimum(rng.zipf(1.3, size=rng.randint(3, 61)), vocab_size) - 1
+            sentence = ' '.join(vocab[i] for i in word_ids)
+            if len(recent) < 10000:
+                recent.append(sentence)
+            else:
+                recent[idx % 10000] = sentence
+        yield sentence
+
+
+def main(args):
+    model = SentenceTransformer(args.model_path, device='cpu')
+
+    start_time = time.time()
+    embeddings = model.encode_stream(synthetic_sentences(args.num_sentences, args.repeat_ratio, args.seed),
+                                     args.output_path, max_tokens=args.max_tokens, max_batch_size=args.max_batch_size,
+                                     window_size=args.window_size, cache_size=args.cache_size, show_progress_bar=True)
+    elapsed = time.time() - start_time
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("encode_stream: {} sentences in {:.1f}s, {:.1f} sentences/sec, peak RSS {:.0f}MB".format(
+        len(embeddings), elapsed, len(embeddings) / elapsed, peak_rss))
+
+    if args.check_size > 0:
+        check_size = min(args.check_size, args.num_sentences)
+        sentences = list(synthetic_sentences(check_size, args.repeat_ratio, args.seed))
+        start_time = time.time()
+        reference = model.encode(sentences, batch_size=32, show_progress_bar=False)
+        elapsed = time.time() - start_time
+        print("encode: {} sentences in {:.1f}s, {:.1f} sentences/sec".format(check_size, elapsed, check_size / elapsed))
+        print("max abs difference of the embeddings: {:.3e}".format(np.abs(reference - embeddings[:check_size]).max()))
+
+
+if __name__ == '__main__':
+    main(parse_args())
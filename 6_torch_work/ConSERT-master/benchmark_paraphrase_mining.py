@@ -0,0 +1,135 @@
+"""
+Benchmark of paraphrase_mining_embeddings against the priority queue implementation it replaced:
+
+    python benchmark_paraphrase_mining.py --num_sentences 20000 --dim 64 --max_pairs 100000
+
+First checks that both return the same pairs on --num_checks small random cases, with duplicated vectors (tied scores)
+and max_pairs limits that cut through the ties, then times both on --num_sentences clustered embeddings.
+"""
+import time
+import queue
+import argparse
+
+import numpy as np
+import torch
+
+from sentence_transformers.util import pytorch_cos_sim, paraphrase_mining_embeddings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_sentences", type=int, default=20000, help="Number of embeddings of the timing")
+    parser.add_argument("--dim", type=int, default=64, help="Embedding size")
+    parser.add_argument("--max_pairs", type=int, default=100000, help="Maximal number of pairs returned")
+    parser.add_argument("--top_k", type=int, default=100, help="Pairs retrieved per sentence")
+    parser.add_argument("--query_chunk_size", type=int, default=5000, help="Queries scored at a time")
+    parser.add_argument("--corpus_chunk_size", type=int, default=100000, help="Corpus vectors scored at a time")
+    parser.add_argument("--num_checks", type=int, default=60, help="Random cases compared before the timing")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args()
+
+
+def paraphrase_mining_queue(embeddings,
+                            query_chunk_size: int = 5000,
+                            corpus_chunk_size: int = 100000,
+                            max_pairs: int = 500000,
+                            top_k: int = 100):
+    """
+    The previous priority queue implementation of paraphrase_mining on computed embeddings
+    """
+
+    top_k += 1  #A sentence has the highest similarity to itself. Increase +1 as we are interest in distinct pairs
+
+    # Mine for duplicates
+    pairs = queue.PriorityQueue()
+    min_score = -1
+    num_added = 0
+
+    for corpus_start_idx in range(0, len(embeddings), corpus_chunk_size):
+        corpus_end_idx = min(corpus_start_idx + corpus_chunk_size, len(embeddings))
+        for query_start_idx in range(0, len(embeddings), query_chunk_size):
+            query_end_idx = min(query_start_idx + query_chunk_size, len(embeddings))
+
+            #logging.info("Compute cosine similarities")
+            cos_scores = pytorch_cos_sim(embeddings[query_start_idx:query_end_idx],
+                                         embeddings[corpus_start_idx:corpus_end_idx]).cpu()
+
+
+            cos_scores_top_k_values, cos_scores_top_k_idx = torch.topk(cos_scores, min(top_k, len(cos_scores[0])), dim=1, largest=True, sorted=False)
+            cos_scores_top_k_values = cos_scores_top_k_values.tolist()
+            cos_scores_top_k_idx = cos_scores_top_k_idx.tolist()
+
+            #logging.info("Find most similar pairs out of {} queries".format(len(cos_scores)))
+            for query_itr in range(len(cos_scores)):
+                for top_k_idx, corpus_itr in enumerate(cos_scores_top_k_idx[query_itr]):
+                    i = query_start_idx + query_itr
+                    j = corpus_start_idx + corpus_itr
+
+                    if i != j and cos_scores_top_k_values[query_itr][top_k_idx] > min_score:
+                        pairs.put((cos_scores_top_k_values[query_itr][top_k_idx], i, j))
+                        num_added += 1
+
+                        if num_added >= max_pairs:
+                            entry = pairs.get()
+                            min_score = entry[0]
+
+    # Get the pairs
+    added_pairs = set()  # Used for duplicate detection
+    pairs_list = []
+    while not pairs.empty():
+        score, i, j = pairs.get()
+        sorted_i, sorted_j = sorted([i, j])
+
+        if sorted_i != sorted_j and (sorted_i, sorted_j) not in added_pairs:
+            added_pairs.add((sorted_i, sorted_j))
+            pairs_list.append([score, i, j])
+
+    # Highest scores first
+    pairs_list = sorted(pairs_list, key=lambda x: x[0], reverse=True)
+    return pairs_list
+
+
+def random_embeddings(rng, num_sentences, dim, num_distinct):
+    """Embeddings drawn from num_distinct vectors, so that many pairs have the same score."""
+    distinct = rng.randint(-2, 3, size=(num_distinct, dim)).astype(np.float32)
+    distinct[(distinct == 0).all(1), 0] = 1
+    return torch.from_numpy(distinct[rng.randint(num_distinct, size=num_sentences)])
+
+
+def check(num_checks, seed):
+    rng = np.random.RandomState(seed)
+    for case in range(num_checks):
+        num_sentences = rng.randint(2, 300)
+        embeddings = random_embeddings(rng, num_sentences, rng.randint(2, 8), rng.randint(1, 40))
+        kwargs = dict(query_chunk_size=int(rng.randint(1, num_sentences + 1)),
+                      corpus_chunk_size=int(rng.randint(1, num_sentences + 1)),
+                      max_pairs=int(rng.randint(1, num_sentences * 4)),
+                      top_k=int(rng.randint(1, 20)))
+        expected = paraphrase_mining_queue(embeddings, **kwargs)
+        pairs = paraphrase_mining_embeddings(embeddings, **kwargs)
+        assert pairs == expected, "case {} ({} sentences, {}): the pairs differ".format(case, num_sentences, kwargs)
+    print("{} random cases: same pairs".format(num_checks))
+
+
+def timed(name, fn, *args, **kwargs):
+    start = time.time()
+    result = fn(*args, **kwargs)
+    print("{:35s} {:8.2f}s".format(name, time.time() - start))
+    return result
+
+
+def main(args):
+    check(args.num_checks, args.seed)
+    rng = np.random.RandomState(args.seed)
+    centers = rng.randn(100, args.dim).astype(np.float32)
+    embeddings = torch.from_numpy(centers[rng.randint(len(centers), size=args.num_sentences)]
+                                  + rng.randn(args.num_sentences, args.dim).astype(np.float32))
+    kwargs = dict(query_chunk_size=args.query_chunk_size, corpus_chunk_size=args.corpus_chunk_size,
+                  max_pairs=args.max_pairs, top_k=args.top_k)
+    expected = timed("priority queue", paraphrase_mining_queue, embeddings, **kwargs)
+    pairs = timed("paraphrase_mining_embeddings", paraphrase_mining_embeddings, embeddings, **kwargs)
+    print("same pairs: {}".format(pairs == expected))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,106 @@
+"""
+Benchmark of semantic_search on a synthetic memory-mapped corpus:
+
+    python benchmark_semantic_search.py --corpus_size 5000000 --dim 768 --corpus_path /data/corpus.npy
+
+The dictionary semantic_search (which needs the corpus in memory) is run on the first --legacy_size vectors, and
+compared to semantic_search_topk on the same vectors. semantic_search_topk then scans the whole memory-mapped corpus,
+and searches an IVF-PQ index when faiss is installed. The peak RSS counts the pages of the memory-mapped corpus.
+"""
+import os
+import time
+import argparse
+import resource
+import tempfile
+
+import numpy as np
+import torch
+
+from sentence_transformers.util import semantic_search, semantic_search_topk, build_ivfpq_index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus_size", type=int, default=5000000, help="Number of corpus vectors")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding size")
+    parser.add_argument("--num_queries", type=int, default=1000, help="Number of queries")
+    parser.add_argument("--top_k", type=int, default=10, help="Retrieved entries per query")
+    parser.add_argument("--query_chunk_size", type=int, default=1000, help="Queries scored at a time")
+    parser.add_argument("--corpus_chunk_size", type=int, default=100000, help="Corpus vectors scored at a time")
+    parser.add_argument("--legacy_size", type=int, default=1000000, help="Corpus prefix searched by the dictionary semantic_search")
+    parser.add_argument("--corpus_path", type=str, default=None, help="Where to write the corpus .npy (default: a temporary directory)")
+    parser.add_argument("--nprobe", type=int, default=16, help="Inverted lists visited per query by the IVF-PQ index")
+    parser.add_argument("--index_candidates", type=int, default=100, help="IVF-PQ candidates rescored per query")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args()
+
+
+def make_corpus(path, corpus_size, dim, seed, chunk_size=100000):
+    """Clustered float32 vectors, written to a .npy file chunk by chunk."""
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(1000, dim).astype(np.float32)
+    corpus = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(corpus_size, dim))
+    for start_idx in range(0, corpus_size, chunk_size):
+        size = min(chunk_size, corpus_size - start_idx)
+        corpus[start_idx:start_idx + size] = centers[rng.randint(len(centers), size=size)] \
+            + rng.randn(size, dim).astype(np.float32)
+    corpus.flush()
+    del corpus
+    return np.load(path, mmap_mode='r')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(name, num_queries, fn, *args, **kwargs):
+    start = time.time()
+    result = fn(*args, **kwargs)
+    elapsed = time.time() - start
+    print("{:45s} {:8.2f}s {:10.1f} queries/s  peak RSS {:8.0f}MB".format(name, elapsed, num_queries / elapsed, peak_rss_mb()))
+    return result
+
+
+def recall(ids, true_ids):
+    return np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(ids.tolist(), true_ids.tolist())])
+
+
+def main(args):
+    corpus_path = args.corpus_path or os.path.join(tempfile.mkdtemp(), 'corpus.npy')
+    corpus = timed("write corpus {} x {}".format(args.corpus_size, args.dim), args.num_queries,
+                   make_corpus, corpus_path, args.corpus_size, args.dim, args.seed)
+    rng = np.random.RandomState(args.seed + 1)
+    queries = corpus[np.sort(rng.choice(args.corpus_size, args.num_queries, replace=False))] \
+        + rng.randn(args.num_queries, args.dim).astype(np.float32)
+    queries = torch.from_numpy(queries)
+
+    legacy_size = min(args.legacy_size, args.corpus_size)
+    prefix = torch.from_numpy(np.array(corpus[:legacy_size]))
+    results = timed("semantic_search, {} in memory".format(legacy_size), args.num_queries, semantic_search,
+                    queries, prefix, args.query_chunk_size, args.corpus_chunk_size, args.top_k)
+    scores, ids = timed("semantic_search_topk, {} in memory".format(legacy_size), args.num_queries,
+                        semantic_search_topk, queries, prefix, args.query_chunk_size, args.corpus_chunk_size, args.top_k)
+    legacy_ids = np.array([[hit['corpus_id'] for hit in hits] for hits in results])
+    print("same corpus ids: {:.4f}".format(np.mean(legacy_ids == ids.numpy())))
+    del prefix, results
+
+    scores, ids = timed("semantic_search_topk, {} memory-mapped".format(args.corpus_size), args.num_queries,
+                        semantic_search_topk, queries, corpus_path, args.query_chunk_size, args.corpus_chunk_size,
+                        args.top_k)
+
+    try:
+        import faiss
+    except ImportError:
+        print("faiss is not installed, skip the IVF-PQ index")
+        return
+    index = timed("build IVF-PQ index", args.num_queries, build_ivfpq_index, corpus, nprobe=args.nprobe)
+    _, index_ids = timed("semantic_search_topk, IVF-PQ", args.num_queries, semantic_search_topk,
+                         queries, None, top_k=args.top_k, index=index)
+    print("recall@{}: {:.4f}".format(args.top_k, recall(index_ids, ids)))
+    _, index_ids = timed("semantic_search_topk, IVF-PQ + rescoring", args.num_queries, semantic_search_topk,
+                         queries, corpus, top_k=args.top_k, index=index, index_candidates=args.index_candidates)
+    print("recall@{}: {:.4f}".format(args.top_k, recall(index_ids, ids)))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -17,10 +17,12 @@ import torch.multiprocessing as mp
 from tqdm.autonotebook import tqdm, trange
 import math
 import queue
+import time
+from itertools import islice
 
 from . import __DOWNLOAD_SERVER__
 from .evaluation import SentenceEvaluator
-from .util import import_from_string, batch_to_device, http_get
+from .util import import_from_string, batch_to_device, http_get, NpyRowWriter
 from .datasets.EncodeDataset import EncodeDataset
 from .models import Transformer, Pooling
 from . import __version__
@@ -209,6 +211,114 @@ class SentenceTransformer(nn.Sequential):
 
 
 
+    def encode_stream(self, sentences: Iterable[Union[str, List[int]]],
+                      output_path: str,
+                      max_tokens: int = 8192,
+                      max_batch_size: int = 512,
+                      window_size: int = 50000,
+                      cache_size: int = 100000,
+                      show_progress_bar: bool = None,
+                      is_pretokenized: bool = False,
+                      device: str = None,
+                      dtype=np.float32) -> ndarray:
+        """
+        Computes the sentence embeddings of a stream of sentences into a .npy file, with a memory footprint independent
+        of the number of sentences. The sentences are read window_size at a time; in a window they are sorted by token
+        length and batched by a token budget: a batch has at most max_tokens tokens, padding included. The embeddings of
+        a window are written in input order to the memory-mapped output, which grows window after window.
+        Tokenizations are kept in a LRU cache of cache_size strings, so repeated sentences are tokenized once.
+
+        :param sentences: An iterable (e.g. a generator over a file) of sentences, or of tokenized sentences if is_pretokenized
+        :param output_path: The .npy file written with the [num_sentences, dim] embeddings
+        :param max_tokens: Max number of padded tokens per batch
+        :param max_batch_size: Max number of sentences per batch
+        :param window_size: Number of sentences read, sorted and written at a time
+        :param cache_size: Number of tokenized sentences kept in the cache. 0 to disable it
+        :param show_progress_bar: Output a progress bar when encode sentences
+        :param is_pretokenized: If true, the sentences are lists of token ids
+        :param device: Which torch.device to use for the computation
+        :param dtype: The dtype of the written embeddings
+        :return: The embeddings, memory-mapped from output_path
+        """
+        self.eval()
+        if show_progress_bar is None:
+            show_progress_bar = (logging.getLogger().getEffectiveLevel()==logging.INFO or logging.getLogger().getEffectiveLevel()==logging.DEBUG)
+
+        if device is None:
+            device = self._target_device
+
+        self.to(device)
+
+        max_seq_length = self.get_max_seq_length()
+        token_cache = OrderedDict()
+        writer = NpyRowWriter(output_path, self.get_sentence_embedding_dimension(), dtype)
+        iterator = iter(sentences)
+        progress = tqdm(unit=" sentences", disable=not show_progress_bar)
+        start_time = time.time()
+
+        while True:
+            window = list(islice(iterator, window_size))
+            if len(window) == 0:
+                break
+
+            tokens = window if is_pretokenized else [self._cached_tokenize(text, token_cache, cache_size) for text in window]
+            del window
+            lengths = np.array([max(self._text_length(t), 1) for t in tokens])
+            if max_seq_length is not None:
+                lengths = np.minimum(lengths, max_seq_length)
+            length_sorted_idx = np.argsort(lengths, kind='stable')
+
+            output = writer.extend(len(tokens))
+            for batch_idx in self._token_budget_batches(lengths[length_sorted_idx], max_tokens, max_batch_size):
+                batch_idx = length_sorted_idx[batch_idx]
+                features = self.smart_batching_collate_text_only([tokens[idx] for idx in batch_idx])
+                for feature_name in features:
+                    features[feature_name] = features[feature_name].to(device)
+
+                with torch.no_grad():
+                    embeddings = self.forward(features)['sentence_embedding']
+
+                output[batch_idx] = embeddings.detach().cpu().numpy()
+                progress.update(len(batch_idx))
+
+            output.flush()
+            del output
+
+        progress.close()
+        elapsed = time.time() - start_time
+        logging.info("Encoded {} sentences in {:.1f} seconds, {:.1f} sentences/sec".format(writer.num_rows, elapsed, writer.num_rows / max(elapsed, 1e-9)))
+        return writer.close()
+
+    def _cached_tokenize(self, text: str, token_cache: OrderedDict, cache_size: int):
+        """
+        Tokenizes the text, looking it up first in the LRU token_cache of cache_size entries
+        """
+        tokens = token_cache.get(text)
+        if tokens is not None:
+            token_cache.move_to_end(text)
+            return tokens
+
+        tokens = self.tokenize(text)
+        if cache_size > 0:
+            token_cache[text] = tokens
+            if len(token_cache) > cache_size:
+                token_cache.popitem(last=False)
+        return tokens
+
+    @staticmethod
+    def _token_budget_batches(sorted_lengths: ndarray, max_tokens: int, max_batch_size: int):
+        """
+        Splits increasing sequence lengths into consecutive batches of at most max_batch_size sequences, and of at most
+        max_tokens tokens once padded to their longest sequence (a longer sequence gets its own batch)
+        """
+        start = 0
+        while start < len(sorted_lengths):
+            end = start + 1
+            while end < len(sorted_lengths) and end - start < max_batch_size and (end - start + 1) * sorted_lengths[end] <= max_tokens:
+                end += 1
+            yield np.arange(start, end)
+            start = end
+
     def start_multi_process_pool(self, target_devices: List[str] = None, encode_batch_size: int = 32):
         """
         Starts multi process to process the encoding with several, independent processes.
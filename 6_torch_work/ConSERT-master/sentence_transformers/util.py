@@ -7,7 +7,7 @@ import importlib
 import os
 import torch
 import numpy as np
-import queue
+import struct
 
 
 def pytorch_cos_sim(a: Tensor, b: Tensor):
@@ -57,58 +57,93 @@ def paraphrase_mining(model,
     :return: Returns a list of triplets with the format [score, id1, id2]
     """
 
-    top_k += 1  #A sentence has the highest similarity to itself. Increase +1 as we are interest in distinct pairs
-
     # Compute embedding for the sentences
     embeddings = model.encode(sentences, show_progress_bar=show_progress_bar, batch_size=batch_size, convert_to_tensor=True)
 
-    # Mine for duplicates
-    pairs = queue.PriorityQueue()
-    min_score = -1
-    num_added = 0
+    return paraphrase_mining_embeddings(embeddings, query_chunk_size, corpus_chunk_size, max_pairs, top_k)
 
-    for corpus_start_idx in range(0, len(embeddings), corpus_chunk_size):
-        corpus_end_idx = min(corpus_start_idx + corpus_chunk_size, len(embeddings))
-        for query_start_idx in range(0, len(embeddings), query_chunk_size):
-            query_end_idx = min(query_start_idx + query_chunk_size, len(embeddings))
 
-            #logging.info("Compute cosine similarities")
-            cos_scores = pytorch_cos_sim(embeddings[query_start_idx:query_end_idx],
-                                         embeddings[corpus_start_idx:corpus_end_idx]).cpu()
+def paraphrase_mining_embeddings(embeddings,
+                                 query_chunk_size: int = 5000,
+                                 corpus_chunk_size: int = 100000,
+                                 max_pairs: int = 500000,
+                                 top_k: int = 100):
+    """
+    Paraphrase mining of paraphrase_mining on computed embeddings, with tensor operations instead of a priority queue.
 
+    The top_k of every (query chunk, corpus chunk) are the candidate pairs. Only the candidates which can still be in the
+    max_pairs highest scores are kept as tensors, with their position in the scan: the result is the same as the priority
+    queue of the previous paraphrase_mining (checked by benchmark_paraphrase_mining.py), including which pairs with the
+    same score are kept at the max_pairs limit.
 
-            cos_scores_top_k_values, cos_scores_top_k_idx = torch.topk(cos_scores, min(top_k, len(cos_scores[0])), dim=1, largest=True, sorted=False)
-            cos_scores_top_k_values = cos_scores_top_k_values.tolist()
-            cos_scores_top_k_idx = cos_scores_top_k_idx.tolist()
+    :param embeddings: A 2 dimensional tensor or numpy array with the embeddings, or the path of a .npy file (memory-mapped, see load_embeddings)
+    :param query_chunk_size: Search for most similar pairs for #query_chunk_size at the same time. Decrease, to lower memory footprint (increases run-time).
+    :param corpus_chunk_size: Compare a sentence simultaneously against #corpus_chunk_size other sentences. Decrease, to lower memory footprint (increases run-time).
+    :param max_pairs: Maximal number of text pairs returned.
+    :param top_k: For each sentence, we retrieve up to top_k other sentences
+    :return: Returns a list of triplets with the format [score, id1, id2]
+    """
 
-            #logging.info("Find most similar pairs out of {} queries".format(len(cos_scores)))
-            for query_itr in range(len(cos_scores)):
-                for top_k_idx, corpus_itr in enumerate(cos_scores_top_k_idx[query_itr]):
-                    i = query_start_idx + query_itr
-                    j = corpus_start_idx + corpus_itr
+    top_k += 1  #A sentence has the highest similarity to itself. Increase +1 as we are interest in distinct pairs
 
-                    if i != j and cos_scores_top_k_values[query_itr][top_k_idx] > min_score:
-                        pairs.put((cos_scores_top_k_values[query_itr][top_k_idx], i, j))
-                        num_added += 1
+    embeddings = load_embeddings(embeddings)
+    if max_pairs <= 1:
+        return []
 
-                        if num_added >= max_pairs:
-                            entry = pairs.get()
-                            min_score = entry[0]
+    # Candidate pairs with a score above -1 (the initial min_score of paraphrase_mining), and their rank in the scan
+    scores = torch.empty(0)
+    ids = torch.empty(2, 0, dtype=torch.long)
+    positions = torch.empty(0, dtype=torch.long)
+    num_scanned = 0
 
-    # Get the pairs
-    added_pairs = set()  # Used for duplicate detection
-    pairs_list = []
-    while not pairs.empty():
-        score, i, j = pairs.get()
-        sorted_i, sorted_j = sorted([i, j])
+    for corpus_start_idx in range(0, len(embeddings), corpus_chunk_size):
+        corpus_end_idx = min(corpus_start_idx + corpus_chunk_size, len(embeddings))
+        corpus_chunk = normalize_embeddings(embeddings[corpus_start_idx:corpus_end_idx])
+        for query_start_idx in range(0, len(embeddings), query_chunk_size):
+            query_end_idx = min(query_start_idx + query_chunk_size, len(embeddings))
+            query_chunk = normalize_embeddings(embeddings[query_start_idx:query_end_idx], corpus_chunk.device)
+            cos_scores = torch.mm(query_chunk, corpus_chunk.transpose(0, 1)).cpu()
 
-        if sorted_i != sorted_j and (sorted_i, sorted_j) not in added_pairs:
-            added_pairs.add((sorted_i, sorted_j))
-            pairs_list.append([score, i, j])
+            cos_scores_top_k_values, cos_scores_top_k_idx = torch.topk(cos_scores, min(top_k, len(cos_scores[0])), dim=1, largest=True, sorted=False)
+            chunk_scores = cos_scores_top_k_values.flatten()
+            chunk_i = torch.arange(query_start_idx, query_end_idx).repeat_interleave(cos_scores_top_k_idx.size(1))
+            chunk_j = cos_scores_top_k_idx.flatten() + corpus_start_idx
+            chunk_positions = torch.arange(num_scanned, num_scanned + len(chunk_scores))
+            num_scanned += len(chunk_scores)
+
+            keep = (chunk_i != chunk_j) & (chunk_scores > -1)
+            scores = torch.cat([scores, chunk_scores[keep]])
+            ids = torch.cat([ids, torch.stack([chunk_i[keep], chunk_j[keep]])], dim=1)
+            positions = torch.cat([positions, chunk_positions[keep]])
+
+            # Scores below the max_pairs-th highest score so far are not returned, ties with it may be
+            if len(scores) > max_pairs:
+                keep = scores >= torch.kthvalue(scores, len(scores) - max_pairs + 1).values
+                scores, ids, positions = scores[keep], ids[:, keep], positions[keep]
+
+    if len(scores) >= max_pairs:
+        # The queue keeps max_pairs - 1 pairs: all the pairs above the max_pairs-th highest score, then the pairs with
+        # this score added before it became the min_score, the largest (id1, id2) ones
+        min_score = torch.kthvalue(scores, len(scores) - max_pairs + 1).values
+        above = scores > min_score
+        last_position = torch.sort(positions[scores >= min_score]).values[max_pairs - 1]
+        ties = torch.nonzero((scores == min_score) & (positions <= last_position)).squeeze(1)
+        num_ties = max_pairs - 1 - int(above.sum())
+        tie_order = np.lexsort((ids[1, ties].numpy(), ids[0, ties].numpy()))
+        keep = above
+        keep[ties[torch.from_numpy(tie_order[len(tie_order) - num_ties:]).long()]] = True
+        scores, ids = scores[keep], ids[:, keep]
+
+    # The queue is emptied in increasing (score, id1, id2) order, the first of the two orders of a pair is kept
+    scores, ids = scores.numpy(), ids.numpy()
+    order = np.lexsort((ids[1], ids[0], scores))
+    pair_keys = np.sort(ids[:, order], axis=0)
+    _, first = np.unique(pair_keys[0] * len(embeddings) + pair_keys[1], return_index=True)
+    order = order[np.sort(first)]
 
     # Highest scores first
-    pairs_list = sorted(pairs_list, key=lambda x: x[0], reverse=True)
-    return pairs_list
+    order = order[np.argsort(-scores[order], kind='stable')]
+    return [[score, i, j] for score, i, j in zip(scores[order].tolist(), ids[0, order].tolist(), ids[1, order].tolist())]
 
 
 def information_retrieval(*args, **kwargs):
@@ -120,7 +155,9 @@ def semantic_search(query_embeddings: Tensor,
                       corpus_embeddings: Tensor,
                       query_chunk_size: int = 100,
                       corpus_chunk_size: int = 100000,
-                      top_k: int = 10):
+                      top_k: int = 10,
+                      return_tensors: bool = False,
+                      index=None):
     """
     This function performs a cosine similarity search between a list of query embeddings  and a list of corpus embeddings.
     It can be used for Information Retrieval / Semantic Search for corpora up to about 1 Million entries.
@@ -130,8 +167,12 @@ def semantic_search(query_embeddings: Tensor,
     :param query_chunk_size: Process 100 queries simultaneously. Increasing that value increases the speed, but requires more memory.
     :param corpus_chunk_size: Scans the corpus 100k entries at a time. Increasing that value increases the speed, but requires more memory.
     :param top_k: Retrieve top k matching entries. Note, if your corpus is larger than query_chunk_size, |Chunks|*top_k are returned
+    :param return_tensors: Return the (scores, corpus_ids) tensors of semantic_search_topk instead of dictionaries. The corpus can then be a memory-mapped array or .npy file, and index an approximate index, see semantic_search_topk
     :return: Returns a sorted list with decreasing cosine similarity scores. Entries are dictionaries with the keys 'corpus_id' and 'score'
     """
+    if return_tensors:
+        return semantic_search_topk(query_embeddings, corpus_embeddings, query_chunk_size=query_chunk_size,
+                                    corpus_chunk_size=corpus_chunk_size, top_k=top_k, index=index)
 
     if isinstance(query_embeddings, (np.ndarray, np.generic)):
         query_embeddings = torch.from_numpy(query_embeddings)
@@ -184,6 +225,207 @@ def semantic_search(query_embeddings: Tensor,
     return queries_result_list
 
 
+def load_embeddings(embeddings):
+    """
+    Returns embeddings as a tensor or numpy array: a path to a .npy file is memory-mapped, lists of tensors are stacked
+    """
+    if isinstance(embeddings, str):
+        return np.load(embeddings, mmap_mode='r')
+    if isinstance(embeddings, list):
+        return torch.stack(embeddings)
+    return embeddings
+
+
+class NpyRowWriter:
+    """
+    Writes a 2 dimensional .npy file of rows window after window through memory maps, without knowing the number of
+    rows in advance: the file grows with each window, and the header gets the final shape on close.
+    """
+    header_size = 128
+
+    def __init__(self, path: str, dim: int, dtype=np.float32):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.num_rows = 0
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fOut:
+            self._write_header(fOut)
+
+    def _write_header(self, fOut):
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d, %d), }" % (np.lib.format.dtype_to_descr(self.dtype), self.num_rows, self.dim)
+        magic = np.lib.format.magic(1, 0)
+        header = header.ljust(self.header_size - len(magic) - 2 - 1) + '\n'
+        fOut.seek(0)
+        fOut.write(magic + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+    def extend(self, num_rows: int) -> np.memmap:
+        """
+        Grows the file by num_rows rows, and returns the writable memory map of these rows
+        """
+        start = self.header_size + self.num_rows * self.dim * self.dtype.itemsize
+        self.num_rows += num_rows
+        with open(self.path, 'r+b') as fOut:
+            fOut.truncate(start + num_rows * self.dim * self.dtype.itemsize)
+        return np.memmap(self.path, dtype=self.dtype, mode='r+', offset=start, shape=(num_rows, self.dim))
+
+    def close(self) -> np.ndarray:
+        """
+        Writes the final shape in the header, and returns the rows memory-mapped read-only
+        """
+        with open(self.path, 'r+b') as fOut:
+            self._write_header(fOut)
+        return np.load(self.path, mmap_mode='r')
+
+
+def topk_merge(scores: Tensor, indices: Tensor, new_scores: Tensor, new_indices: Tensor, top_k: int):
+    """
+    Merges two [n, k1] and [n, k2] top-k results (scores and indices) into the top_k, sorted by decreasing score
+    """
+    scores = torch.cat([scores, new_scores], dim=1)
+    indices = torch.cat([indices, new_indices], dim=1)
+    scores, top_idx = torch.topk(scores, min(top_k, scores.size(1)), dim=1, largest=True, sorted=True)
+    return scores, indices.gather(1, top_idx)
+
+
+def normalize_embeddings(embeddings, device=None, dtype=None):
+    """
+    Returns the L2 normalized embeddings (a tensor or a numpy / memory-mapped array chunk) as a tensor on device
+    """
+    if isinstance(embeddings, np.ndarray):
+        # Chunks of a read-only memory-mapped corpus are copied
+        embeddings = np.ascontiguousarray(embeddings)
+        embeddings = torch.from_numpy(embeddings if embeddings.flags.writeable else embeddings.copy())
+    embeddings = embeddings.to(device=device, dtype=dtype)
+    return embeddings / embeddings.norm(dim=1)[:, None]
+
+
+def semantic_search_topk(query_embeddings: Tensor,
+                         corpus_embeddings,
+                         query_chunk_size: int = 100,
+                         corpus_chunk_size: int = 100000,
+                         top_k: int = 10,
+                         index=None,
+                         index_candidates: int = None):
+    """
+    Cosine similarity search like semantic_search, which keeps the results as tensors: the running top_k scores and
+    corpus ids of all the queries are [num_queries, top_k] tensors, merged with the top_k of each corpus chunk.
+    The corpus is read chunk by chunk and normalized per chunk, so it can be a memory-mapped array or the path of a
+    .npy file (see load_embeddings) larger than memory.
+
+    With index, an approximate index with the faiss search(x, k) API over the normalized corpus (see build_ivfpq_index),
+    the corpus is not scanned: the index returns index_candidates (default top_k) candidates per query. If
+    corpus_embeddings is given, the candidates are scored with the exact cosine similarity and the top_k are kept.
+
+    :param query_embeddings: A 2 dimensional tensor with the query embeddings.
+    :param corpus_embeddings: A 2 dimensional tensor or numpy array with the corpus embeddings, or the path of a .npy file. Can be None with index.
+    :param query_chunk_size: Process 100 queries simultaneously. Increasing that value increases the speed, but requires more memory.
+    :param corpus_chunk_size: Scans the corpus 100k entries at a time. Increasing that value increases the speed, but requires more memory.
+    :param top_k: Retrieve top k matching entries
+    :param index: Search this approximate index instead of scanning the corpus
+    :param index_candidates: Number of candidates retrieved from the index, to rescore against the corpus embeddings
+    :return: Returns a tuple (scores, corpus_ids) of [num_queries, top_k] tensors, sorted by decreasing cosine similarity. corpus_ids is -1 where the index found fewer candidates
+    """
+    query_embeddings = load_embeddings(query_embeddings)
+    if isinstance(query_embeddings, np.ndarray):
+        query_embeddings = torch.from_numpy(np.ascontiguousarray(query_embeddings))
+    if len(query_embeddings.shape) == 1:
+        query_embeddings = query_embeddings.unsqueeze(0)
+    query_embeddings = normalize_embeddings(query_embeddings)
+    corpus_embeddings = load_embeddings(corpus_embeddings)
+
+    if index is not None:
+        return _index_search(query_embeddings, corpus_embeddings, index, top_k, index_candidates or top_k)
+
+    device, dtype = query_embeddings.device, query_embeddings.dtype
+    num_queries = len(query_embeddings)
+    scores = torch.empty(num_queries, 0, dtype=dtype)
+    corpus_ids = torch.empty(num_queries, 0, dtype=torch.long)
+
+    # Each corpus chunk is read once, and compared to all the queries
+    for corpus_start_idx in range(0, len(corpus_embeddings), corpus_chunk_size):
+        corpus_end_idx = min(corpus_start_idx + corpus_chunk_size, len(corpus_embeddings))
+        corpus_chunk = normalize_embeddings(corpus_embeddings[corpus_start_idx:corpus_end_idx], device, dtype)
+        chunk_k = min(top_k, len(corpus_chunk))
+
+        new_scores, new_ids = [], []
+        for query_start_idx in range(0, num_queries, query_chunk_size):
+            query_end_idx = min(query_start_idx + query_chunk_size, num_queries)
+            cos_scores = torch.mm(query_embeddings[query_start_idx:query_end_idx], corpus_chunk.transpose(0, 1))
+            cos_scores = torch.nan_to_num(cos_scores)
+            chunk_scores, chunk_ids = torch.topk(cos_scores, chunk_k, dim=1, largest=True, sorted=False)
+            new_scores.append(chunk_scores.cpu())
+            new_ids.append(chunk_ids.cpu() + corpus_start_idx)
+
+        scores, corpus_ids = topk_merge(scores, corpus_ids, torch.cat(new_scores), torch.cat(new_ids), top_k)
+
+    return scores, corpus_ids
+
+
+def _index_search(query_embeddings: Tensor, corpus_embeddings, index, top_k: int, num_candidates: int):
+    queries = query_embeddings.cpu().float().numpy()
+    index_scores, index_ids = index.search(queries, num_candidates)
+    scores, corpus_ids = torch.from_numpy(index_scores), torch.from_numpy(index_ids).long()
+
+    if corpus_embeddings is not None:
+        # Rescore the candidates with the exact cosine similarity, rows sorted for a memory-mapped corpus
+        valid = corpus_ids >= 0
+        candidate_ids = torch.unique(corpus_ids[valid])
+        candidates = normalize_embeddings(corpus_embeddings[candidate_ids.numpy()], 'cpu', query_embeddings.dtype)
+        position = torch.searchsorted(candidate_ids, corpus_ids.clamp(min=0))
+        candidate_scores = torch.bmm(candidates[position], query_embeddings.cpu().unsqueeze(2)).squeeze(2)
+        scores = torch.nan_to_num(candidate_scores)
+
+    scores = scores.masked_fill(corpus_ids < 0, -float('inf'))
+    return topk_merge(scores[:, :0], corpus_ids[:, :0], scores, corpus_ids, top_k)
+
+
+def build_ivfpq_index(corpus_embeddings,
+                      nlist: int = None,
+                      m: int = 16,
+                      nbits: int = 8,
+                      nprobe: int = 16,
+                      train_size: int = 262144,
+                      corpus_chunk_size: int = 100000,
+                      seed: int = 0):
+    """
+    Builds a faiss IVF-PQ inner product index over the normalized corpus embeddings, for semantic_search_topk.
+    Requires faiss (pip install faiss-cpu). The corpus can be memory-mapped: it is added chunk by chunk.
+
+    :param corpus_embeddings: A 2 dimensional tensor or numpy array with the corpus embeddings, or the path of a .npy file
+    :param nlist: Number of inverted lists, 4 * sqrt(corpus size) by default
+    :param m: Number of sub-quantizers of the product quantizer, must divide the embedding size
+    :param nbits: Bits per sub-quantizer code
+    :param nprobe: Number of inverted lists visited per query
+    :param train_size: Number of embeddings sampled to train the coarse and the product quantizers
+    :param corpus_chunk_size: Number of embeddings normalized and added at a time
+    :param seed: Seed of the training sample
+    :return: The faiss index
+    """
+    try:
+        import faiss
+    except ImportError:
+        raise ImportError("build_ivfpq_index requires faiss: pip install faiss-cpu")
+
+    corpus_embeddings = load_embeddings(corpus_embeddings)
+    num_corpus, dim = corpus_embeddings.shape
+    if nlist is None:
+        nlist = int(4 * np.sqrt(num_corpus))
+
+    quantizer = faiss.IndexFlatIP(dim)
+    index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+
+    sample = np.sort(np.random.RandomState(seed).choice(num_corpus, min(train_size, num_corpus), replace=False))
+    index.train(normalize_embeddings(corpus_embeddings[sample], dtype=torch.float32).numpy())
+    for start_idx in range(0, num_corpus, corpus_chunk_size):
+        chunk = corpus_embeddings[start_idx:start_idx + corpus_chunk_size]
+        index.add(normalize_embeddings(chunk, dtype=torch.float32).numpy())
+
+    index.nprobe = nprobe
+    return index
+
+
 def http_get(url, path):
     """
     Downloads a URL to a given path on disc
@@ -0,0 +1,53 @@
+import argparse
+import time
+
+import torch
+
+from losses.ot_loss import OT_Loss
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='CPU timing of the per-image and batched OT loss')
+    parser.add_argument('--crop-size', type=int, default=512, help='the crop size of the train image')
+    parser.add_argument('--downsample-ratio', type=int, default=8, help='stride of the density map')
+    parser.add_argument('--batch-sizes', default='1,2,4,8,16,32', help='comma separated batch sizes')
+    parser.add_argument('--min-points', type=int, default=0, help='min annotated points per image')
+    parser.add_argument('--max-points', type=int, default=300, help='max annotated points per image')
+    parser.add_argument('--norm-cood', type=int, default=0, help='whether to norm cood when computing distance')
+    parser.add_argument('--reg', type=float, default=10.0, help='entropy regularization in sinkhorn')
+    parser.add_argument('--num-of-iter-in-ot', type=int, default=100, help='sinkhorn iterations')
+    parser.add_argument('--log-domain', type=int, default=0, help='log domain batched sinkhorn')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per batch size')
+    return parser.parse_args()
+
+
+def run(ot_loss, density, points):
+    density = density.detach().requires_grad_()
+    normed = density / (density.sum([1, 2, 3], keepdim=True) + 1e-6)
+    loss, wd, ot_obj_value = ot_loss(normed, density, points)
+    grad, = torch.autograd.grad(loss.sum(), density)
+    return loss.item(), wd, ot_obj_value.item(), grad
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    torch.manual_seed(0)
+    size = args.crop_size // args.downsample_ratio
+    losses = [OT_Loss(args.crop_size, args.downsample_ratio, args.norm_cood, torch.device('cpu'),
+                      args.num_of_iter_in_ot, args.reg, batched=batched, log_domain=args.log_domain) for batched in (False, True)]
+    print('batch  per-image(s)  batched(s)  speedup  max|grad diff|  wd diff')
+    for batch_size in map(int, args.batch_sizes.split(',')):
+        density = torch.rand(batch_size, 1, size, size)
+        points = [torch.rand(int(n), 2) * args.crop_size
+                  for n in torch.randint(args.min_points, args.max_points + 1, (batch_size,))]
+        results, times = [], []
+        for ot_loss in losses:
+            results.append(run(ot_loss, density, points))
+            start = time.time()
+            for _ in range(args.repeat):
+                run(ot_loss, density, points)
+            times.append((time.time() - start) / args.repeat)
+        grad_diff = (results[0][3] - results[1][3]).abs().max().item()
+        wd_diff = abs(results[0][1] - results[1][1])
+        print('{:5d}  {:12.4f}  {:10.4f}  {:6.2f}x  {:14.3e}  {:.3e}'.format(
+            batch_size, times[0], times[1], times[0] / times[1], grad_diff, wd_diff))
@@ -482,3 +482,197 @@ def sinkhorn_epsilon_scaling(a, b, C, reg=1e-1, maxIter=100, maxInnerIter=100, t
         return P, log
     else:
         return P
+
+
+def _log_add_eps(x, eps=M_EPS):
+    """log(exp(x) + eps), elementwise and stable"""
+    log_eps = torch.tensor(eps, dtype=x.dtype, device=x.device).log()
+    hi = torch.max(x, log_eps)
+    return hi + torch.log1p(torch.exp(-(x - log_eps).abs()))
+
+
+def sinkhorn_knopp_batched(a, b, C, reg=1e-1, maxIter=1000, stopThr=1e-9, log_domain=False,
+                           verbose=False, log=False, eval_freq=10, print_freq=200, **kwargs):
+    """
+    Solve a batch of entropic regularization optimal transport problems at once,
+    with the Sinkhorn-Knopp iterations of sinkhorn_knopp.
+
+    Problems have their own number of target samples: a is padded with zeros,
+    which masks the padded rows of C. Each problem stops when its own constraint
+    error, checked every eval_freq iterations, is below stopThr, or on numerical
+    errors like sinkhorn_knopp; the stopped problems are dropped from the batch.
+
+    C is either the (n, na, nb) loss matrices or, for source samples on a h x w
+    grid with a separable loss C[k, i, y * w + x] = Cy[k, i, y] + Cx[k, i, x], the
+    pair (Cy, Cx). The kernel K = exp(-C / reg) is then the product of exp(-Cy / reg)
+    and exp(-Cx / reg), and K v, u^T K are two batched matrix products on the
+    factors: the (n, na, nb) kernel is not built, only the returned plan is.
+
+    With log_domain, u = a / (K v + eps) and v = b / (K^T u + eps) are computed as
+    log u = log a - log(exp(LSE_j(log v_j - C_ij / reg)) + eps): the iterates are the
+    same (including M_EPS) but the kernel never underflows. It is stable for small
+    reg, and much slower on CPU as each iteration takes exp of the dense C.
+
+    Parameters
+    ----------
+    a : torch.tensor (n, na)
+        samples measures in the target domain, zero for padded samples
+    b : torch.tensor (n, nb)
+        samples measures in the source domain
+    C : torch.tensor (n, na, nb) or pair of torch.tensor (n, na, h), (n, na, w)
+        loss matrices, or their separable (Cy, Cx) factors with nb = h * w
+    reg : float
+        Regularization term > 0
+    maxIter : int, optional
+        Max number of iterations
+    stopThr : float, optional
+        Stop threshol on error ( > 0 )
+    log_domain : bool, optional
+        iterate on log u, log v
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+
+    Returns
+    -------
+    gamma : (n x na x nb) torch.tensor
+        Optimal transportation matrices for the given parameters
+    log : dict
+        log dictionary return only if log==True in parameters, with 'err' of
+        shape (n_eval, n) (nan once a problem stopped) and 'n_iter' of shape (n,)
+    """
+
+    device = a.device
+    separable = isinstance(C, (tuple, list))
+    if separable:
+        Cy, Cx = C
+        n, na, h = Cy.shape
+        w = Cx.size(2)
+        nb = h * w
+        assert Cx.shape[:2] == (n, na), "Shapes of Cy and Cx don't match"
+        if log_domain:
+            C = (Cy.unsqueeze(3) + Cx.unsqueeze(2)).view(n, na, nb)
+            separable = False
+    else:
+        n, na, nb = C.shape
+    dtype = a.dtype
+
+    assert na >= 1 and nb >= 1, 'C needs to be 3d'
+    assert a.shape == (n, na) and b.shape == (n, nb), "Shape of a or b does't match that of C"
+    assert reg > 0, 'reg should be greater than 0'
+    assert a.min() >= 0. and b.min() >= 0., 'Elements in a or b less than 0'
+
+    if log:
+        log = {'err': []}
+
+    mask = a > 0
+    # u starts at 1 / na on the samples of each problem, as in sinkhorn_knopp, and
+    # is 0 on the padding; the iterates are kept as log u, log v in log domain
+    u = mask.to(dtype) / mask.sum(1, keepdim=True).to(dtype)
+    v = torch.ones_like(b) / nb
+    if log_domain:
+        K = (C / -reg,)
+        u, v, a, b = torch.log(u), torch.log(v), torch.log(a), torch.log(b)
+    elif separable:
+        K = (torch.exp(Cy / -reg), torch.exp(Cx / -reg))
+    else:
+        K = (torch.exp(C / -reg),)
+
+    def KTu(K, u):
+        if log_domain:
+            return torch.logsumexp(u.unsqueeze(2) + K[0], 1)
+        if separable:
+            Ky, Kx = K
+            return torch.bmm((Ky * u.unsqueeze(2)).transpose(1, 2), Kx).view(len(u), -1)
+        return torch.bmm(u.unsqueeze(1), K[0]).squeeze(1)
+
+    def Kv(K, v):
+        if log_domain:
+            return torch.logsumexp(v.unsqueeze(1) + K[0], 2)
+        if separable:
+            Ky, Kx = K
+            return (torch.bmm(Ky, v.view(len(v), h, w)) * Kx).sum(2)
+        return torch.bmm(K[0], v.unsqueeze(2)).squeeze(2)
+
+    def scale(a, Kx):
+        if log_domain:
+            return a - _log_add_eps(Kx)
+        return torch.div(a, Kx + M_EPS)
+
+    n_iter = torch.zeros(n, dtype=torch.long, device=device)
+    # indices of the problems still iterating, and their slices of the inputs
+    active = torch.arange(n, device=device)
+    act_K, act_a, act_b, act_u, act_v = K, a, b, u.clone(), v.clone()
+
+    it = 1
+    while it <= maxIter and len(active) > 0:
+        upre, vpre = act_u, act_v
+        act_v = scale(act_b, KTu(act_K, act_u))
+        act_u = scale(act_a, Kv(act_K, act_v))
+        done = torch.zeros(len(active), dtype=torch.bool, device=device)
+
+        if not log_domain:
+            bad = torch.isnan(act_u).any(1) | torch.isnan(act_v).any(1) | \
+                torch.isinf(act_u).any(1) | torch.isinf(act_v).any(1)
+            if bad.any():
+                print('Warning: numerical errors at iteration', it)
+                act_u = torch.where(bad.unsqueeze(1), upre, act_u)
+                act_v = torch.where(bad.unsqueeze(1), vpre, act_v)
+                done |= bad
+
+        if it % eval_freq == 0:
+            # b_hat = (u K) * v, error as in sinkhorn_knopp
+            if log_domain:
+                b_hat = torch.exp(KTu(act_K, act_u) + act_v)
+                err = (act_b.exp() - b_hat).pow(2).sum(1)
+            else:
+                b_hat = KTu(act_K, act_u) * act_v
+                err = (act_b - b_hat).pow(2).sum(1)
+            if log:
+                errs = torch.full((n,), float('nan'), dtype=err.dtype, device=device)
+                errs[active] = err
+                log['err'].append(errs)
+            if verbose and it % print_freq == 0:
+                print('iteration {:5d}, max constraint error {:5e}'.format(it, err.max().item()))
+            done |= err <= stopThr
+
+        if it == maxIter:
+            done[:] = True
+        if done.any():
+            stop = active[done]
+            u[stop], v[stop], n_iter[stop] = act_u[done], act_v[done], it
+            keep = ~done
+            active = active[keep]
+            act_K = tuple(k[keep] for k in act_K)
+            act_a, act_b = act_a[keep], act_b[keep]
+            act_u, act_v = act_u[keep], act_v[keep]
+        it += 1
+
+    if log:
+        log['err'] = torch.stack(log['err']) if log['err'] else torch.empty(0, n)
+        log['n_iter'] = n_iter
+        if log_domain:
+            log['u'] = u.exp()
+            log['v'] = v.exp()
+            log['alpha'] = reg * _log_add_eps(u)
+            log['beta'] = reg * _log_add_eps(v)
+        else:
+            log['u'] = u
+            log['v'] = v
+            log['alpha'] = reg * torch.log(u + M_EPS)
+            log['beta'] = reg * torch.log(v + M_EPS)
+
+    # transport plan
+    if log_domain:
+        P = torch.exp(u.unsqueeze(2) + K[0] + v.unsqueeze(1))
+    elif separable:
+        Ky, Kx = K
+        P = (u.view(n, na, 1, 1) * Ky.unsqueeze(3)) * (Kx.unsqueeze(2) * v.view(n, 1, h, w))
+        P = P.view(n, na, nb)
+    else:
+        P = u.unsqueeze(2) * K[0] * v.unsqueeze(1)
+    if log:
+        return P, log
+    else:
+        return P
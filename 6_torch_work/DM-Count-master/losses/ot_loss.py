@@ -1,9 +1,10 @@
 import torch
 from torch.nn import Module
-from .bregman_pytorch import sinkhorn
+from .bregman_pytorch import sinkhorn, sinkhorn_knopp_batched
 
 class OT_Loss(Module):
-    def __init__(self, c_size, stride, norm_cood, device, num_of_iter_in_ot=100, reg=10.0):
+    def __init__(self, c_size, stride, norm_cood, device, num_of_iter_in_ot=100, reg=10.0, batched=False,
+                 log_domain=False):
         super(OT_Loss, self).__init__()
         assert c_size % stride == 0
 
@@ -12,6 +13,8 @@ class OT_Loss(Module):
         self.norm_cood = norm_cood
         self.num_of_iter_in_ot = num_of_iter_in_ot
         self.reg = reg
+        self.batched = batched # solve the OT of all images at once, see forward_batched
+        self.log_domain = log_domain # log domain iterations in forward_batched
 
         # coordinate is same to image space, set to constant since crop size is same
         self.cood = torch.arange(0, c_size, step=stride,
@@ -24,6 +27,8 @@ class OT_Loss(Module):
 
 
     def forward(self, normed_density, unnormed_density, points):
+        if self.batched:
+            return self.forward_batched(normed_density, unnormed_density, points)
         batch_size = normed_density.size(0)
         assert len(points) == batch_size
         assert self.output_size == normed_density.size(2)
@@ -64,4 +69,51 @@ class OT_Loss(Module):
 
         return loss, wd, ot_obj_values
 
+    def forward_batched(self, normed_density, unnormed_density, points):
+        """Same as forward, with the images padded to the same number of points
+        and their OT problems solved together by sinkhorn_knopp_batched."""
+        batch_size = normed_density.size(0)
+        assert len(points) == batch_size
+        assert self.output_size == normed_density.size(2)
+        loss = torch.zeros([1]).to(self.device)
+        ot_obj_values = torch.zeros([1]).to(self.device)
+        idx = [i for i, im_points in enumerate(points) if len(im_points) > 0]
+        if len(idx) == 0:
+            return loss, 0, ot_obj_values
 
+        # pad the points, a is 0 on the padding so it masks the padded rows of the cost
+        num_points = max(len(points[i]) for i in idx)
+        pts = torch.zeros([len(idx), num_points, 2], device=self.device)
+        target_prob = torch.zeros([len(idx), num_points], device=self.device)
+        for j, i in enumerate(idx):
+            pts[j, :len(points[i])] = points[i]
+            target_prob[j, :len(points[i])] = 1. / len(points[i])
+        if self.norm_cood:
+            pts = pts / self.c_size * 2 - 1 # map to [-1, 1]
+        # l2 square distance, [#image, #gt, #cood * #cood]
+        x = pts[:, :, 0].unsqueeze(2)  # [#image, #gt, 1]
+        y = pts[:, :, 1].unsqueeze(2)
+        x_dis = -2 * torch.matmul(x, self.cood) + x * x + self.cood * self.cood # [#image, #gt, #cood]
+        y_dis = -2 * torch.matmul(y, self.cood) + y * y + self.cood * self.cood
+        dis = y_dis.unsqueeze(3) + x_dis.unsqueeze(2)
+        dis = dis.view(len(idx), num_points, -1)
+
+        normed = normed_density[idx]
+        unnormed = unnormed_density[idx]
+        source_prob = normed.view(len(idx), -1).detach()
+        # the distance is separable on the density grid, the solver only needs its y and x parts
+        P, log = sinkhorn_knopp_batched(target_prob, source_prob, (y_dis, x_dis), self.reg,
+                                        maxIter=self.num_of_iter_in_ot, log_domain=self.log_domain, log=True)
+        beta = log['beta'] # [#image, #cood * #cood]
+        ot_obj_values += torch.sum(normed.view(len(idx), -1) * beta)
+        # im_grad = beta / source_count - < beta, source_density> / (source_count)^2, per image
+        source_density = unnormed.view(len(idx), -1).detach()
+        source_count = source_density.sum(1, keepdim=True)
+        im_grad_1 = (source_count) / (source_count * source_count + 1e-8) * beta
+        im_grad_2 = (source_density * beta).sum(1, keepdim=True) / (source_count * source_count + 1e-8)
+        im_grad = (im_grad_1 - im_grad_2).detach().view(unnormed.shape)
+        # Define loss = <im_grad, predicted density>. The gradient of loss w.r.t prediced density is im_grad.
+        loss += torch.sum(unnormed * im_grad)
+        wd = torch.sum(dis * P).item()
+
+        return loss, wd, ot_obj_values
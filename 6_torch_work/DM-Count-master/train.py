@@ -38,6 +38,10 @@ def parse_args():
     parser.add_argument('--num-of-iter-in-ot', type=int, default=100,
                         help='sinkhorn iterations')
     parser.add_argument('--norm-cood', type=int, default=0, help='whether to norm cood when computing distance')
+    parser.add_argument('--batched-ot', type=int, default=0,
+                        help='whether to solve the OT of all images in a batch at once')
+    parser.add_argument('--log-domain-ot', type=int, default=0,
+                        help='whether to run the batched sinkhorn in log domain (stable for small reg, slower)')
 
     args = parser.parse_args()
 
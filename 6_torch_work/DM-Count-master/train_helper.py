@@ -92,7 +92,7 @@ class Trainer(object):
             self.logger.info('random initialization')
 
         self.ot_loss = OT_Loss(args.crop_size, downsample_ratio, args.norm_cood, self.device, args.num_of_iter_in_ot,
-                               args.reg)
+                               args.reg, batched=args.batched_ot, log_domain=args.log_domain_ot)
         self.tv_loss = nn.L1Loss(reduction='none').to(self.device)
         self.mse = nn.MSELoss().to(self.device)
         self.mae = nn.L1Loss().to(self.device)
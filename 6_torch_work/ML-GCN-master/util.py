@@ -214,38 +214,31 @@ class AveragePrecisionMeter(object):
 
         if self.scores.numel() == 0:
             return 0
-        ap = torch.zeros(self.scores.size(1))
-        rg = torch.arange(1, self.scores.size(0)).float()
-        # compute average precision for each class
-        for k in range(self.scores.size(1)):
-            # sort scores
-            scores = self.scores[:, k]
-            targets = self.targets[:, k]
-            # compute average precision
-            ap[k] = AveragePrecisionMeter.average_precision(scores, targets, self.difficult_examples)
-        return ap
+        # all the classes are sorted at once
+        return AveragePrecisionMeter.average_precisions(self.scores, self.targets, self.difficult_examples)
 
     @staticmethod
     def average_precision(output, target, difficult_examples=True):
+        return AveragePrecisionMeter.average_precisions(output.view(-1, 1), target.view(-1, 1), difficult_examples)[0]
 
+    @staticmethod
+    def average_precisions(output, target, difficult_examples=True):
+        """Average precision of each column of the NxK output and target, as
+        average_precision on every column: prec@i is averaged over the positive
+        examples, ties kept in the sort order and, with difficult_examples, the
+        examples of target 0 skipped
+        """
         # sort examples
         sorted, indices = torch.sort(output, dim=0, descending=True)
+        target = target.gather(0, indices)
+        positive = target == 1
+        counted = target != 0 if difficult_examples else torch.ones_like(positive)
 
         # Computes prec@i
-        pos_count = 0.
-        total_count = 0.
-        precision_at_i = 0.
-        for i in indices:
-            label = target[i]
-            if difficult_examples and label == 0:
-                continue
-            if label == 1:
-                pos_count += 1
-            total_count += 1
-            if label == 1:
-                precision_at_i += pos_count / total_count
-        precision_at_i /= pos_count
-        return precision_at_i
+        pos_count = positive.cumsum(0).double()
+        total_count = counted.cumsum(0).double().clamp(min=1)
+        precision_at_i = (pos_count / total_count).masked_fill(~positive, 0).sum(0)
+        return (precision_at_i / positive.sum(0).double()).float()
 
     def overall(self):
         if self.scores.numel() == 0:
@@ -0,0 +1,106 @@
+"""Linear evaluation of SeCo features without liblinear
+
+A linear classifier is trained one-vs-rest with the L2-regularized L2-loss (squared hinge) objective of
+liblinear's -s 1/-s 2 solvers,
+    min_w  0.5 * |w|^2 + cost * sum_i max(0, 1 - y_i * w.x_i)^2    for each class,
+by mini-batch Adam on torch (multi-threaded on CPU). The training samples are streamed from the memory-mapped
+shards of seco.feature_shards by chunks (read sequentially, shuffled within a chunk) and each mini-batch
+updates the classifiers of all the costs, so a sweep over costs reads the data once per epoch.
+"""
+
+import time
+import resource
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+
+def _chunks(shards, chunk_size, rng=None):
+    """(features, labels) chunks of the shards, in a random order of chunks if rng is given."""
+    features, labels = shards
+    spans = [(s, i) for s in range(len(features)) for i in range(0, len(features[s]), chunk_size)]
+    if rng is not None:
+        spans = [spans[i] for i in rng.permutation(len(spans))]
+    for s, i in spans:
+        yield (np.array(features[s][i:i + chunk_size], dtype=np.float32),
+               np.array(labels[s][i:i + chunk_size], dtype=np.int64))
+
+
+def _prefetched(iterator):
+    """The items of iterator, the next one read by a thread while the current one is used."""
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(next, iterator, None)
+        while True:
+            item = future.result()
+            if item is None:
+                return
+            future = pool.submit(next, iterator, None)
+            yield item
+
+
+def peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LinearProbe(object):
+    """One-vs-rest linear classifiers of num_classes classes on dim features, one per cost of costs."""
+    def __init__(self, dim, num_classes, costs=(1.0,)):
+        self.costs = list(costs)
+        self.num_classes = num_classes
+        self.weight = torch.zeros(len(self.costs), dim, num_classes, requires_grad=True)
+
+    def scores(self, x):
+        # (num_costs, batch, num_classes)
+        return torch.matmul(x, self.weight)
+
+    def loss(self, x, y, num_samples):
+        """The objectives of the costs divided by cost * num_samples (same minimizers), on a mini-batch:
+        the regularization is spread over the mini-batches of an epoch."""
+        targets = -torch.ones(len(y), self.num_classes)
+        targets[torch.arange(len(y)), y] = 1
+        hinge = torch.clamp(1 - targets * self.scores(x), min=0)
+        data_loss = hinge.pow(2).sum(2).mean(1)
+        inv_costs = torch.tensor([1.0 / c for c in self.costs])
+        reg_loss = 0.5 * inv_costs / num_samples * self.weight.pow(2).sum((1, 2))
+        return (data_loss + reg_loss).sum()
+
+    def fit(self, shards, epochs=20, batch_size=1024, lr=1e-2, chunk_size=65536, seed=0, log=print):
+        features, _ = shards
+        num_samples = sum(len(f) for f in features)
+        rng = np.random.RandomState(seed)
+        optimizer = torch.optim.Adam([self.weight], lr=lr)
+        steps = epochs * sum(-(-len(f) // batch_size) for f in features)
+        scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, max(1, steps))
+        for epoch in range(epochs):
+            start_time, total_loss = time.time(), 0.0
+            # the chunks are read by another thread, with their own random order
+            chunk_rng = np.random.RandomState(rng.randint(2 ** 31))
+            for x, y in _prefetched(_chunks(shards, chunk_size, chunk_rng)):
+                order = torch.from_numpy(rng.permutation(len(y)))
+                x, y = torch.from_numpy(x)[order], torch.from_numpy(y)[order]
+                for i in range(0, len(y), batch_size):
+                    loss = self.loss(x[i:i + batch_size], y[i:i + batch_size], num_samples)
+                    optimizer.zero_grad()
+                    loss.backward()
+                    optimizer.step()
+                    scheduler.step()
+                    total_loss += loss.item() * len(y[i:i + batch_size])
+            log('epoch {}/{}: loss {:.4f}, {:.1f}s, peak memory {:.0f}MB'.format(
+                epoch + 1, epochs, total_loss / num_samples / len(self.costs), time.time() - start_time,
+                peak_memory_mb()))
+        return self
+
+    def predict(self, shards, chunk_size=65536):
+        """(num_costs, num_samples) predicted classes of the samples of shards."""
+        predictions = []
+        with torch.no_grad():
+            for x, _ in _prefetched(_chunks(shards, chunk_size)):
+                predictions.append(self.scores(torch.from_numpy(x)).argmax(2).numpy())
+        return np.concatenate(predictions, 1)
+
+    def accuracy(self, shards, chunk_size=65536):
+        """{cost: accuracy in %} on the samples of shards."""
+        labels = np.concatenate([np.asarray(l) for l in shards[1]])
+        predictions = self.predict(shards, chunk_size)
+        return {c: 100.0 * np.mean(p == labels) for c, p in zip(self.costs, predictions)}
@@ -21,6 +21,8 @@ import io
 import re
 import warnings
 import random
+import multiprocessing
+from collections import deque
 
 
 class BPE(object):
@@ -62,6 +64,9 @@ class BPE(object):
 
         self.cache = {}
 
+        # word -> its output subword units (with separators), without dropout
+        self.word_cache = {}
+
     def process_line(self, line, dropout=0):
         """segment line, dealing with leading and trailing whitespace"""
 
@@ -87,10 +92,14 @@ class BPE(object):
     def segment_tokens(self, tokens, dropout=0):
         """segment a sequence of tokens with BPE encoding"""
         output = []
+        word_cache = self.word_cache
         for word in tokens:
             # eliminate double spaces
             if not word:
                 continue
+            if not dropout and word in word_cache:
+                output.extend(word_cache[word])
+                continue
             new_word = [out for segment in self._isolate_glossaries(word)
                         for out in encode(segment,
                                           self.bpe_codes,
@@ -102,9 +111,11 @@ class BPE(object):
                                           self.glossaries_regex,
                                           dropout)]
 
-            for item in new_word[:-1]:
-                output.append(item + self.separator)
-            output.append(new_word[-1])
+            units = [item + self.separator for item in new_word[:-1]]
+            units.append(new_word[-1])
+            if not dropout:
+                word_cache[word] = units
+            output.extend(units)
 
         return output
 
@@ -115,6 +126,85 @@ class BPE(object):
                                  for out_segments in isolate_glossary(segment, gloss)]
         return word_segments
 
+    def warm_cache(self, words, num_workers=1, chunk_size=10000):
+        """segment the words missing from word_cache, in num_workers processes, and add them to it"""
+        words = [word for word in words if word and word not in self.word_cache]
+        chunks = [words[i:i + chunk_size] for i in range(0, len(words), chunk_size)]
+        if num_workers > 1 and len(chunks) > 1:
+            with multiprocessing.Pool(num_workers, _init_worker, (self,)) as pool:
+                for word_cache in pool.imap_unordered(_segment_words, chunks):
+                    self.word_cache.update(word_cache)
+        else:
+            self.segment_tokens(words)
+
+    def process_file(self, in_file, out_file, num_workers=1, chunk_size=10000, dropout=0):
+        """segment the lines of in_file into out_file, with the same output as process_line on every line.
+
+        With num_workers > 1, word_cache is first filled with the words of in_file, then chunks of
+        chunk_size lines are segmented by num_workers processes which share it (copy-on-write after fork),
+        and written in order.
+        """
+        with io.open(out_file, 'w', encoding='utf-8', newline='') as out_f:
+            if num_workers <= 1:
+                for line in read_lines(in_file):
+                    out_f.write(self.process_line(line, dropout))
+                return
+
+            if not dropout:
+                words = set()
+                for line in read_lines(in_file):
+                    words.update(line.strip('\r\n ').split(' '))
+                self.warm_cache(words, num_workers, chunk_size)
+
+            with multiprocessing.Pool(num_workers, _init_worker, (self,)) as pool:
+                # at most 2 chunks per worker are read ahead of the writer
+                pending = deque()
+                for chunk in _chunks(read_lines(in_file), chunk_size):
+                    pending.append(pool.apply_async(_process_lines, (chunk, dropout)))
+                    if len(pending) >= 2 * num_workers:
+                        out_f.write(pending.popleft().get())
+                while pending:
+                    out_f.write(pending.popleft().get())
+
+
+# BPE of the worker processes of BPE.warm_cache and BPE.process_file
+_worker_bpe = None
+
+
+def _init_worker(bpe):
+    global _worker_bpe
+    _worker_bpe = bpe
+    # the forked workers would otherwise draw the same dropout decisions
+    random.seed()
+
+
+def _segment_words(words):
+    _worker_bpe.segment_tokens(words)
+    return dict((word, _worker_bpe.word_cache[word]) for word in words)
+
+
+def _process_lines(lines, dropout):
+    return ''.join([_worker_bpe.process_line(line, dropout) for line in lines])
+
+
+def _chunks(iterable, chunk_size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_lines(file_name):
+    """Iterate over the lines of a utf-8 file, split as codecs.open does (str.splitlines), but faster"""
+    with io.open(file_name, encoding='utf-8', newline='') as fobj:
+        for line in fobj:
+            for part in line.splitlines(True):
+                yield part
+
 def encode(orig, bpe_codes, bpe_codes_reverse, vocab, separator, version, cache, glossaries_regex=None, dropout=0):
     """Encode word based on list of BPE merge operations, which are applied consecutively
     """
@@ -0,0 +1,105 @@
+''' Timing of learn_bpe (PairQueue or max() over the pair statistics) and of the BPE application
+(line by line, or BPE.process_file with several processes).
+
+    python benchmark_bpe.py -corpus train.txt -symbols 32000 -num_workers 1,4,8
+
+Without -corpus, a synthetic corpus of -num_lines lines is generated. Each learn_bpe variant runs in
+its own process, and the codes and encoded files of the variants are compared.
+'''
+
+import os
+import sys
+import time
+import codecs
+import filecmp
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from learn_bpe import learn_bpe
+from apply_bpe import BPE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark_bpe.py')
+    parser.add_argument('-corpus', default='', help='Text file (default: a synthetic corpus)')
+    parser.add_argument('-num_lines', type=int, default=200000, help='Lines of the synthetic corpus')
+    parser.add_argument('-num_words', type=int, default=100000, help='Word types of the synthetic corpus')
+    parser.add_argument('-symbols', type=int, default=10000, help='Number of merge operations')
+    parser.add_argument('-min_frequency', type=int, default=2)
+    parser.add_argument('-num_workers', default='1,2,4', help='comma separated numbers of processes')
+    parser.add_argument('-chunk_size', type=int, default=10000, help='Lines per chunk')
+    parser.add_argument('-mode', default='', choices=['', 'queue', 'scan'], help=argparse.SUPPRESS)
+    parser.add_argument('-codes', default='', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def synthetic_corpus(path, num_lines, num_words, seed=0):
+    ''' Sentences of 20 words; the words are made of syllables, with zipfian frequencies. '''
+    rng = np.random.RandomState(seed)
+    onsets = list('bcdfghjklmnprstvwz') + ['ch', 'sh', 'th', 'st', 'tr', 'pr', 'gr', 'bl']
+    syllables = [c + v for c in onsets for v in ['a', 'e', 'i', 'o', 'u', 'ie', 'ei', 'au', 'ou', 'ee']]
+    syllable_p = 1.0 / np.arange(1, len(syllables) + 1) ** 0.9
+    syllable_p /= syllable_p.sum()
+    words = set()
+    while len(words) < num_words:
+        words.add(''.join(syllables[i] for i in rng.choice(len(syllables), rng.randint(1, 5), p=syllable_p)))
+    words = sorted(words)
+    rng.shuffle(words)
+    word_p = 1.0 / np.arange(1, num_words + 1) ** 1.05
+    word_p /= word_p.sum()
+    with codecs.open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, num_lines, 1000):
+            for row in rng.choice(num_words, size=(min(1000, num_lines - start), 20), p=word_p):
+                f.write(' '.join(words[i] for i in row) + '\n')
+
+
+def run_learn_bpe(opt):
+    start = time.time()
+    learn_bpe([opt.corpus], opt.codes, opt.symbols, opt.min_frequency, use_queue=opt.mode == 'queue')
+    sys.stderr.write('\n')
+    print('learn_bpe, {:5s}          {:8.1f}s'.format(opt.mode, time.time() - start), flush=True)
+
+
+def main():
+    opt = parse_args()
+    if opt.mode:
+        run_learn_bpe(opt)
+        return
+
+    tmp = tempfile.mkdtemp()
+    if not opt.corpus:
+        opt.corpus = os.path.join(tmp, 'corpus.txt')
+        synthetic_corpus(opt.corpus, opt.num_lines, opt.num_words)
+
+    codes = {}
+    for mode in ('scan', 'queue'):
+        codes[mode] = os.path.join(tmp, 'codes.' + mode)
+        subprocess.run([sys.executable, __file__, '-mode', mode, '-codes', codes[mode]] + sys.argv[1:]
+                       + ['-corpus', opt.corpus], check=True, stderr=subprocess.DEVNULL)
+    print('same merges: {}'.format(filecmp.cmp(codes['scan'], codes['queue'], shallow=False)))
+
+    with codecs.open(codes['queue'], encoding='utf-8') as f:
+        bpe = BPE(f)
+    ref_file = os.path.join(tmp, 'encoded.ref')
+    start = time.time()
+    with codecs.open(opt.corpus, encoding='utf-8') as in_f:
+        with codecs.open(ref_file, 'w', encoding='utf-8') as out_f:
+            for line in in_f:
+                out_f.write(bpe.process_line(line))
+    print('process_line                {:8.1f}s'.format(time.time() - start))
+
+    for num_workers in map(int, opt.num_workers.split(',')):
+        with codecs.open(codes['queue'], encoding='utf-8') as f:
+            bpe = BPE(f)
+        out_file = os.path.join(tmp, 'encoded.{}'.format(num_workers))
+        start = time.time()
+        bpe.process_file(opt.corpus, out_file, num_workers=num_workers, chunk_size=opt.chunk_size)
+        print('process_file, {:2d} workers   {:8.1f}s  same output: {}'.format(
+            num_workers, time.time() - start, filecmp.cmp(ref_file, out_file, shallow=False)))
+
+
+if __name__ == '__main__':
+    main()
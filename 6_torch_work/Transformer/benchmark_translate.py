@@ -0,0 +1,99 @@
+''' CPU sentences/sec of translate_sentence (one sentence at a time, full prefix re-decoded every step)
+and translate_batch (batched beam search with a key/value cache).
+
+    python benchmark_translate.py -num_sentences 200 -beam_size 5 -batch_sizes 1,8,32
+
+The model is trained for -train_steps on a synthetic task (copy the source sentence) so that the
+beams emit eos after a realistic number of steps, then both decoders translate the same sentences.
+'''
+
+import time
+import argparse
+
+import torch
+import torch.nn.functional as F
+
+from transformer.Models import Transformer
+from transformer.Translator import Translator
+
+PAD, BOS, EOS = 0, 1, 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark_translate.py')
+    parser.add_argument('-num_sentences', type=int, default=200)
+    parser.add_argument('-min_len', type=int, default=5)
+    parser.add_argument('-max_len', type=int, default=30)
+    parser.add_argument('-vocab_size', type=int, default=100)
+    parser.add_argument('-beam_size', type=int, default=5)
+    parser.add_argument('-max_seq_len', type=int, default=100)
+    parser.add_argument('-batch_sizes', default='1,8,32', help='comma separated batch sizes of translate_batch')
+    parser.add_argument('-d_model', type=int, default=256)
+    parser.add_argument('-d_inner_hid', type=int, default=1024)
+    parser.add_argument('-n_layers', type=int, default=3)
+    parser.add_argument('-n_head', type=int, default=8)
+    parser.add_argument('-train_steps', type=int, default=600)
+    parser.add_argument('-seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def random_sentences(opt, num_sentences):
+    lens = torch.randint(opt.min_len, opt.max_len + 1, (num_sentences,)).tolist()
+    return [torch.randint(EOS + 1, opt.vocab_size, (l,)).tolist() for l in lens]
+
+
+def pad(seqs, pad_idx=PAD):
+    max_len = max(len(s) for s in seqs)
+    return torch.LongTensor([s + [pad_idx] * (max_len - len(s)) for s in seqs])
+
+
+def train(model, opt):
+    optimizer = torch.optim.Adam(model.parameters(), lr=5e-4, betas=(0.9, 0.98), eps=1e-09)
+    model.train()
+    for step in range(opt.train_steps):
+        src = random_sentences(opt, 32)
+        trg = pad([[BOS] + s + [EOS] for s in src])
+        pred = model(pad(src), trg[:, :-1])
+        loss = F.cross_entropy(pred, trg[:, 1:].reshape(-1), ignore_index=PAD)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        if (step + 1) % 100 == 0:
+            print('[Info] train step {}, loss {:.3f}'.format(step + 1, loss.item()))
+    model.eval()
+
+
+def main():
+    opt = parse_args()
+    torch.manual_seed(opt.seed)
+    model = Transformer(
+        opt.vocab_size, opt.vocab_size, PAD, PAD,
+        d_k=opt.d_model // opt.n_head, d_v=opt.d_model // opt.n_head,
+        d_model=opt.d_model, d_word_vec=opt.d_model, d_inner=opt.d_inner_hid,
+        n_layers=opt.n_layers, n_head=opt.n_head, dropout=0.1, scale_emb_or_prj='emb')
+    train(model, opt)
+    translator = Translator(model, opt.beam_size, opt.max_seq_len, PAD, PAD, BOS, EOS)
+
+    sentences = random_sentences(opt, opt.num_sentences)
+    start = time.time()
+    ref = [translator.translate_sentence(torch.LongTensor([s])) for s in sentences]
+    elapsed = time.time() - start
+    print('translate_sentence          {:8.2f} sentences/sec  (mean output length {:.1f})'.format(
+        len(sentences) / elapsed, sum(len(r) for r in ref) / len(ref)))
+
+    order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+    for batch_size in map(int, opt.batch_sizes.split(',')):
+        out = [None] * len(sentences)
+        start = time.time()
+        for i in range(0, len(order), batch_size):
+            batch_idx = order[i:i + batch_size]
+            for j, pred in zip(batch_idx, translator.translate_batch(pad([sentences[j] for j in batch_idx]))):
+                out[j] = pred
+        elapsed = time.time() - start
+        same = sum(a == b for a, b in zip(ref, out)) / len(ref)
+        print('translate_batch, batch {:3d} {:8.2f} sentences/sec  same output {:.4f}'.format(
+            batch_size, len(sentences) / elapsed, same))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,7 @@ import inspect
 import codecs
 import re
 import copy
+import heapq
 import warnings
 from collections import defaultdict, Counter
 
@@ -44,11 +45,12 @@ def update_vocabulary(vocab, file_name, is_dict=False):
     return vocab
 
 
-def update_pair_statistics(pair, changed, stats, indices):
+def update_pair_statistics(pair, changed, stats, indices, updated_pairs=None):
     """Minimally update the indices and frequency of symbol pairs
 
     if we merge a pair of symbols, only pairs that overlap with occurrences
     of this pair are affected, and need to be updated.
+    The pairs whose frequency changed are added to the set updated_pairs, if given.
     """
     stats[pair] = 0
     indices[pair] = defaultdict(int)
@@ -71,6 +73,8 @@ def update_pair_statistics(pair, changed, stats, indices):
                     prev = old_word[i-1:i+1]
                     stats[prev] -= freq
                     indices[prev][j] -= 1
+                    if updated_pairs is not None:
+                        updated_pairs.add(prev)
                 if i < len(old_word)-2:
                     # assuming a symbol sequence "A B C B", if "B C" is merged, reduce the frequency of "C B".
                     # however, skip this if the sequence is A B C B C, because the frequency of "C B" will be reduced by the previous code block
@@ -78,6 +82,8 @@ def update_pair_statistics(pair, changed, stats, indices):
                         nex = old_word[i+1:i+3]
                         stats[nex] -= freq
                         indices[nex][j] -= 1
+                        if updated_pairs is not None:
+                            updated_pairs.add(nex)
                 i += 2
             else:
                 i += 1
@@ -94,12 +100,16 @@ def update_pair_statistics(pair, changed, stats, indices):
                 prev = word[i-1:i+1]
                 stats[prev] += freq
                 indices[prev][j] += 1
+                if updated_pairs is not None:
+                    updated_pairs.add(prev)
             # assuming a symbol sequence "A BC B", if "B C" is merged, increase the frequency of "BC B"
             # however, if the sequence is A BC BC, skip this step because the count of "BC BC" will be incremented by the previous code block
             if i < len(word)-1 and word[i+1] != new_pair:
                 nex = word[i:i+2]
                 stats[nex] += freq
                 indices[nex][j] += 1
+                if updated_pairs is not None:
+                    updated_pairs.add(nex)
             i += 1
 
 
@@ -162,8 +172,59 @@ def prune_stats(stats, big_stats, threshold):
                 big_stats[item] = freq
 
 
-def learn_bpe(infile_names, outfile_name, num_symbols, min_frequency=2, verbose=False, is_dict=False, total_symbols=False):
+class _Descending(object):
+    """Heap key of a symbol pair, the greater pair comes first"""
+    __slots__ = ('pair',)
+
+    def __init__(self, pair):
+        self.pair = pair
+
+    def __lt__(self, other):
+        return self.pair > other.pair
+
+    def __eq__(self, other):
+        return self.pair == other.pair
+
+
+class PairQueue(object):
+    """Priority queue over the symbol pairs of stats, giving the same pair as max(stats, key=lambda x: (stats[x], x))
+
+    A pair is pushed again whenever its frequency changes (see push); outdated entries,
+    and the entries of the pairs pruned from stats, are dropped when they reach the top.
+    """
+
+    def __init__(self, stats):
+        self.reset(stats)
+
+    def reset(self, stats):
+        self.stats = stats
+        self.heap = [(-freq, _Descending(pair)) for pair, freq in stats.items()]
+        heapq.heapify(self.heap)
+
+    def push(self, pairs):
+        stats, heap = self.stats, self.heap
+        for pair in pairs:
+            heapq.heappush(heap, (-stats[pair], _Descending(pair)))
+        # drop the outdated entries once they outnumber the pairs
+        if len(heap) > 2 * len(stats) + 10000:
+            self.reset(stats)
+
+    def max(self):
+        stats, heap = self.stats, self.heap
+        while heap:
+            freq, key = heap[0]
+            if stats.get(key.pair) == -freq:
+                return key.pair
+            heapq.heappop(heap)
+        return None
+
+
+def learn_bpe(infile_names, outfile_name, num_symbols, min_frequency=2, verbose=False, is_dict=False, total_symbols=False,
+              use_queue=True):
     """Learn num_symbols BPE operations from vocabulary, and write to outfile.
+
+    With use_queue, the most frequent pair is read from a PairQueue instead of scanning stats at every merge;
+    the merges are the same.
     """
     sys.stderr = codecs.getwriter('UTF-8')(sys.stderr.buffer)
     sys.stdout = codecs.getwriter('UTF-8')(sys.stdout.buffer)
@@ -202,9 +263,11 @@ def learn_bpe(infile_names, outfile_name, num_symbols, min_frequency=2, verbose=
         outfile.write('#version: 0.2\n')
         # threshold is inspired by Zipfian assumption, but should only affect speed
         threshold = max(stats.values()) / 10
+        queue = PairQueue(stats) if use_queue else None
+        updated_pairs = set() if use_queue else None
         for i in range(num_symbols):
             if stats:
-                most_frequent = max(stats, key=lambda x: (stats[x], x))
+                most_frequent = queue.max() if use_queue else max(stats, key=lambda x: (stats[x], x))
 
             # we probably missed the best pair because of pruning; go back to full statistics
             if not stats or (i and stats[most_frequent] < threshold):
@@ -214,6 +277,8 @@ def learn_bpe(infile_names, outfile_name, num_symbols, min_frequency=2, verbose=
                 # threshold is inspired by Zipfian assumption, but should only affect speed
                 threshold = stats[most_frequent] * i/(i+10000.0)
                 prune_stats(stats, big_stats, threshold)
+                if use_queue:
+                    queue.reset(stats)
 
             if stats[most_frequent] < min_frequency:
                 sys.stderr.write(f'no pair has frequency >= {min_frequency}. Stopping\n')
@@ -224,8 +289,12 @@ def learn_bpe(infile_names, outfile_name, num_symbols, min_frequency=2, verbose=
                     i, most_frequent[0], most_frequent[1], stats[most_frequent]))
             outfile.write('{0} {1}\n'.format(*most_frequent))
             changes = replace_pair(most_frequent, sorted_vocab, indices)
-            update_pair_statistics(most_frequent, changes, stats, indices)
+            update_pair_statistics(most_frequent, changes, stats, indices, updated_pairs)
             stats[most_frequent] = 0
+            if use_queue:
+                updated_pairs.add(most_frequent)
+                queue.push(updated_pairs)
+                updated_pairs.clear()
             if not i % 100:
                 prune_stats(stats, big_stats, threshold)
 
@@ -135,25 +135,22 @@ def compile_files(raw_dir, raw_files, prefix):
     return src_fpath, trg_fpath
 
 
-def encode_file(bpe, in_file, out_file):
+def encode_file(bpe, in_file, out_file, num_workers=1):
     sys.stderr.write(f"Read raw content from {in_file} and \n"\
             f"Write encoded content to {out_file}\n")
-    
-    with codecs.open(in_file, encoding='utf-8') as in_f:
-        with codecs.open(out_file, 'w', encoding='utf-8') as out_f:
-            for line in in_f:
-                out_f.write(bpe.process_line(line))
 
+    bpe.process_file(in_file, out_file, num_workers=num_workers)
 
-def encode_files(bpe, src_in_file, trg_in_file, data_dir, prefix):
+
+def encode_files(bpe, src_in_file, trg_in_file, data_dir, prefix, num_workers=1):
     src_out_file = os.path.join(data_dir, f"{prefix}.src")
     trg_out_file = os.path.join(data_dir, f"{prefix}.trg")
 
     if os.path.isfile(src_out_file) and os.path.isfile(trg_out_file):
         sys.stderr.write(f"Encoded files found, skip the encoding process ...\n")
 
-    encode_file(bpe, src_in_file, src_out_file)
-    encode_file(bpe, trg_in_file, trg_out_file)
+    encode_file(bpe, src_in_file, src_out_file, num_workers)
+    encode_file(bpe, trg_in_file, trg_out_file, num_workers)
     return src_out_file, trg_out_file
 
 
@@ -175,6 +172,8 @@ def main():
         '--separator', type=str, default='@@', metavar='STR',
         help="Separator between non-final subword units (default: '%(default)s'))")
     parser.add_argument('--total-symbols', '-t', action="store_true")
+    parser.add_argument('-num_workers', type=int, default=os.cpu_count(),
+        help="Processes applying the BPE codes (default: the number of CPUs)")
     opt = parser.parse_args()
 
     # Create folder if needed.
@@ -203,9 +202,9 @@ def main():
         bpe = BPE(codes, separator=opt.separator)
 
     sys.stderr.write(f"Encoding ...\n")
-    encode_files(bpe, train_src, train_trg, opt.data_dir, opt.prefix + '-train')
-    encode_files(bpe, val_src, val_trg, opt.data_dir, opt.prefix + '-val')
-    encode_files(bpe, test_src, test_trg, opt.data_dir, opt.prefix + '-test')
+    encode_files(bpe, train_src, train_trg, opt.data_dir, opt.prefix + '-train', opt.num_workers)
+    encode_files(bpe, val_src, val_trg, opt.data_dir, opt.prefix + '-val', opt.num_workers)
+    encode_files(bpe, test_src, test_trg, opt.data_dir, opt.prefix + '-test', opt.num_workers)
     sys.stderr.write(f"Done.\n")
 
 
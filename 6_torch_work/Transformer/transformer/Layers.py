@@ -50,14 +50,22 @@ class DecoderLayer(nn.Module):
                 dec_input,
                 enc_output,
                 slf_attn_mask=None,
-                dec_enc_attn_mask=None):
+                dec_enc_attn_mask=None,
+                layer_cache=None):
+        # layer_cache: {'slf_attn': {}, 'enc_attn': {}} for incremental decoding
+        slf_cache = enc_cache = None
+        if layer_cache is not None:
+            slf_cache, enc_cache = layer_cache['slf_attn'], layer_cache['enc_attn']
         dec_output, dec_slf_attn = self.slf_attn(dec_input,
                                                  dec_input,
                                                  dec_input,
-                                                 mask=slf_attn_mask)
+                                                 mask=slf_attn_mask,
+                                                 cache=slf_cache)
         dec_output, dec_enc_attn = self.enc_attn(dec_output,
                                                  enc_output,
                                                  enc_output,
-                                                 mask=dec_enc_attn_mask)
+                                                 mask=dec_enc_attn_mask,
+                                                 cache=enc_cache,
+                                                 static_kv=True)
         dec_output = self.pos_ffn(dec_output)
         return dec_output, dec_slf_attn, dec_enc_attn
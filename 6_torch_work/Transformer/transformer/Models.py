@@ -41,8 +41,8 @@ class PositionalEncoding(nn.Module):
 
         return torch.FloatTensor(sinusoid_table).unsqueeze(0)
 
-    def forward(self, x):
-        return x + self.pos_table[:, :x.size(1)].clone().detach()
+    def forward(self, x, start_pos=0):
+        return x + self.pos_table[:, start_pos:start_pos + x.size(1)].clone().detach()
 
 
 class Encoder(nn.Module):
@@ -103,7 +103,15 @@ class Decoder(nn.Module):
         self.scale_emb = scale_emb
         self.d_model = d_model
 
-    def forward(self, trg_seq, trg_mask, enc_output, src_mask, return_attns=False):
+    def init_cache(self):
+        ''' Empty per-layer key/value cache for incremental decoding. '''
+        return [{'slf_attn': {}, 'enc_attn': {}} for _ in self.layer_stack]
+
+    def forward(self, trg_seq, trg_mask, enc_output, src_mask, return_attns=False, cache=None, start_pos=0):
+        '''
+        For incremental decoding, cache is the list returned by init_cache, trg_seq only holds the
+        positions from start_pos on, and the previous positions are read from the cache.
+        '''
 
         dec_slf_attn_list, dec_enc_attn_list = [], []
 
@@ -111,12 +119,13 @@ class Decoder(nn.Module):
         dec_output = self.trg_word_emb(trg_seq)
         if self.scale_emb:
             dec_output *= self.d_model ** 0.5
-        dec_output = self.dropout(self.position_enc(dec_output))
+        dec_output = self.dropout(self.position_enc(dec_output, start_pos))
         dec_output = self.layer_norm(dec_output)
 
-        for dec_layer in self.layer_stack:
+        for i, dec_layer in enumerate(self.layer_stack):
             dec_output, dec_slf_attn, dec_enc_attn = dec_layer(
-                dec_output, enc_output, slf_attn_mask=trg_mask, dec_enc_attn_mask=src_mask)
+                dec_output, enc_output, slf_attn_mask=trg_mask, dec_enc_attn_mask=src_mask,
+                layer_cache=None if cache is None else cache[i])
             dec_slf_attn_list += [dec_slf_attn] if return_attns else []
             dec_enc_attn_list += [dec_enc_attn] if return_attns else []
 
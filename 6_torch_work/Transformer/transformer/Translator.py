@@ -112,3 +112,98 @@ class Translator(nn.Module):
                     ans_idx = ans_idx.item()
                     break
         return gen_seq[ans_idx][:seq_lens[ans_idx]].tolist()
+
+
+    def _model_decode_step(self, trg_seq, enc_output, src_mask, cache, start_pos):
+        # Only the newest token: the previous ones are in the key/value cache, so no subsequent mask.
+        dec_output, *_ = self.model.decoder(
+            trg_seq, None, enc_output, src_mask, cache=cache, start_pos=start_pos)
+        return F.softmax(self.model.trg_word_prj(dec_output), dim=-1)
+
+
+    @staticmethod
+    def _select_cache(cache, idx, static_kv=False):
+        ''' Keep the rows idx of the self-attention (and with static_kv, of the encoder attention) cache. '''
+        names = ('slf_attn', 'enc_attn') if static_kv else ('slf_attn',)
+        for layer_cache in cache:
+            for name in names:
+                for key in ('k', 'v'):
+                    layer_cache[name][key] = layer_cache[name][key].index_select(0, idx)
+
+
+    def translate_batch(self, src_seq):
+        '''
+        Beam search of a batch of sentences, padded with src_pad_idx, with the same result as
+        translate_sentence on every sentence. Each step decodes the newest token of every beam
+        against the cached keys/values of the previous ones, and a sentence leaves the batch once
+        all its beams contain the eos.
+        '''
+        src_pad_idx, trg_eos_idx = self.src_pad_idx, self.trg_eos_idx
+        max_seq_len, beam_size, alpha = self.max_seq_len, self.beam_size, self.alpha
+        device = src_seq.device
+        sz_b = src_seq.size(0)
+        results = [None] * sz_b
+
+        with torch.no_grad():
+            src_mask = get_pad_mask(src_seq, src_pad_idx)
+            enc_output, *_ = self.model.encoder(src_seq, src_mask)
+
+            # -- the first step decodes the bos once per sentence
+            cache = self.model.decoder.init_cache()
+            dec_output = self._model_decode_step(
+                self.init_seq.expand(sz_b, 1), enc_output, src_mask, cache, 0)
+            best_k_probs, best_k_idx = dec_output[:, -1, :].topk(beam_size)
+            scores = torch.log(best_k_probs)                                    # b x k
+            gen_seq = self.blank_seqs.unsqueeze(0).repeat(sz_b, 1, 1)           # b x k x len
+            gen_seq[:, :, 1] = best_k_idx
+
+            # -- every beam is a row: b*k x ...
+            beam_rows = torch.arange(sz_b, device=device).repeat_interleave(beam_size)
+            self._select_cache(cache, beam_rows, static_kv=True)
+            enc_output, src_mask = enc_output[beam_rows], src_mask[beam_rows]
+            sent_idx = torch.arange(sz_b, device=device)                         # original index of the rows
+
+            for step in range(2, max_seq_len):    # decode up to max length
+                n_sent = sent_idx.size(0)
+                dec_output = self._model_decode_step(
+                    gen_seq[:, :, step - 1].reshape(-1, 1), enc_output, src_mask, cache, step - 1)
+
+                # Get k candidates for each beam, k^2 candidates per sentence, and keep the best k.
+                best_k2_probs, best_k2_idx = dec_output[:, -1, :].topk(beam_size)
+                best_k2_idx = best_k2_idx.view(n_sent, -1)
+                scores = torch.log(best_k2_probs).view(n_sent, beam_size, -1) + scores.unsqueeze(2)
+                scores, best_k_idx_in_k2 = scores.view(n_sent, -1).topk(beam_size)
+                best_k_r_idxs = best_k_idx_in_k2 // beam_size
+                best_k_idx = best_k2_idx.gather(1, best_k_idx_in_k2)
+
+                gen_seq = gen_seq.gather(1, best_k_r_idxs.unsqueeze(2).expand_as(gen_seq))
+                gen_seq[:, :, step] = best_k_idx
+                offsets = torch.arange(n_sent, device=device).unsqueeze(1) * beam_size
+                self._select_cache(cache, (best_k_r_idxs + offsets).view(-1))
+
+                # -- the sentences whose beams all contain an eos are done
+                eos_locs = gen_seq == trg_eos_idx
+                seq_lens, _ = self.len_map.masked_fill(~eos_locs, max_seq_len).min(2)
+                done = eos_locs.any(2).all(1)
+                if done.any():
+                    _, ans_idx = scores.div(seq_lens.float() ** alpha).max(1)
+                    for i in done.nonzero().view(-1).tolist():
+                        best = ans_idx[i].item()
+                        results[sent_idx[i].item()] = gen_seq[i, best, :seq_lens[i, best]].tolist()
+
+                    # -- retire them from the batch
+                    keep = (~done).nonzero().view(-1)
+                    if keep.numel() == 0:
+                        break
+                    keep_rows = (keep.unsqueeze(1) * beam_size + torch.arange(beam_size, device=device)).view(-1)
+                    gen_seq, scores, sent_idx = gen_seq[keep], scores[keep], sent_idx[keep]
+                    enc_output, src_mask = enc_output[keep_rows], src_mask[keep_rows]
+                    self._select_cache(cache, keep_rows, static_kv=True)
+
+            # -- the unfinished sentences keep their first beam
+            eos_locs = gen_seq == trg_eos_idx
+            seq_lens, _ = self.len_map.masked_fill(~eos_locs, max_seq_len).min(2)
+            for i, j in enumerate(sent_idx.tolist()):
+                if results[j] is None:
+                    results[j] = gen_seq[i, 0, :seq_lens[i, 0]].tolist()
+        return results
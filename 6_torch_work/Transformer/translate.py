@@ -60,9 +60,8 @@ def main():
     #                    help='Source sequence to decode (one line per sequence)')
     #parser.add_argument('-vocab', required=True,
     #                    help='Source sequence to decode (one line per sequence)')
-    # TODO: Batch translation
-    #parser.add_argument('-batch_size', type=int, default=30,
-    #                    help='Batch size')
+    parser.add_argument('-batch_size', type=int, default=30,
+                        help='Number of sentences decoded together')
     #parser.add_argument('-n_best', type=int, default=1,
     #                    help="""If verbose is set, will output the n_best
     #                    decoded sentences""")
@@ -90,14 +89,22 @@ def main():
         trg_eos_idx=opt.trg_eos_idx).to(device)
 
     unk_idx = SRC.vocab.stoi[SRC.unk_token]
+    src_seqs = [[SRC.vocab.stoi.get(word, unk_idx) for word in example.src] for example in test_loader]
+    # Batches of sentences of similar lengths, to limit the padding.
+    order = sorted(range(len(src_seqs)), key=lambda i: len(src_seqs[i]))
+    pred_seqs = [None] * len(src_seqs)
+    for start in tqdm(range(0, len(order), opt.batch_size), mininterval=2, desc='  - (Test)', leave=False):
+        batch_idx = order[start:start + opt.batch_size]
+        max_len = max(len(src_seqs[i]) for i in batch_idx)
+        src_seq = torch.LongTensor(
+            [src_seqs[i] + [opt.src_pad_idx] * (max_len - len(src_seqs[i])) for i in batch_idx]).to(device)
+        for i, pred_seq in zip(batch_idx, translator.translate_batch(src_seq)):
+            pred_seqs[i] = pred_seq
+
     with open(opt.output, 'w') as f:
-        for example in tqdm(test_loader, mininterval=2, desc='  - (Test)', leave=False):
-            #print(' '.join(example.src))
-            src_seq = [SRC.vocab.stoi.get(word, unk_idx) for word in example.src]
-            pred_seq = translator.translate_sentence(torch.LongTensor([src_seq]).to(device))
+        for pred_seq in pred_seqs:
             pred_line = ' '.join(TRG.vocab.itos[idx] for idx in pred_seq)
             pred_line = pred_line.replace(Constants.BOS_WORD, '').replace(Constants.EOS_WORD, '')
-            #print(pred_line)
             f.write(pred_line.strip() + '\n')
 
     print('[Info] Finished.')
@@ -0,0 +1,108 @@
+"""Benchmark of eval_linear_probe.py against the liblinear training of eval_svm_feature_perf.py
+
+Writes synthetic features in the layout of eval_svm_feature_extract.py (one shard per replica) and reports the
+accuracy, wall time and peak memory of each solver, each run in its own process:
+
+    python benchmark_linear_probe.py --num_train 20000 --dim 256 --num_classes 50 --costs 0.01,0.1,1
+    python benchmark_linear_probe.py --num_train 1000000 --dim 2048 --num_classes 400 --skip_liblinear
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('linear_probe_benchmark')
+    parser.add_argument('--num_train', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--num_classes', type=int, default=50)
+    parser.add_argument('--num_replica', type=int, default=4)
+    parser.add_argument('--noise', type=float, default=2.5, help='std of the noise around the class centers')
+    parser.add_argument('--costs', type=str, default='0.01,0.1,1')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--skip_liblinear', action='store_true')
+    return parser.parse_args()
+
+
+def synthetic_features(output_dir, split, num_videos, args, seed):
+    """ Rectified features around a center per class, written shard by shard """
+    centers = np.maximum(np.random.RandomState(0).randn(args.num_classes, args.dim), 0) * 0.6
+    rng = np.random.RandomState(seed)
+    np.save(os.path.join(output_dir, 'vid_num_{}.npy'.format(split)), np.array([num_videos]))
+    per_replica = -(-num_videos // args.num_replica)
+    for i in range(args.num_replica):
+        cls = rng.randint(0, args.num_classes, per_replica).astype(np.int32)
+        feat = np.lib.format.open_memmap(os.path.join(output_dir, 'feature_{}_{}.npy'.format(split, i)), 'w+',
+                                         np.float32, (per_replica, args.dim))
+        for j in range(0, per_replica, 10000):
+            block_cls = cls[j:j + 10000]
+            noise = rng.randn(len(block_cls), args.dim) * args.noise
+            feat[j:j + 10000] = np.maximum(centers[block_cls] + noise, 0)
+        feat.flush()
+        np.save(os.path.join(output_dir, 'feature_{}_cls_{}.npy'.format(split, i)), cls)
+
+
+def run_linear_probe(output_dir, args):
+    import torch
+    from utils.feature_shards import load_replica_features
+    from utils.linear_probe import LinearProbe, peak_memory_mb
+    torch.set_num_threads(args.threads)
+    start_time = time.time()
+    train_shards = load_replica_features(output_dir, 'train', args.num_replica)
+    val_shards = load_replica_features(output_dir, 'val', args.num_replica)
+    costs = [float(c) for c in args.costs.split(',')]
+    probe = LinearProbe(args.dim, args.num_classes, costs)
+    probe.fit(train_shards, epochs=args.epochs, log=lambda info: None)
+    return probe.accuracy(val_shards), time.time() - start_time, peak_memory_mb()
+
+
+def run_liblinear(output_dir, args, cost):
+    """ eval_svm_feature_perf.py --primal for one cost """
+    import liblinear.liblinearutil as liblinearsvm
+    from utils.linear_probe import peak_memory_mb
+    start_time = time.time()
+    split_features = []
+    for split in ['train', 'val']:
+        feat = np.concatenate([np.load(os.path.join(output_dir, 'feature_{}_{}.npy'.format(split, i)))
+                               for i in range(args.num_replica)])
+        cls = np.concatenate([np.load(os.path.join(output_dir, 'feature_{}_cls_{}.npy'.format(split, i)))
+                              for i in range(args.num_replica)])
+        split_features.append((cls, feat))
+    (train_cls, train_feat), (val_cls, val_feat) = split_features
+    svm_problem = liblinearsvm.problem(train_cls, train_feat)
+    svm_parameter = liblinearsvm.parameter('-s 2 -n {} -c {} -q'.format(args.threads, cost))
+    svm_model = liblinearsvm.train(svm_problem, svm_parameter)
+    pd_label, pd_acc, pd_val = liblinearsvm.predict(val_cls, val_feat, svm_model, '-q')
+    return pd_acc[0], time.time() - start_time, peak_memory_mb()
+
+
+def main():
+    args = parse_args()
+    output_dir = tempfile.mkdtemp()
+    synthetic_features(output_dir, 'train', args.num_train, args, seed=1)
+    synthetic_features(output_dir, 'val', args.num_train // 5, args, seed=2)
+    print('{} train and {} val features of dim {}, {} classes'.format(
+        args.num_train, args.num_train // 5, args.dim, args.num_classes))
+
+    with Pool(1) as pool:
+        accuracy, wall_time, peak_memory = pool.apply(run_linear_probe, (output_dir, args))
+    for cost in accuracy:
+        print('linear probe  cost={}: accuracy = {:.2f}%'.format(cost, accuracy[cost]))
+    print('linear probe  all costs: wall time {:.1f}s, peak memory {:.0f}MB'.format(wall_time, peak_memory))
+
+    if not args.skip_liblinear:
+        for cost in [float(c) for c in args.costs.split(',')]:
+            with Pool(1) as pool:
+                accuracy, wall_time, peak_memory = pool.apply(run_liblinear, (output_dir, args, cost))
+            print('liblinear     cost={}: accuracy = {:.2f}%, wall time {:.1f}s, peak memory {:.0f}MB'.format(
+                cost, accuracy, wall_time, peak_memory))
+
+
+if __name__ == '__main__':
+    main()
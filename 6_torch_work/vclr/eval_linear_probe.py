@@ -0,0 +1,66 @@
+"""The functions for VCLR linear evaluation (train a linear classifier without liblinear)
+
+Reads the features saved by eval_svm_feature_extract.py as eval_svm_feature_perf.py does, but streams the
+memory-mapped shards of the replicas instead of copying them into a liblinear problem, and trains the
+classifiers of several costs at once (utils/linear_probe.py, the objective of liblinear -s 2).
+Code borrowed from SeCo (SeCo-Sequence-Contrastive-Learning/eval_linear_probe.py).
+
+MIT License
+Copyright (c) 2020 YihengZhang-CV
+"""
+
+import numpy as np
+import argparse
+import os
+import time
+
+import torch
+
+from utils.feature_shards import load_replica_features
+from utils.linear_probe import LinearProbe, peak_memory_mb
+
+
+def main():
+    parser = argparse.ArgumentParser('linear_probe')
+    parser.add_argument('--output-dir', type=str)
+    parser.add_argument('--trainsplit', type=str, required=True)
+    parser.add_argument('--valsplit', type=str, required=True)
+    parser.add_argument('--num_replica', type=int, default=8)
+    parser.add_argument('--costs', type=str, default='0.01,0.1,1', help='comma separated costs, as -c of liblinear')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--lr', type=float, default=1e-2)
+    parser.add_argument('--chunk-size', type=int, default=65536, help='samples read from a shard at once')
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    start_time = time.time()
+    train_shards = load_replica_features(args.output_dir, args.trainsplit, args.num_replica)
+    val_shards = load_replica_features(args.output_dir, args.valsplit, args.num_replica)
+    dim = train_shards[0][0].shape[1]
+    num_classes = int(max(np.max(l) for l in train_shards[1] + val_shards[1])) + 1
+    print('feat_train: {}'.format((sum(len(f) for f in train_shards[0]), dim)))
+    print('feat_val: {}'.format((sum(len(f) for f in val_shards[0]), dim)))
+
+    costs = [float(c) for c in args.costs.split(',')]
+    print('L2-regularized L2-loss linear classification (mini-batch), costs={}'.format(costs))
+    probe = LinearProbe(dim, num_classes, costs)
+    probe.fit(train_shards, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr, chunk_size=args.chunk_size)
+    print('eval')
+    accuracy = probe.accuracy(val_shards, chunk_size=args.chunk_size)
+    wall_time = time.time() - start_time
+
+    weights = probe.weight.detach().numpy()
+    for i, cost in enumerate(costs):
+        filename = 'linear_probe_c{}'.format(cost)
+        np.save(os.path.join(args.output_dir, filename + '.npy'), weights[i])
+        with open(os.path.join(args.output_dir, filename + '.txt'), 'w') as f:
+            f.write('{}'.format(accuracy[cost]))
+        print('cost={}: accuracy = {:.2f}%'.format(cost, accuracy[cost]))
+    print('wall time {:.1f}s, peak memory {:.0f}MB'.format(wall_time, peak_memory_mb()))
+    print('Done')
+
+
+if __name__ == '__main__':
+    main()
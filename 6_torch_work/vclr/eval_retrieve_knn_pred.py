@@ -12,7 +12,8 @@ import argparse
 import os
 import json
 
-from sklearn.metrics.pairwise import cosine_distances, euclidean_distances
+from utils.feature_shards import load_replica_features
+from utils.retrieval import nearest_neighbors, retrieval_hits
 
 
 def main():
@@ -22,6 +23,8 @@ def main():
     parser.add_argument('--valsplit', type=str, required=True)
     parser.add_argument('--num_replica', type=int, default=8)
     parser.add_argument('--data-source', type=str)
+    parser.add_argument('--test_block_size', type=int, default=1024, help='test features compared at once')
+    parser.add_argument('--train_block_size', type=int, default=8192, help='train features read at once')
     args = parser.parse_args()
 
     for i in range(args.num_replica):
@@ -32,46 +35,16 @@ def main():
         os.path.exists(os.path.join(args.output_dir, 'vid_num_{}.npy'.format(args.trainsplit)))
         os.path.exists(os.path.join(args.output_dir, 'vid_num_{}.npy'.format(args.valsplit)))
 
-    vid_num_train = np.load(os.path.join(args.output_dir, 'vid_num_{}.npy'.format(args.trainsplit)))
-    train_padding_num = vid_num_train[0] % args.num_replica
-    vid_num_val = np.load(os.path.join(args.output_dir, 'vid_num_{}.npy'.format(args.valsplit)))
-    val_padding_num = vid_num_val[0] % args.num_replica
-
-    feat_train = []
-    feat_train_cls = []
-    for i in range(args.num_replica):
-        feat_train.append(np.load(os.path.join(args.output_dir, 'feature_{}_{}.npy'.format(args.trainsplit, i))))
-        feat_train_cls.append(
-            np.load(os.path.join(args.output_dir, 'feature_{}_cls_{}.npy'.format(args.trainsplit, i))))
-    if train_padding_num > 0:
-        for i in range(train_padding_num, args.num_replica):
-            feat_train[i] = feat_train[i][:-1, :]
-            feat_train_cls[i] = feat_train_cls[i][:-1]
-    feat_train = np.concatenate(feat_train, axis=0).squeeze()
-    feat_train_cls = np.concatenate(feat_train_cls, axis=0).squeeze()
-    print('feat_train: {}'.format(feat_train.shape))
-    print('feat_train_cls: {}'.format(feat_train_cls.shape))
-
-    feat_val = []
-    feat_val_cls = []
-    for i in range(args.num_replica):
-        feat_val.append(np.load(os.path.join(args.output_dir, 'feature_{}_{}.npy'.format(args.valsplit, i))))
-        feat_val_cls.append(np.load(os.path.join(args.output_dir, 'feature_{}_cls_{}.npy'.format(args.valsplit, i))))
-    if val_padding_num > 0:
-        for i in range(val_padding_num, args.num_replica):
-            feat_val[i] = feat_val[i][:-1, :]
-            feat_val_cls[i] = feat_val_cls[i][:-1]
-    feat_val = np.concatenate(feat_val, axis=0)
-    feat_val_cls = np.concatenate(feat_val_cls, axis=0)
-    print('feat_val: {}'.format(feat_val.shape))
-    print('feat_val_cls: {}'.format(feat_val_cls.shape))
+    feat_train, feat_train_cls = load_replica_features(args.output_dir, args.trainsplit, args.num_replica)
+    feat_val, feat_val_cls = load_replica_features(args.output_dir, args.valsplit, args.num_replica)
+    print('feat_train: {}'.format((sum(len(f) for f in feat_train), feat_train[0].shape[1])))
+    print('feat_val: {}'.format((sum(len(f) for f in feat_val), feat_val[0].shape[1])))
 
     # kNN retrieval
     if args.valsplit == 'test':
         ks = [3]
     else:
         ks = [1, 5, 10, 20, 50]
-    topk_correct = {k: 0 for k in ks}
 
     class_top = 1
     if args.data_source == 'ucf':
@@ -80,44 +53,33 @@ def main():
         class_num = 51
     else:
         raise Exception('The data-source argument no assigned!')
-    class_correct = {cls: 0 for cls in range(0, class_num)}
-    class_total = {cls: 0 for cls in range(0, class_num)}
 
     X_train = feat_train
-    y_train = feat_train_cls
+    y_train = np.concatenate(feat_train_cls)
     X_test = feat_val
-    y_test = feat_val_cls
+    y_test = np.concatenate(feat_val_cls)
 
-    distances = cosine_distances(X_test, X_train)
-    indices = np.argsort(distances)
-
-    for k in ks:
-        # print(k)
-        top_k_indices = indices[:, :k]
-        if args.valsplit == 'test':
-            print(top_k_indices)
-            np.save(os.path.join(args.output_dir, 'top_k_indices.npy'), top_k_indices)
-        # print(top_k_indices.shape, y_test.shape)
-        for ind, test_label in zip(top_k_indices, y_test):
-            labels = y_train[ind]
-            if test_label in labels:
-                # print(test_label, labels)
-                topk_correct[k] += 1
-                if k == class_top:
-                    class_correct[test_label] += 1
-            if k == class_top:
-                class_total[test_label] += 1
+    indices = nearest_neighbors(X_test, X_train, max(ks), args.test_block_size, args.train_block_size)
+    if args.valsplit == 'test':
+        top_k_indices = indices[:, :ks[0]]
+        print(top_k_indices)
+        np.save(os.path.join(args.output_dir, 'top_k_indices.npy'), top_k_indices)
+    hits = retrieval_hits(indices, y_test, y_train, ks)
+    topk_correct = {k: int(hits[k].sum()) for k in ks}
+    if class_top in hits:
+        class_correct = np.bincount(y_test, weights=hits[class_top], minlength=class_num).astype(int)
+        class_total = np.bincount(y_test, minlength=class_num)
 
     for k in ks:
         correct = topk_correct[k]
-        total = len(X_test)
+        total = len(y_test)
         print('Top-{}, correct = {:.2f}, total = {}, acc = {:.3f}'.format(k, correct, total, correct / total))
 
     # save label
     if args.valsplit != 'test':
         label_file = os.path.join(args.output_dir, 'class_retrieval_vclr.txt')
         f = open(label_file, 'w')
-        for k in class_correct.keys():
+        for k in range(class_num):
             correct = class_correct[k]
             total = class_total[k]
             info = 'Classs-{}, Top-{}, correct = {:.2f}, total = {}, acc = {:.3f}'.format(
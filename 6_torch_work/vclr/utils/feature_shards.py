@@ -0,0 +1,29 @@
+"""The functions to read the features saved by eval_*_feature_extract.py
+
+Each replica i saves feature_<split>_<i>.npy and feature_<split>_cls_<i>.npy, replica 0 vid_num_<split>.npy.
+The shards are memory-mapped and kept separate (no concatenation): the evaluations read them block by block.
+Code borrowed from SeCo (SeCo-Sequence-Contrastive-Learning/seco/feature_shards.py).
+
+MIT License
+Copyright (c) 2020 YihengZhang-CV
+"""
+
+import os
+
+import numpy as np
+
+
+def load_replica_features(output_dir, split, num_replica):
+    """Memory-mapped features and labels of the replicas, without the samples repeated to pad the last batch."""
+    vid_num = np.load(os.path.join(output_dir, 'vid_num_{}.npy'.format(split)))
+    padding_num = vid_num[0] % num_replica
+
+    features, labels = [], []
+    for i in range(num_replica):
+        feat = np.load(os.path.join(output_dir, 'feature_{}_{}.npy'.format(split, i)), mmap_mode='r')
+        feat_cls = np.load(os.path.join(output_dir, 'feature_{}_cls_{}.npy'.format(split, i)), mmap_mode='r')
+        if padding_num > 0 and i >= padding_num:
+            feat, feat_cls = feat[:-1], feat_cls[:-1]
+        features.append(feat.reshape(len(feat), -1))
+        labels.append(feat_cls.reshape(-1))
+    return features, labels
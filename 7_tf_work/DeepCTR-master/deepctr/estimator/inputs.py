@@ -1,3 +1,5 @@
+import time
+
 import tensorflow as tf
 
 
@@ -41,12 +43,125 @@ def input_fn_tfrecord(filenames, feature_description, label=None, batch_size=256
         dataset = dataset.repeat(num_epochs).batch(batch_size)
 
         if prefetch_factor > 0:
-            dataset = dataset.prefetch(buffer_size=batch_size * prefetch_factor)
+            dataset = dataset.prefetch(buffer_size=prefetch_factor)
+        return _make_one_shot_get_next(dataset)
+
+    return input_fn
+
+
+def input_fn_tfrecord_parallel(filenames, feature_description, label=None, batch_size=256, num_epochs=1,
+                               cycle_length=8, shuffle_factor=10, shuffle_files=True, cache_path=None,
+                               deterministic=True, prefetch_batches=None, drop_remainder=False, seed=None):
+    """Builds an ``input_fn`` that reads TFRecord shards in parallel and parses whole batches at once.
+
+    Shards are read with a parallel interleave, raw records are optionally cached, shuffled and batched, and
+    every batch is parsed with one ``parse_example`` call instead of one ``parse_single_example`` per record.
+
+    :param filenames: str or list of str, TFRecord files or glob patterns.
+    :param feature_description: dict, feature name to ``FixedLenFeature`` / ``VarLenFeature`` etc.
+    :param label: str, name of the label feature. If None, only features are returned.
+    :param batch_size: integer, number of examples per batch.
+    :param num_epochs: integer, number of passes over the data. None repeats forever.
+    :param cycle_length: integer, number of shards read concurrently.
+    :param shuffle_factor: integer, the shuffle buffer holds ``batch_size * shuffle_factor`` records; 0 disables
+        record shuffling.
+    :param shuffle_files: bool, whether to shuffle the order of the shards.
+    :param cache_path: str, if not None, raw records are cached after the first epoch; ``''`` caches in memory,
+        any other value is a local file prefix for an on-disk cache.
+    :param deterministic: bool, if False the interleave and map may produce elements out of order for speed.
+    :param prefetch_batches: integer, number of batches to prefetch. None lets tf.data autotune it.
+    :param drop_remainder: bool, whether to drop the last smaller batch.
+    :param seed: integer, random seed for file and record shuffling.
+    :return: an ``input_fn`` for ``tf.estimator.Estimator``.
+    """
+
+    autotune = _get_autotune()
+
+    def _parse_batch(serial_exmps):
         try:
-            iterator = dataset.make_one_shot_iterator()
+            features = tf.io.parse_example(serial_exmps, features=feature_description)
         except AttributeError:
-            iterator = tf.compat.v1.data.make_one_shot_iterator(dataset)
+            features = tf.parse_example(serial_exmps, features=feature_description)
+        if label is not None:
+            labels = features.pop(label)
+            return features, labels
+        return features
 
-        return iterator.get_next()
+    def input_fn():
+        files = tf.data.Dataset.list_files(filenames, shuffle=shuffle_files, seed=seed)
+        try:
+            dataset = files.interleave(tf.data.TFRecordDataset, cycle_length=cycle_length,
+                                       num_parallel_calls=autotune)
+        except TypeError:
+            dataset = files.apply(tf.data.experimental.parallel_interleave(
+                tf.data.TFRecordDataset, cycle_length=cycle_length, sloppy=not deterministic))
+        if cache_path is not None:
+            dataset = dataset.cache(cache_path)
+        if shuffle_factor > 0:
+            dataset = dataset.shuffle(buffer_size=batch_size * shuffle_factor, seed=seed)
+
+        dataset = dataset.repeat(num_epochs).batch(batch_size, drop_remainder=drop_remainder)
+        dataset = dataset.map(_parse_batch, num_parallel_calls=autotune)
+        dataset = dataset.prefetch(buffer_size=autotune if prefetch_batches is None else prefetch_batches)
+        dataset = dataset.with_options(_get_dataset_options(deterministic))
+        return _make_one_shot_get_next(dataset)
 
     return input_fn
+
+
+def profile_input_fn(input_fn, num_batches=100, warmup_batches=10):
+    """Measures how fast ``input_fn`` produces examples, without any model attached.
+
+    :param input_fn: an ``input_fn`` returning features or (features, labels) tensors.
+    :param num_batches: integer, number of batches to time. Stops early when the input is exhausted.
+    :param warmup_batches: integer, number of batches read before timing starts (fills shuffle and prefetch
+        buffers).
+    :return: dict with ``batches``, ``examples``, ``seconds``, ``batches_per_sec`` and ``examples_per_sec``.
+    """
+    try:
+        session_cls = tf.compat.v1.Session
+    except AttributeError:
+        session_cls = tf.Session
+    with tf.Graph().as_default():
+        next_element = input_fn()
+        batch_rows = tf.shape(tf.nest.flatten(next_element)[0])[0]
+        batches, examples, seconds = 0, 0, 0.0
+        with session_cls() as sess:
+            try:
+                for _ in range(warmup_batches):
+                    sess.run(batch_rows)
+                start = time.time()
+                while batches < num_batches:
+                    examples += sess.run(batch_rows)
+                    batches += 1
+            except tf.errors.OutOfRangeError:
+                pass
+            if batches:
+                seconds = time.time() - start
+    return {'batches': batches, 'examples': examples, 'seconds': seconds,
+            'batches_per_sec': batches / seconds if seconds else 0.0,
+            'examples_per_sec': examples / seconds if seconds else 0.0}
+
+
+def _make_one_shot_get_next(dataset):
+    try:
+        iterator = dataset.make_one_shot_iterator()
+    except AttributeError:
+        iterator = tf.compat.v1.data.make_one_shot_iterator(dataset)
+    return iterator.get_next()
+
+
+def _get_autotune():
+    try:
+        return tf.data.AUTOTUNE
+    except AttributeError:
+        return tf.data.experimental.AUTOTUNE
+
+
+def _get_dataset_options(deterministic):
+    options = tf.data.Options()
+    if hasattr(options, 'deterministic'):
+        options.deterministic = deterministic
+    else:
+        options.experimental_deterministic = deterministic
+    return options
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from deepctr.estimator.inputs import input_fn_tfrecord, input_fn_tfrecord_parallel, profile_input_fn
+
+
+def write_tfrecord_shards(dir_path, num_shards=3, shard_size=50):
+    paths = []
+    for shard in range(num_shards):
+        path = os.path.join(dir_path, 'part-%d.tfrecords' % shard)
+        try:
+            writer = tf.io.TFRecordWriter(path)
+        except AttributeError:
+            writer = tf.python_io.TFRecordWriter(path)
+        for i in range(shard * shard_size, (shard + 1) * shard_size):
+            example = tf.train.Example(features=tf.train.Features(feature={
+                'item_id': tf.train.Feature(int64_list=tf.train.Int64List(value=[i])),
+                'price': tf.train.Feature(float_list=tf.train.FloatList(value=[i / 10.0])),
+                'label': tf.train.Feature(float_list=tf.train.FloatList(value=[i % 2])),
+            }))
+            writer.write(example.SerializeToString())
+        writer.close()
+        paths.append(path)
+    return paths
+
+
+def read_all(input_fn):
+    try:
+        session_cls = tf.compat.v1.Session
+    except AttributeError:
+        session_cls = tf.Session
+    rows = []
+    with tf.Graph().as_default():
+        features, labels = input_fn()
+        with session_cls() as sess:
+            while True:
+                try:
+                    f, l = sess.run([features, labels])
+                except tf.errors.OutOfRangeError:
+                    break
+                rows.extend(zip(f['item_id'][:, 0], f['price'][:, 0], l[:, 0]))
+    return sorted(rows)
+
+
+@pytest.mark.parametrize(
+    'deterministic,cache',
+    [(True, False), (False, True)]
+)
+def test_input_fn_tfrecord_parallel(tmpdir, deterministic, cache):
+    paths = write_tfrecord_shards(str(tmpdir))
+    feature_description = {'item_id': tf.io.FixedLenFeature(dtype=tf.int64, shape=1),
+                           'price': tf.io.FixedLenFeature(dtype=tf.float32, shape=1),
+                           'label': tf.io.FixedLenFeature(dtype=tf.float32, shape=1)}
+    cache_path = os.path.join(str(tmpdir), 'cache') if cache else None
+
+    expected = read_all(input_fn_tfrecord(paths, feature_description, 'label', batch_size=16, shuffle_factor=0))
+    actual = read_all(input_fn_tfrecord_parallel(paths, feature_description, 'label', batch_size=16,
+                                                 num_epochs=2, cache_path=cache_path, deterministic=deterministic))
+    assert len(expected) == 150
+    assert actual == sorted(expected * 2)
+    assert np.array_equal(np.array(expected)[:, 0], np.arange(150))
+
+    profile = profile_input_fn(input_fn_tfrecord_parallel(os.path.join(str(tmpdir), '*.tfrecords'),
+                                                          feature_description, 'label', batch_size=16),
+                               num_batches=100, warmup_batches=1)
+    assert profile['examples'] == 150 - 16
+    assert profile['examples_per_sec'] > 0
@@ -24,9 +24,12 @@ function `cv2.VideoCapture().open('/path/to/some/video')` should return True).
 The binary only processes the video stream (images) and not the audio stream.
 """
 
+import collections
 import csv
 import os
 import sys
+import threading
+from concurrent import futures
 
 import cv2
 import feature_extractor
@@ -34,6 +37,7 @@ import numpy
 import tensorflow as tf
 from tensorflow import app
 from tensorflow import flags
+from six.moves import queue
 
 FLAGS = flags.FLAGS
 
@@ -85,6 +89,20 @@ if __name__ == '__main__':
         'zero vectors. This allows you to use YouTube-8M '
         'pre-trained model.')
 
+    # Batched extraction mode.
+    flags.DEFINE_integer(
+        'batch_size', 0,
+        'If positive, videos are decoded by a thread pool and frames are '
+        'run through inception in batches of up to this many frames, with '
+        'tfrecords written by a background thread. If 0, frames are '
+        'processed one at a time.')
+    flags.DEFINE_integer('num_decode_threads', 4,
+                         'Number of video decoding threads in batched mode.')
+    flags.DEFINE_integer(
+        'frame_queue_size', 256,
+        'Maximum number of decoded frames waiting for inference in '
+        'batched mode.')
+
 
 def frame_iterator(filename, every_ms=1000, max_num_frames=300):
     """Uses OpenCV to iterate over all frames of filename at a given frequency.
@@ -146,10 +164,226 @@ def quantize(features, min_quantized_value=-2.0, max_quantized_value=2.0):
     return _make_bytes(features)
 
 
+def quantize_batch(features, min_quantized_value=-2.0,
+                   max_quantized_value=2.0):
+    """Quantizes float32 `features` of shape (N, D) into N strings.
+
+  Gives the same strings as calling `quantize` on every row.
+  """
+    assert features.dtype == 'float32'
+    assert len(features.shape) == 2  # 2-D array
+    features = numpy.clip(features, min_quantized_value, max_quantized_value)
+    quantize_range = max_quantized_value - min_quantized_value
+    features = (features - min_quantized_value) * (255.0 / quantize_range)
+    features = numpy.round(features).astype(numpy.uint8)
+
+    return [row.tobytes() for row in features]
+
+
+def make_sequence_example(video_file, labels, rgb_features,
+                          mean_rgb_features):
+    """Builds the YouTube-8M SequenceExample of one video.
+
+  Args:
+    video_file: Path of the video, written as its id.
+    labels: Integer labels joined with semi-colon ";".
+    rgb_features: List of `tf.train.Feature`, one quantized feature per frame.
+    mean_rgb_features: Mean of the (not quantized) frame features.
+
+  Returns:
+    A `tf.train.SequenceExample`.
+  """
+    feature_list = {
+        FLAGS.image_feature_key: tf.train.FeatureList(feature=rgb_features),
+    }
+    context_features = {
+        FLAGS.labels_feature_key:
+        _int64_list_feature(sorted(map(int, labels.split(';')))),
+        FLAGS.video_file_feature_key:
+        _bytes_feature(_make_bytes(map(ord, video_file))),
+        'mean_' + FLAGS.image_feature_key:
+        tf.train.Feature(float_list=tf.train.FloatList(
+            value=mean_rgb_features)),
+    }
+
+    if FLAGS.insert_zero_audio_features:
+        zero_vec = [0] * 128
+        feature_list['audio'] = tf.train.FeatureList(
+            feature=[_bytes_feature(_make_bytes(zero_vec))] *
+            len(rgb_features))
+        context_features['mean_audio'] = tf.train.Feature(
+            float_list=tf.train.FloatList(value=zero_vec))
+
+    if FLAGS.skip_frame_level_features:
+        return tf.train.SequenceExample(context=tf.train.Features(
+            feature=context_features))
+    return tf.train.SequenceExample(
+        context=tf.train.Features(feature=context_features),
+        feature_lists=tf.train.FeatureLists(feature_list=feature_list))
+
+
+def _decode_video(index, video_file, every_ms, frame_queue, stop):
+    """Puts (index, RGB frame) of `video_file` onto `frame_queue`.
+
+  Stops early once `stop` is set. Always ends with (index, None), also when
+  the video cannot be read.
+  """
+    try:
+        for frame in frame_iterator(video_file, every_ms=every_ms):
+            if stop.is_set():
+                break
+            frame_queue.put((index, numpy.ascontiguousarray(frame[:, :, ::-1])))
+    finally:
+        frame_queue.put((index, None))
+
+
+def _write_examples(writer, videos, example_queue, counts):
+    """Writes examples from `example_queue` in the order of `videos`.
+
+  Items are (index, quantized frame features, mean features); quantized
+  features are None for videos that could not be decoded. A None item stops
+  the writer.
+  """
+    pending = {}
+    next_index = 0
+    while True:
+        item = example_queue.get()
+        if item is None:
+            break
+        pending[item[0]] = item[1:]
+        while next_index in pending:
+            rgb_bytes, mean_rgb_features = pending.pop(next_index)
+            video_file, labels = videos[next_index]
+            next_index += 1
+            if rgb_bytes is None:
+                sys.stderr.write('Could not get features for %s\n' %
+                                 video_file)
+                counts['error'] += 1
+                continue
+            example = make_sequence_example(
+                video_file, labels, [_bytes_feature(b) for b in rgb_bytes],
+                mean_rgb_features)
+            writer.write(example.SerializeToString())
+            counts['written'] += 1
+
+
+def extract_batched(extractor, videos, writer):
+    """Extracts features of `videos` with batched inception inference.
+
+  A pool of `num_decode_threads` threads decodes videos into a bounded frame
+  queue. Frames of the same size are stacked into batches of up to
+  `batch_size` and passed through inception, PCA and quantization once per
+  batch. Finished videos are handed to a background thread, which writes
+  them to `writer` in the input order. If inference fails, the decoders are
+  stopped and the videos finished so far are written before the error is
+  raised.
+
+  Args:
+    extractor: A `feature_extractor.YouTube8MFeatureExtractor`.
+    videos: List of (video_file, labels) pairs.
+    writer: A `tf.python_io.TFRecordWriter`.
+
+  Returns:
+    Dict with the number of 'written' and 'error' videos.
+  """
+    counts = collections.Counter(written=0, error=0)
+    frame_queue = queue.Queue(maxsize=FLAGS.frame_queue_size)
+    example_queue = queue.Queue()
+    writer_thread = threading.Thread(target=_write_examples,
+                                     args=(writer, videos, example_queue,
+                                           counts))
+    writer_thread.start()
+
+    every_ms = 1000.0 / FLAGS.frames_per_second
+    stop = threading.Event()
+    decoders = futures.ThreadPoolExecutor(FLAGS.num_decode_threads)
+    decodes = [
+        decoders.submit(_decode_video, index, video_file, every_ms,
+                        frame_queue, stop)
+        for index, (video_file, _) in enumerate(videos)
+    ]
+
+    num_frames = collections.defaultdict(int)
+    rgb_bytes = collections.defaultdict(list)
+    rgb_features = collections.defaultdict(list)
+    decoded = set()
+    batch, batch_owners = [], []
+
+    def maybe_finish(index):
+        if index not in decoded or len(rgb_bytes[index]) < num_frames[index]:
+            return
+        if num_frames[index] == 0:
+            example_queue.put((index, None, None))
+        else:
+            features = numpy.concatenate(rgb_features.pop(index))
+            example_queue.put((index, rgb_bytes.pop(index),
+                               features.mean(axis=0)))
+        decoded.discard(index)
+        del num_frames[index]
+
+    def run_batch():
+        features = extractor.extract_rgb_frame_features_batch(
+            numpy.stack(batch))
+        quantized = quantize_batch(features)
+        start = 0
+        for end in range(1, len(batch_owners) + 1):
+            if (end == len(batch_owners)
+                    or batch_owners[end] != batch_owners[start]):
+                owner = batch_owners[start]
+                rgb_features[owner].append(features[start:end])
+                rgb_bytes[owner].extend(quantized[start:end])
+                maybe_finish(owner)
+                start = end
+        del batch[:], batch_owners[:]
+
+    num_open = len(videos)
+    try:
+        while num_open:
+            index, frame = frame_queue.get()
+            if frame is None:
+                num_open -= 1
+                decoded.add(index)
+                maybe_finish(index)
+                continue
+            if batch and frame.shape != batch[0].shape:
+                run_batch()
+            batch.append(frame)
+            batch_owners.append(index)
+            num_frames[index] += 1
+            if len(batch) == FLAGS.batch_size:
+                run_batch()
+        if batch:
+            run_batch()
+    finally:
+        # On an error, the decoders still running are stopped and the frame
+        # queue is drained so that none of them stays blocked on it; the
+        # videos finished so far are still written.
+        stop.set()
+        for decode in decodes:
+            decode.cancel()
+        while not all(decode.done() for decode in decodes):
+            try:
+                frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        decoders.shutdown()
+        example_queue.put(None)
+        writer_thread.join()
+    return counts
+
+
 def main(unused_argv):
     print('input_video_csv:', FLAGS.input_videos_csv)
     extractor = feature_extractor.YouTube8MFeatureExtractor(FLAGS.model_dir)
     writer = tf.python_io.TFRecordWriter(FLAGS.output_tfrecords_file)
+    if FLAGS.batch_size > 0:
+        counts = extract_batched(
+            extractor, list(csv.reader(open(FLAGS.input_videos_csv))), writer)
+        writer.close()
+        print('Successfully encoded %i out of %i videos' %
+              (counts['written'], counts['written'] + counts['error']))
+        return
+
     total_written = 0
     total_error = 0
     for video_file, labels in csv.reader(open(FLAGS.input_videos_csv)):
@@ -172,35 +406,8 @@ def main(unused_argv):
         mean_rgb_features = sum_rgb_features / len(rgb_features)
 
         # Create SequenceExample proto and write to output.
-        feature_list = {
-            FLAGS.image_feature_key:
-            tf.train.FeatureList(feature=rgb_features),
-        }
-        context_features = {
-            FLAGS.labels_feature_key:
-            _int64_list_feature(sorted(map(int, labels.split(';')))),
-            FLAGS.video_file_feature_key:
-            _bytes_feature(_make_bytes(map(ord, video_file))),
-            'mean_' + FLAGS.image_feature_key:
-            tf.train.Feature(float_list=tf.train.FloatList(
-                value=mean_rgb_features)),
-        }
-
-        if FLAGS.insert_zero_audio_features:
-            zero_vec = [0] * 128
-            feature_list['audio'] = tf.train.FeatureList(
-                feature=[_bytes_feature(_make_bytes(zero_vec))] *
-                len(rgb_features))
-            context_features['mean_audio'] = tf.train.Feature(
-                float_list=tf.train.FloatList(value=zero_vec))
-
-        if FLAGS.skip_frame_level_features:
-            example = tf.train.SequenceExample(context=tf.train.Features(
-                feature=context_features))
-        else:
-            example = tf.train.SequenceExample(
-                context=tf.train.Features(feature=context_features),
-                feature_lists=tf.train.FeatureLists(feature_list=feature_list))
+        example = make_sequence_example(video_file, labels, rgb_features,
+                                        mean_rgb_features)
         writer.write(example.SerializeToString())
         total_written += 1
 
@@ -0,0 +1,59 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for extract_tfrecords_main."""
+
+import threading
+from unittest import mock
+
+import extract_tfrecords_main
+import numpy
+from tensorflow.python.platform import googletest
+
+
+class QuantizeTest(googletest.TestCase):
+
+  def testQuantizeBatchMatchesQuantize(self):
+    features = (numpy.random.RandomState(0).randn(16, 1024) * 1.5).astype(
+        numpy.float32)
+    # Values exactly half-way between two quantization levels.
+    features[0, :3] = [-2.0 + 2.0 / 255, -2.0 + 6.0 / 255, 0.0]
+    expected = [extract_tfrecords_main.quantize(row) for row in features]
+    self.assertEqual(extract_tfrecords_main.quantize_batch(features), expected)
+
+
+class _FailingExtractor(object):
+
+  def extract_rgb_frame_features_batch(self, frames):
+    raise ValueError('inference failed')
+
+
+class ExtractBatchedTest(googletest.TestCase):
+
+  def testErrorStopsDecodersAndWriter(self):
+    flags = mock.Mock(frames_per_second=1, num_decode_threads=2,
+                      frame_queue_size=2, batch_size=4)
+    frames = lambda *args, **kwargs: (
+        numpy.zeros((8, 8, 3), numpy.uint8) for _ in range(50))
+    videos = [('video%d.mp4' % i, '1') for i in range(8)]
+    threads = set(threading.enumerate())
+    with mock.patch.object(extract_tfrecords_main, 'FLAGS', flags), \
+        mock.patch.object(extract_tfrecords_main, 'frame_iterator', frames):
+      with self.assertRaises(ValueError):
+        extract_tfrecords_main.extract_batched(_FailingExtractor(), videos,
+                                               mock.Mock())
+    self.assertLessEqual(set(threading.enumerate()), threads)
+
+
+if __name__ == '__main__':
+  googletest.main()
@@ -101,6 +101,31 @@ class YouTube8MFeatureExtractor(object):
                 'pca_final_feature:0', feed_dict={'DecodeJpeg:0': frame_rgb})
         return frame_features
 
+    def extract_rgb_frame_features_batch(self, frames_rgb, apply_pca=True):
+        """Applies the YouTube8M feature extraction over a batch of RGB frames.
+
+    All frames go through inception in a single `session.run`, followed by one
+    PCA matrix multiplication for the whole batch.
+
+    Args:
+      frames_rgb: numpy array of uint8 with shape
+        (batch, height, width, channels). All frames in a batch must share the
+        same height and width; channels must be 3 (RGB).
+      apply_pca: If not set, PCA transformation will be skipped.
+
+    Returns:
+      numpy array with shape (batch, 1024) of PCA-ed features, or
+      (batch, 2048) of raw inception features if `apply_pca` is not set.
+    """
+        assert len(frames_rgb.shape) == 4
+        assert frames_rgb.shape[3] == 3  # 3 channels (R, G, B)
+        fetch = ('batch_pca_final_feature:0'
+                 if apply_pca else 'batch_frame_features:0')
+        with self._inception_graph.as_default():
+            frame_features = self.session.run(
+                fetch, feed_dict={'frames_batch:0': frames_rgb})
+        return frame_features
+
     def apply_pca(self, frame_features):
         """Applies the YouTube8M PCA Transformation over `frame_features`.
 
@@ -161,6 +186,24 @@ class YouTube8MFeatureExtractor(object):
                       tf.sqrt(Pca_Eigenvals + 1e-4),
                       name='pca_final_feature')
 
+            # Batched copy of the network. The graph is fixed to a single
+            # decoded jpeg, so a [N, H, W, 3] batch is mapped in place of its
+            # ExpandDims output; resize and normalisation ops are re-used as
+            # is. 'pool_3/_reshape' hard-codes batch 1, hence 'pool_3'.
+            Frames_Batch = tf.placeholder(tf.uint8, [None, None, None, 3],
+                                          name='frames_batch')
+            Batch_Pool, = tf.import_graph_def(
+                graph_def,
+                input_map={'ExpandDims:0': tf.cast(Frames_Batch, tf.float32)},
+                return_elements=['pool_3:0'],
+                name='batch')
+            Batch_Features = tf.reshape(Batch_Pool, [-1, 2048],
+                                        name='batch_frame_features')
+            Batch_Feats = tf.matmul(Batch_Features - Pca_Mean, Pca_Eigenvecs)
+            tf.divide(Batch_Feats,
+                      tf.sqrt(Pca_Eigenvals + 1e-4),
+                      name='batch_pca_final_feature')
+
     def _load_pca(self):
         self.pca_mean = numpy.load(os.path.join(self._model_dir,
                                                 'mean.npy'))[:, 0]
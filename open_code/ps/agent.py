@@ -384,10 +384,9 @@ class Agent(object):
 
     def preprocess_minibatch(self, minibatch):
         import numpy as np
-        import pandas as pd
-        columns = minibatch.apply(pd.Series)
-        ndarrays = list(columns.values.T)
-        labels = columns[1].values.astype(np.int64)
+        from .minibatch_utils import split_columns
+        ndarrays = split_columns(minibatch)
+        labels = ndarrays[1].astype(np.int64)
         return ndarrays, labels
 
     def process_minibatch_result(self, minibatch, result):
@@ -0,0 +1,43 @@
+"""Rows/sec of the minibatch decodings of ``ps.minibatch_utils``.
+
+Run from ``open_code`` with ``python -m ps.benchmark_minibatch_utils``.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ps.minibatch_utils import split_columns
+from ps.minibatch_utils import split_columns_pandas
+
+def make_minibatch(nrows, ncols, null_ratio=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, 100000, size=(nrows, ncols)).astype(str).astype(object)
+    ids[rng.random((nrows, ncols)) < null_ratio] = None
+    ids[:, 1] = rng.integers(0, 2, size=nrows).astype(str)
+    return pd.Series(list(ids))
+
+def benchmark(nrows, ncols, repeat):
+    minibatch = make_minibatch(nrows, ncols)
+    arrow = pa.array(minibatch, type=pa.list_(pa.string()))
+    expected = split_columns_pandas(minibatch)
+    for name, func, data in (('pandas', split_columns_pandas, minibatch),
+                             ('ndarray', split_columns, minibatch),
+                             ('arrow', split_columns, arrow)):
+        columns = func(data)
+        same = all(a.dtype == b.dtype and a.tolist() == b.tolist() for a, b in zip(columns, expected))
+        start = time.time()
+        for _ in range(repeat):
+            func(data)
+        elapsed = (time.time() - start) / repeat
+        print('%-8s rows=%d columns=%d  %10.0f rows/sec  same=%s' % (name, nrows, ncols, nrows / elapsed, same))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark minibatch decoding')
+    parser.add_argument('--rows', type=int, default=4096)
+    parser.add_argument('--columns', type=int, default=128)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.rows, args.columns, args.repeat)
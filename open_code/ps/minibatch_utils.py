@@ -0,0 +1,82 @@
+import numpy as np
+
+def split_columns_pandas(minibatch):
+    """Split a minibatch by expanding every row into a ``pandas.Series``.
+
+    This is the original decoding of ``Agent.preprocess_minibatch``, kept as
+    the fallback for ragged rows and as the reference of the fast paths.
+    Missing fields (null values and the padding of short rows) are None,
+    whatever missing value marker the pandas version puts in the frame.
+    """
+    import pandas as pd
+    columns = minibatch.apply(pd.Series)
+    matrix = columns.to_numpy(dtype=object, na_value=None)
+    return list(np.ascontiguousarray(matrix.T))
+
+def split_columns(minibatch):
+    """Split a minibatch of array rows into per column ndarrays.
+
+    ``minibatch`` is either the ``pandas.Series`` of ``ndarray`` rows passed to
+    the pandas UDF for an ``array<string>`` column, or the ``pyarrow``
+    ``ListArray`` (``ChunkedArray``) of that column. When all the rows have the
+    same length, the flat values are reshaped into a (rows, columns) object
+    matrix, no Python object is created per row. Ragged, null or empty
+    minibatches fall back to ``split_columns_pandas``.
+
+    The result is a list of one dimensional contiguous object ndarrays, one per
+    column, holding the same values as ``split_columns_pandas``: null fields
+    are None on every path.
+    """
+    import pyarrow as pa
+    if isinstance(minibatch, (pa.Array, pa.ChunkedArray)):
+        return _split_arrow_columns(minibatch)
+    matrix = stack_rows(minibatch)
+    if matrix is None:
+        return split_columns_pandas(minibatch)
+    return list(np.ascontiguousarray(matrix.T))
+
+def stack_rows(minibatch):
+    """Stack a ``pandas.Series`` of equal length array rows into a (rows, columns)
+    object matrix; return None if the rows are ragged, null or there are none.
+    """
+    rows = minibatch.values
+    if len(rows) == 0 or rows[0] is None:
+        return None
+    width = len(rows[0])
+    lengths = np.fromiter((-1 if row is None else len(row) for row in rows), dtype=np.int64, count=len(rows))
+    if width == 0 or (lengths != width).any():
+        return None
+    values = np.concatenate(rows).astype(object, copy=False)
+    return values.reshape(len(rows), width)
+
+def join_rows(minibatch, extra, delim='\002'):
+    """Append ``extra[i]`` to row ``i`` and join the fields of every row by
+    ``delim``, None fields written as empty strings.
+
+    Equal length rows are filled in one object matrix and joined without
+    concatenating ndarrays per row. Returns a ``pandas.Series`` of strings.
+    """
+    import pandas as pd
+    extra = np.asarray(extra, dtype=object)
+    matrix = stack_rows(minibatch)
+    if matrix is None:
+        lines = [delim.join(['' if x is None else x for x in row] + [value])
+                 for row, value in zip(minibatch.values, extra)]
+        return pd.Series(lines, index=minibatch.index, dtype=object)
+    fields = np.empty((matrix.shape[0], matrix.shape[1] + 1), dtype=object)
+    fields[:, :-1] = matrix
+    fields[:, -1] = extra
+    fields[np.equal(fields, None)] = ''
+    lines = list(map(delim.join, fields.tolist()))
+    return pd.Series(lines, index=minibatch.index, dtype=object)
+
+def _split_arrow_columns(array):
+    import pyarrow as pa
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    lengths = np.diff(array.offsets.to_numpy())
+    if len(array) == 0 or array.null_count or lengths[0] == 0 or (lengths != lengths[0]).any():
+        return split_columns_pandas(array.to_pandas())
+    values = array.flatten().to_numpy(zero_copy_only=False)
+    matrix = values.reshape(len(array), int(lengths[0]))
+    return list(np.ascontiguousarray(matrix.T))
@@ -35,18 +35,52 @@ class NNRankAgent(ps.Agent):
         def _feed_validation_minibatch(minibatch):
             self = __class__.get_instance()
             result = self.validate_minibatch(minibatch)
-            result = self.process_minibatch_result(minibatch, result)
-            for i in minibatch.index:
-                data_pre_np_array_str=np.concatenate((minibatch.at[i],np.array([str(result.at[i][0].item())])))
-                minibatch.at[i]='\002'.join(['' if x is None else x for x in data_pre_np_array_str])
-            return minibatch
+            return self.format_validation_minibatch(minibatch, result)
         return _feed_validation_minibatch 
 
+    def feed_prediction_minibatch(self):
+        import pandas as pd
+        from pyspark.sql.functions import pandas_udf
+        @pandas_udf(returnType=FloatType())
+        def _feed_prediction_minibatch(minibatch):
+            self = __class__.get_instance()
+            result = self.validate_minibatch(minibatch)
+            return pd.Series(result.numpy().reshape(-1), index=minibatch.index)
+        return _feed_prediction_minibatch
+
+    def format_validation_minibatch(self, minibatch, result):
+        from ps.minibatch_utils import join_rows
+        if len(result) != len(minibatch):
+            message = "result length (%d) and " % len(result)
+            message += "minibatch size (%d) mismatch" % len(minibatch)
+            raise RuntimeError(message)
+        predictions = [str(x) for x in result.reshape(-1).tolist()]
+        return join_rows(minibatch, predictions, delim='\002')
+
     def feed_validation_dataset(self, dataset_path,output_path, nepoches=1):
+        from pyspark.sql import functions as F
+        # Validation output, set by ``--conf val_output_format=...`` (not class
+        # attributes, which Agent reserves):
+        #   text:    every input row followed by its prediction, joined by '\002'
+        #   parquet: columns row_id, prediction and the input row as features,
+        #            the latter dropped by ``--conf val_output_keep_features=false``
+        val_output_format = getattr(self, 'val_output_format', 'text')
+        val_output_keep_features = getattr(self, 'val_output_keep_features', True)
         for epoch in range(nepoches):
             df = self.load_dataset(dataset_path)
-            df = df.select(self.feed_validation_minibatch()(*df.columns).alias('validate'))
-            df.write.text(output_path)
+            if val_output_format == 'text':
+                df = df.select(self.feed_validation_minibatch()(*df.columns).alias('validate'))
+                df.write.text(output_path)
+            elif val_output_format == 'parquet':
+                df = df.select(F.monotonically_increasing_id().alias('row_id'), df[0].alias('features'))
+                df = df.withColumn('prediction', self.feed_prediction_minibatch()(df['features']))
+                columns = ['row_id', 'prediction']
+                if val_output_keep_features:
+                    columns.append('features')
+                df.select(*columns).write.parquet(output_path)
+            else:
+                raise ValueError('unsupported val_output_format: %s, should be either text or parquet' % val_output_format)
+
     def nansum(self, x):
         return torch.where(torch.isnan(x), torch.zeros_like(x), x).sum()
 
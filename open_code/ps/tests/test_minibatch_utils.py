@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from ps.minibatch_utils import join_rows
+from ps.minibatch_utils import split_columns
+from ps.minibatch_utils import split_columns_pandas
+
+def _rows(*rows):
+    return pd.Series([None if row is None else np.array(row, dtype=object) for row in rows], dtype=object)
+
+MINIBATCHES = {
+    'equal': _rows(['1', '0', 'a'], ['2', '1', 'b'], ['3', '0', 'c']),
+    'null_fields': _rows(['1', '0', None], [None, '1', 'b'], ['3', '0', None]),
+    'all_null_column': _rows(['1', '0', None], ['2', '1', None]),
+    'ragged': _rows(['1', '0', 'a'], ['2', '1'], ['3', '0', 'c', 'd']),
+    'ragged_null_fields': _rows(['1', None], ['2', '1', None]),
+    'null_row': _rows(['1', '0', 'a'], None, ['3', '0', 'c']),
+    'empty_rows': _rows([], [], []),
+    'empty': _rows(),
+}
+
+def _assert_same_columns(columns, expected):
+    assert len(columns) == len(expected)
+    for column, expected_column in zip(columns, expected):
+        assert column.dtype == object
+        assert column.ndim == 1 and column.flags.c_contiguous
+        assert column.tolist() == expected_column.tolist()
+
+@pytest.mark.parametrize('name', sorted(MINIBATCHES))
+def test_split_columns_matches_pandas(name):
+    minibatch = MINIBATCHES[name]
+    _assert_same_columns(split_columns(minibatch), split_columns_pandas(minibatch))
+
+@pytest.mark.parametrize('name', sorted(MINIBATCHES))
+def test_split_arrow_columns_matches_pandas(name):
+    minibatch = MINIBATCHES[name]
+    arrow = pa.array(minibatch, type=pa.list_(pa.string()))
+    _assert_same_columns(split_columns(arrow), split_columns_pandas(minibatch))
+    chunked = pa.chunked_array([arrow[:1], arrow[1:]], type=arrow.type)
+    _assert_same_columns(split_columns(chunked), split_columns_pandas(minibatch))
+
+def test_split_columns_null_fields_are_none():
+    columns = split_columns_pandas(MINIBATCHES['ragged_null_fields'])
+    assert columns[1].tolist() == [None, '1']
+    assert columns[2].tolist() == [None, None]
+
+@pytest.mark.parametrize('name', ['equal', 'null_fields', 'ragged'])
+def test_join_rows(name):
+    minibatch = MINIBATCHES[name]
+    extra = ['%.6f' % i for i in range(len(minibatch))]
+    lines = join_rows(minibatch, extra)
+    expected = ['\002'.join(['' if x is None else x for x in row] + [value])
+                for row, value in zip(minibatch.values, extra)]
+    assert lines.tolist() == expected
+    assert lines.index.equals(minibatch.index)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from ps.nn_rank_agent import NNRankAgent
+from ps.ps_launcher import PSLauncher
+
+def _agent_attributes(*conf):
+    launcher = PSLauncher()
+    args = ['-a', 'nn_rank_agent.NNRankAgent', '-w', '1', '-s', '1', '-j', 'test']
+    for item in conf:
+        args += ['--conf', item]
+    launcher.parse_args(args)
+    return {'agent_attributes': launcher._agent_attributes}
+
+def test_val_output_options_from_conf():
+    agent = NNRankAgent()
+    args = _agent_attributes('val_output_format=parquet', 'val_output_keep_features=false')
+    NNRankAgent._load_agent_attributes(agent, args)
+    assert agent.val_output_format == 'parquet'
+    assert agent.val_output_keep_features is False
+
+def test_reserved_attribute_from_conf():
+    agent = NNRankAgent()
+    with pytest.raises(RuntimeError):
+        NNRankAgent._load_agent_attributes(agent, _agent_attributes('run=1'))
+
+@pytest.mark.parametrize('rows', [
+    [['1', '0', 'a'], ['2', '1', None], [None, '0', 'c']],
+    [['1', '0', 'a'], ['2', None], ['3', '0', 'c', 'd']],
+])
+def test_text_validation_output_matches_row_join(rows):
+    minibatch = pd.Series([np.array(row, dtype=object) for row in rows], index=[3, 4, 5])
+    result = torch.tensor([[0.125], [1.0 / 3], [0.9]], dtype=torch.float32)
+    lines = NNRankAgent().format_validation_minibatch(minibatch, result)
+    # the row by row join of the previous _feed_validation_minibatch
+    expected = []
+    for i, row in enumerate(minibatch.values):
+        values = np.concatenate((row, np.array([str(result[i][0].item())])))
+        expected.append('\002'.join(['' if x is None else x for x in values]))
+    assert [line.encode('utf-8') for line in lines] == [line.encode('utf-8') for line in expected]
+    assert lines.index.equals(minibatch.index)